@@ -0,0 +1,5 @@
+from darts.aio import create_asgi_app
+# Точка входа асинхронного API для чтения. Запуск: uvicorn asgi:app --port 5001
+# Для работы необходимы асинхронный сервер (uvicorn или hypercorn) и асинхронный драйвер базы данных (aiosqlite)
+
+app = create_asgi_app()
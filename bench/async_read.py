@@ -0,0 +1,75 @@
+import sys
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+# Нагрузочный тест функций чтения: сравнение синхронного Flask приложения и асинхронного API для чтения.
+# Перед запуском необходимо запустить оба сервера на одной базе данных, например:
+#   flask --app app run --with-threads --port 5000
+#   uvicorn asgi:app --port 5001
+#   python bench/async_read.py http://127.0.0.1:5000 http://127.0.0.1:5001 --concurrency 200
+# Клиент написан на asyncio без сторонних библиотек, чтобы сам генератор нагрузки не ограничивался потоками
+
+# Пути функций чтения, которые запрашиваются по кругу
+DEFAULT_PATHS = ['/api/', '/api/worlds/', '/api/explore/', '/api/worlds/1', '/api/longreads/1', '/api/chapter/1']
+
+
+# Выполнение одного GET запроса, функция возвращает код ответа
+async def fetch(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(('GET %s HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n\r\n' % (path, host)).encode('ascii'))
+    await writer.drain()
+    # Ответ читается полностью, чтобы учитывать время передачи тела
+    data = await reader.read()
+    writer.close()
+    return int(data.split(b' ', 2)[1])
+
+
+# Запуск заданного количества запросов с ограничением количества одновременных соединений
+async def run(base_url, paths, total, concurrency):
+    url = urlsplit(base_url)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await fetch(url.hostname, url.port or 80, paths[i % len(paths)])
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - started, sorted(latencies), errors
+
+
+# Значение перцентиля по отсортированному списку задержек
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сравнение синхронного и асинхронного API для чтения')
+    parser.add_argument('urls', nargs='+', help='адреса серверов, например http://127.0.0.1:5000')
+    parser.add_argument('--requests', type=int, default=2000, help='количество запросов к каждому серверу')
+    parser.add_argument('--concurrency', type=int, default=100, help='количество одновременных соединений')
+    parser.add_argument('--path', action='append', dest='paths', help='путь для запроса (можно указать несколько)')
+    args = parser.parse_args(argv)
+
+    paths = args.paths or DEFAULT_PATHS
+    print('%-28s %8s %7s %9s %9s %9s %9s' % ('server', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for base_url in args.urls:
+        elapsed, latencies, errors = asyncio.run(run(base_url, paths, args.requests, args.concurrency))
+        print('%-28s %8d %7d %9.1f %9.1f %9.1f %9.1f' % (
+            base_url, len(latencies), errors, len(latencies) / elapsed,
+            percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000, percentile(latencies, 99) * 1000))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+# Замер скорости импорта мира. Скрипт создает синтетический NDJSON файл с заданным количеством контент блоков,
+# импортирует его в новую базу данных и сравнивает результат с созданием тех же элементов через React функции
+# создания (api_world_create, api_longread_create, api_chapter_create, api_blockcontent_create) на части данных.
+#   python bench/bulk_import.py --blocks 300000
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from darts import create_app, importer
+from darts.extensions import db
+
+
+# Запись синтетического мира в формате экспорта
+def write_dataset(path, blocks, longreads, chapters_per_longread, text_size):
+    chapters = longreads * chapters_per_longread
+    with open(path, 'w', encoding='utf-8') as output:
+        def write(record_type, data):
+            output.write(json.dumps({'type': record_type, 'data': data}) + '\n')
+
+        output.write(json.dumps({'type': 'header', 'version': 1, 'world_id': 1}) + '\n')
+        write('world', {'id': 1, 'name': 'Bench', 'description': 'x' * 1000,
+                        'img_link': '/staticFiles/images/QuestionMark.jpg'})
+        for longread_id in range(1, longreads + 1):
+            write('longread', {'id': longread_id, 'world_id': 1, 'name': 'Longread %d' % longread_id,
+                               'description': 'x' * 500, 'img_link': '/staticFiles/images/QuestionMark.jpg'})
+        for chapter_id in range(1, chapters + 1):
+            write('chapter', {'id': chapter_id, 'name': 'Chapter %d' % chapter_id,
+                              'longread_id': (chapter_id - 1) // chapters_per_longread + 1})
+        for blockcontent_id in range(1, blocks + 1):
+            chapter_id = (blockcontent_id - 1) % chapters + 1
+            write('blockcontent', {'id': blockcontent_id, 'chapter_id': chapter_id,
+                                   'longread_id': (chapter_id - 1) // chapters_per_longread + 1,
+                                   'text': 'x' * text_size, 'img_link': '/staticFiles/images/font.jpg'})
+    return 1 + longreads + chapters + blocks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер скорости импорта мира')
+    parser.add_argument('--blocks', type=int, default=300000)
+    parser.add_argument('--longreads', type=int, default=100)
+    parser.add_argument('--chapters', type=int, default=20, help='количество глав в лонгриде')
+    parser.add_argument('--text-size', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=importer.IMPORT_BATCH_SIZE)
+    parser.add_argument('--api-sample', type=int, default=2000,
+                        help='количество контент блоков для замера создания через React функции')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    dataset = os.path.join(workdir, 'world.ndjson')
+    rows = write_dataset(dataset, args.blocks, args.longreads, args.chapters, args.text_size)
+    print('dataset: %d rows, %.1f MB' % (rows, os.path.getsize(dataset) / 2 ** 20))
+
+    importer.IMPORT_BATCH_SIZE = args.batch_size
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'import.db')})
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        with open(dataset, 'rb') as stream:
+            job = importer.import_world(importer.NDJSONSource(stream), importer.ImportJob())
+        elapsed = time.perf_counter() - started
+        print('bulk import: %d rows in %.1f s, %.0f rows/s (batch %d)' % (
+            job.rows_done, elapsed, job.rows_done / elapsed, args.batch_size))
+
+    # Создание элементов по одному через React функции создания
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'api.db')})
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    started = time.perf_counter()
+    client.post('/api/worlds/create/', json={'name': 'Bench', 'description': 'x' * 1000})
+    client.post('/api/worlds/1/create/', json={'name': 'Longread', 'description': 'x' * 500})
+    client.post('/api/longreads/1/create/', json={'name': 'Chapter'})
+    for _ in range(args.api_sample):
+        client.post('/api/blockcontent/1/1/create/', json={'text': 'x' * args.text_size})
+    elapsed = time.perf_counter() - started
+    print('per-row API: %d rows in %.1f s, %.0f rows/s' % (args.api_sample + 3, elapsed,
+                                                           (args.api_sample + 3) / elapsed))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import ctypes
+import ctypes.util
+import argparse
+import tempfile
+# Замер сжатия текстов: размер файла базы данных, доля попаданий в кэш страниц SQLite и время чтения глав без сжатия
+# и со сжатием zlib и zstd (если установлен пакет zstandard). Скрипт создает базу данных с синтетическими текстами,
+# копирует ее для каждого алгоритма и сжимает копию командой compress-text.
+#   python bench/text_compression.py --blocks 20000 --cache-pages 2000
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from darts import create_app, importer
+from darts.extensions import db
+
+# Коды SQLite для sqlite3_db_status и sqlite3_step
+SQLITE_DBSTATUS_CACHE_HIT = 7
+SQLITE_DBSTATUS_CACHE_MISS = 8
+SQLITE_ROW = 100
+SQLITE_OPEN_READONLY = 1
+
+
+# Синтетический текст: слова из словаря с распределением Ципфа, как в текстах на естественном языке
+def make_text(rng, vocabulary, weights, words):
+    return ' '.join(rng.choices(vocabulary, weights=weights, k=words)) + '.'
+
+
+# Запись синтетического мира в формате экспорта
+def write_dataset(path, blocks, chapters, seed):
+    rng = random.Random(seed)
+    syllables = ['ka', 'ro', 'mi', 'sun', 'te', 'vel', 'dor', 'an', 'is', 'lo', 'gar', 'ne', 'shi', 'tur', 'el']
+    vocabulary = [''.join(rng.choices(syllables, k=rng.randint(1, 4))) for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    with open(path, 'w', encoding='utf-8') as output:
+        def write(record_type, data):
+            output.write(json.dumps({'type': record_type, 'data': data}) + '\n')
+
+        output.write(json.dumps({'type': 'header', 'version': 1, 'world_id': 1}) + '\n')
+        write('world', {'id': 1, 'name': 'Bench', 'description': make_text(rng, vocabulary, weights, 1500),
+                        'img_link': '/staticFiles/images/QuestionMark.jpg'})
+        write('longread', {'id': 1, 'world_id': 1, 'name': 'Longread', 'description': 'Longread',
+                           'img_link': '/staticFiles/images/QuestionMark.jpg'})
+        for chapter_id in range(1, chapters + 1):
+            write('chapter', {'id': chapter_id, 'name': 'Chapter %d' % chapter_id, 'longread_id': 1})
+        for blockcontent_id in range(1, blocks + 1):
+            write('blockcontent', {'id': blockcontent_id, 'chapter_id': (blockcontent_id - 1) % chapters + 1,
+                                   'longread_id': 1, 'text': make_text(rng, vocabulary, weights,
+                                                                       rng.randint(30, 1500)),
+                                   'img_link': '/staticFiles/images/font.jpg'})
+
+
+# Доля попаданий в кэш страниц SQLite при чтении полного текста глав. Модуль sqlite3 не дает доступа к статистике
+# соединения, поэтому база данных открывается напрямую через библиотеку SQLite
+def cache_hit_rate(path, chapters, reads, cache_pages, seed):
+    library = ctypes.util.find_library('sqlite3')
+    if library is None:
+        return None
+    sqlite = ctypes.CDLL(library)
+    sqlite.sqlite3_open_v2.argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p), ctypes.c_int,
+                                       ctypes.c_char_p]
+    sqlite.sqlite3_prepare_v2.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int,
+                                          ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p]
+    sqlite.sqlite3_step.argtypes = [ctypes.c_void_p]
+    sqlite.sqlite3_finalize.argtypes = [ctypes.c_void_p]
+    sqlite.sqlite3_db_status.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+                                         ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+    sqlite.sqlite3_close.argtypes = [ctypes.c_void_p]
+    handle = ctypes.c_void_p()
+    sqlite.sqlite3_open_v2(path.encode(), ctypes.byref(handle), SQLITE_OPEN_READONLY, None)
+
+    def execute(sql):
+        statement = ctypes.c_void_p()
+        sqlite.sqlite3_prepare_v2(handle, sql.encode(), -1, ctypes.byref(statement), None)
+        while sqlite.sqlite3_step(statement) == SQLITE_ROW:
+            pass
+        sqlite.sqlite3_finalize(statement)
+
+    execute('PRAGMA cache_size = %d' % cache_pages)
+    for chapter_id in popular_chapters(chapters, reads, seed):
+        execute('SELECT text FROM BlockContent WHERE chapter_id = %d' % chapter_id)
+    hits, misses, highwater = ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+    sqlite.sqlite3_db_status(handle, SQLITE_DBSTATUS_CACHE_HIT, ctypes.byref(hits), ctypes.byref(highwater), 0)
+    sqlite.sqlite3_db_status(handle, SQLITE_DBSTATUS_CACHE_MISS, ctypes.byref(misses), ctypes.byref(highwater), 0)
+    sqlite.sqlite3_close(handle)
+    return hits.value / max(hits.value + misses.value, 1)
+
+
+# Последовательность запрашиваемых глав: популярные главы читаются чаще, как на реальном сайте
+def popular_chapters(chapters, reads, seed):
+    rng = random.Random(seed)
+    return rng.choices(range(1, chapters + 1), weights=[1 / (rank + 1) ** 0.8 for rank in range(chapters)], k=reads)
+
+
+# Время чтения глав через React функцию api_chapter: медиана и 95-й процентиль в миллисекундах
+def read_latency(app, chapters, reads, seed, preview):
+    client = app.test_client()
+    latencies = []
+    for chapter_id in popular_chapters(chapters, reads, seed):
+        started = time.perf_counter()
+        client.get('/api/chapter/%d%s' % (chapter_id, '?preview=1' if preview else ''))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер сжатия текстов')
+    parser.add_argument('--blocks', type=int, default=20000)
+    parser.add_argument('--chapters', type=int, default=200)
+    parser.add_argument('--reads', type=int, default=500, help='количество чтений глав для замера')
+    parser.add_argument('--cache-pages', type=int, default=2000, help='размер кэша страниц SQLite в страницах')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    dataset = os.path.join(workdir, 'world.ndjson')
+    write_dataset(dataset, args.blocks, args.chapters, args.seed)
+    plain = os.path.join(workdir, 'plain.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + plain})
+    with app.app_context():
+        db.create_all()
+        with open(dataset, 'rb') as stream:
+            importer.import_world(importer.NDJSONSource(stream), importer.ImportJob())
+
+    codecs = [None, 'zlib']
+    try:
+        import zstandard  # noqa: F401
+        codecs.append('zstd')
+    except ImportError:
+        print('zstandard is not installed, zstd is skipped')
+    print('%-6s %12s %10s %14s %14s' % ('codec', 'db bytes', 'cache hit', 'full p50/p95', 'preview p50/p95'))
+    for codec in codecs:
+        path = plain if codec is None else os.path.join(workdir, '%s.db' % codec)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path, 'TEXT_COMPRESSION': codec})
+        if codec is not None:
+            shutil.copy(plain, path)
+            with app.app_context():
+                result = app.test_cli_runner().invoke(args=['compress-text', '--vacuum'])
+                if result.exit_code != 0:
+                    raise SystemExit(result.output)
+            # Приложение создается заново, чтобы загрузить обученный словарь, как после перезапуска
+            app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path, 'TEXT_COMPRESSION': codec})
+        hit_rate = cache_hit_rate(path, args.chapters, args.reads, args.cache_pages, args.seed)
+        full = read_latency(app, args.chapters, args.reads, args.seed, False)
+        preview = read_latency(app, args.chapters, args.reads, args.seed, True)
+        print('%-6s %12d %10s %6.1f/%6.1f %6.1f/%6.1f' % (
+            codec or 'none', os.path.getsize(path), '%.1f%%' % (hit_rate * 100) if hit_rate is not None else 'n/a',
+            full[0], full[1], preview[0], preview[1]))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+from flask import Flask
+# Для работы системы используется фреймворк Flask, на котором основана логика работы задней части приложения,
+# фреймворк SQLAlchemy используется для работы с базой данных, реализации CRUD функций необходимых для
+# функционирования приложения. Библиотека CORS необходима для получения разрешений на запросы с
+# фронтальной части приложения. Данная версия задней части приложения является промежуточной/экспериментальной,
+# тк в ней реализована работа с базой данных, а также получение/отображение информации на Flask фронтальной части
+# и получение/отсылка информации на React фронтальную часть
+
+# Корневая папка проекта, в которой находятся шаблоны, изображения и база данных
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+# Конфигурация папки UPLOAD_FOLDER нужна для того чтобы определить место где будут храниться изображения
+UPLOAD_FOLDER = os.path.join('staticFiles', 'images')
+
+
+# Фабрика приложения. Конфигурация, расширения и blueprints подключаются только при вызове функции, поэтому импорт
+# пакета не создает приложение и не подключается к базе данных. Словарь test_config позволяет переопределить
+# конфигурацию, например указать отдельную базу данных в памяти для каждого теста
+def create_app(test_config=None):
+    # Конфигурация приложения с определением места где будут храниться изображения и где будут находиться шаблоны для
+    # отображения фронтальной части приложения
+    app = Flask(__name__,
+                template_folder=os.path.join(basedir, 'templates'),
+                static_folder=os.path.join(basedir, 'staticFiles'))
+    # Конфигурация SQL базы данных
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'sqlite_darts.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    # Хранилище изображений: filesystem - папка UPLOAD_FOLDER, s3 - бакет S3-совместимого хранилища, для которого
+    # указываются S3_BUCKET и при необходимости S3_ENDPOINT_URL (MinIO, moto), S3_PUBLIC_URL, S3_PREFIX и S3_REGION
+    app.config['STORAGE_BACKEND'] = 'filesystem'
+    # Папка для копий изображений разных размеров и форматов (по умолчанию instance/variants)
+    app.config['VARIANT_CACHE_FOLDER'] = None
+    # Потоковая отрисовка страницы главы: браузер получает начало страницы до загрузки всех контент блоков
+    app.config['STREAM_CHAPTER_VIEW'] = True
+    # Сжатие полного текста контент блоков и описаний миров: None (выключено), 'zlib' или 'zstd' (нужен пакет
+    # zstandard). Существующие тексты сжимаются командой compress-text
+    app.config['TEXT_COMPRESSION'] = None
+    # Папка для опубликованных снимков лонгридов (по умолчанию instance/published)
+    app.config['PUBLISH_FOLDER'] = None
+    # Шарды миров: имя шарда - адрес базы данных (см. sharding.py). SHARD - шард, в котором работают CLI команды и
+    # процесс фоновых задач (по умолчанию основная база данных, переменная окружения FLASK_SHARD)
+    app.config['SHARDS'] = {}
+    app.config['SHARD'] = None
+    # Счетчики просмотров и прочтений: значения накапливаются в памяти процесса и записываются раз в
+    # READ_FLUSH_INTERVAL секунд (см. reads.py)
+    app.config['READ_COUNTERS'] = True
+    app.config['READ_FLUSH_INTERVAL'] = 10
+    # Папка для резервных копий баз данных (по умолчанию instance/backups) и интервал регулярного обслуживания баз
+    # данных фоновой задачей в секундах (None - задача не повторяется, см. maintenance.py)
+    app.config['BACKUP_FOLDER'] = None
+    app.config['DB_MAINTENANCE_INTERVAL'] = None
+    # Профилирование запросов (см. profiling.py): секрет для заголовка X-Profile, доля случайно выбранных запросов,
+    # эндпоинты для случайной выборки (None - все), папка профилей (по умолчанию instance/profiles) и формат
+    # профиля: speedscope (сэмплирующий профилировщик) или pstats (cProfile)
+    app.config['PROFILE_TOKEN'] = None
+    app.config['PROFILE_SAMPLE_RATE'] = 0
+    app.config['PROFILE_ENDPOINTS'] = None
+    app.config['PROFILE_FOLDER'] = None
+    app.config['PROFILE_FORMAT'] = 'speedscope'
+    # Прогрев процесса при первом запросе (см. warmup.py): количество самых читаемых миров и лонгридов, страницы
+    # которых запрашиваются до того, как /api/ready/ сообщит о готовности
+    app.config['WARMUP'] = True
+    app.config['WARMUP_TOP_WORLDS'] = 20
+    app.config['WARMUP_TOP_LONGREADS'] = 50
+    app.secret_key = 'Secret key'
+    # Переопределение конфигурации переменными окружения с префиксом FLASK_ (например FLASK_SQLALCHEMY_DATABASE_URI)
+    app.config.from_prefixed_env()
+    if test_config is not None:
+        app.config.update(test_config)
+
+    # Подключение расширений к приложению. Базы данных шардов подключаются как дополнительные базы данных
+    from .extensions import db, cors
+    from .sharding import shard_binds
+    app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, **shard_binds(app.config['SHARDS']))
+    db.init_app(app)
+    # Заголовок ETag с версией элемента должен быть доступен фронтальной части приложения
+    cors.init_app(app, support_credentials=True, expose_headers=['ETag'])
+
+    # Подключение хранилища изображений
+    from .storage import init_storage
+    init_storage(app)
+    # Подключение сжатия текстов
+    from .compression import init_compression
+    init_compression(app)
+    # Подключение профилирования запросов. Профилирование начинается раньше выбора шарда, чтобы в профиль попали
+    # запросы поиска шарда
+    from .profiling import init_profiling
+    init_profiling(app)
+    # Подключение шардов: шард запроса выбирается перед вызовом обработчика
+    from .sharding import init_sharding
+    init_sharding(app)
+    # Подключение прогрева процесса: прогрев начинается при первом запросе
+    from .warmup import init_warmup
+    init_warmup(app)
+    # Подключение буфера счетчиков прочтений
+    from .reads import init_reads
+    init_reads(app)
+
+    # Конфликт версий при изменении элемента (в том числе при изменении через модели) отсылается ответом 412
+    from sqlalchemy.orm.exc import StaleDataError
+    from .versioning import VersionConflict, version_conflict
+    app.register_error_handler(VersionConflict, version_conflict)
+    app.register_error_handler(StaleDataError, version_conflict)
+    # Некорректные поля при частичном изменении элемента отсылаются ответом 400 со списком ошибок
+    from .patch import InvalidPatch, invalid_patch
+    app.register_error_handler(InvalidPatch, invalid_patch)
+
+    # Регистрация blueprints для миров, лонгридов, глав, контент блоков, объектов мира, журнала изменений,
+    # фоновых задач, прямой загрузки изображений, копий изображений разных размеров и форматов, пакетного чтения,
+    # опубликованных лонгридов, самых читаемых элементов и проверки готовности процесса
+    from . import (worlds, longreads, chapters, blockcontents, worldobjs, changes, jobs, images, variants, batch,
+                   publish, reads, warmup)
+    app.register_blueprint(worlds.bp)
+    app.register_blueprint(longreads.bp)
+    app.register_blueprint(chapters.bp)
+    app.register_blueprint(blockcontents.bp)
+    app.register_blueprint(worldobjs.bp)
+    app.register_blueprint(changes.bp)
+    app.register_blueprint(jobs.bp)
+    app.register_blueprint(images.bp)
+    app.register_blueprint(variants.bp)
+    app.register_blueprint(batch.bp)
+    app.register_blueprint(publish.bp)
+    app.register_blueprint(reads.bp)
+    app.register_blueprint(warmup.bp)
+
+    # Регистрация CLI команд
+    from .commands import init_db_command
+    from .export import export_world_command
+    from .importer import import_world_command
+    from .jobs import run_worker_command
+    from .gc import gc_images_command
+    from .counters import repair_counters_command
+    from .compression import compress_text_command
+    from .revisions import compact_revisions_command
+    from .sharding import shard_status_command, move_world_command, rebalance_shards_command
+    from .reads import rollup_reads_command
+    from .maintenance import (backup_db_command, vacuum_db_command, analyze_db_command, check_db_command,
+                              maintain_db_command)
+    from .warmup import warm_up_command
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(export_world_command)
+    app.cli.add_command(import_world_command)
+    app.cli.add_command(run_worker_command)
+    app.cli.add_command(gc_images_command)
+    app.cli.add_command(repair_counters_command)
+    app.cli.add_command(compress_text_command)
+    app.cli.add_command(compact_revisions_command)
+    app.cli.add_command(shard_status_command)
+    app.cli.add_command(move_world_command)
+    app.cli.add_command(rebalance_shards_command)
+    app.cli.add_command(rollup_reads_command)
+    app.cli.add_command(backup_db_command)
+    app.cli.add_command(vacuum_db_command)
+    app.cli.add_command(analyze_db_command)
+    app.cli.add_command(check_db_command)
+    app.cli.add_command(maintain_db_command)
+    app.cli.add_command(warm_up_command)
+
+    return app
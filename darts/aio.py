@@ -0,0 +1,327 @@
+import re
+import json
+import asyncio
+from urllib.parse import parse_qsl
+from sqlalchemy import select
+# Асинхронная версия функций чтения для React фронтальной части приложения. Приложение реализует интерфейс ASGI,
+# запускается асинхронным сервером (например "uvicorn asgi:app") и работает с базой данных через асинхронный драйвер
+# (aiosqlite для SQLite), поэтому один процесс обслуживает множество параллельных запросов на чтение, не занимая
+# поток на каждый запрос. Пути совпадают с путями синхронных функций, так что прокси-сервер может направлять на это
+# приложение GET запросы, а запросы на изменение данных отправлять в Flask приложение. При включенных шардах
+# (настройка SHARDS) приложение подключается к базе данных каждого шарда и выбирает шард запроса так же, как Flask
+# приложение (см. sharding.py)
+
+from .extensions import MAIN_SHARD
+from .models import World, LongRead, Chapter, BlockContent, WorldObj, WorldShard
+from .serializers import (preview_requested, world_index_data, longread_index_data, world_detail_data,
+                          longread_detail_data, chapter_detail_data)
+from .batch import BATCH_TYPES, batch_params, batch_data
+from .chapters import block_page_params, block_page_query, block_count_query, block_page
+from .changes import (CHANGES_BATCH_SIZE, CHANGES_POLL_INTERVAL, CHANGES_HEARTBEAT, change_params, changes_query,
+                      latest_change_query, sse_event, scope_query)
+from .sharding import ShardRouting, probe_order
+
+# Соответствие синхронных драйверов баз данных их асинхронным вариантам
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+# Запрос всех полей таблицы, кроме полей с полным текстом, если запрошен режим превью
+def columns(model, preview, *deferred):
+    table = model.__table__
+    if not preview:
+        return select(table)
+    return select(*[column for column in table.columns if column.name not in deferred])
+
+
+# Преобразование адреса базы данных Flask приложения в адрес с асинхронным драйвером
+def async_database_uri(uri):
+    scheme, rest = uri.split('://', 1)
+    # Если драйвер уже указан явно, используется основная часть схемы
+    dialect = scheme.split('+', 1)[0]
+    return ASYNC_DRIVERS.get(dialect, scheme) + '://' + rest
+
+
+# Асинхронные подключения к основной базе данных и к базам данных шардов. Мир элемента ищется в шардах начиная
+# с шарда, который выдал идентификатор, и запоминается, шард мира берется из каталога WorldShard основной базы данных
+class AsyncShards:
+    def __init__(self, engines):
+        self.engines = engines
+        self.routing = ShardRouting([name for name in engines if name != MAIN_SHARD])
+
+    def connect(self, name=MAIN_SHARD):
+        return self.engines[name].connect()
+
+    def enabled(self):
+        return len(self.engines) > 1
+
+    # Шард мира по каталогу
+    async def world_shard(self, world_id):
+        async with self.connect() as conn:
+            shard = (await conn.execute(select(WorldShard.shard).where(WorldShard.world_id == world_id))).scalar()
+        return shard or MAIN_SHARD
+
+    # Шард элемента. Для отсутствующего элемента возвращается основная база данных, обработчик отошлет ответ 404
+    async def element_shard(self, model, row_id):
+        if not self.enabled():
+            return MAIN_SHARD
+        key = (model.__tablename__, row_id)
+        world_id = row_id if model is World else self.routing.cached_world(key)
+        if world_id is None:
+            for name in probe_order(row_id, self.routing.shards):
+                async with self.connect(name) as conn:
+                    world_id = (await conn.execute(scope_query(model).where(model.__table__.c.id == row_id))).scalar()
+                if world_id is not None:
+                    self.routing.remember_world(key, world_id)
+                    break
+        return await self.world_shard(world_id) if world_id is not None else MAIN_SHARD
+
+    # Выполнение запроса во всех шардах (аналог across_shards). Строки мира, который переносится, берутся только из
+    # шарда мира по каталогу
+    async def across(self, query, world_attr):
+        if not self.enabled():
+            async with self.connect() as conn:
+                return (await conn.execute(query)).all()
+        async with self.connect() as conn:
+            placement = dict((await conn.execute(select(WorldShard.world_id, WorldShard.shard))).all())
+        rows = []
+        for name in self.engines:
+            async with self.connect(name) as conn:
+                rows.extend(row for row in (await conn.execute(query)).all()
+                            if placement.get(getattr(row, world_attr), MAIN_SHARD) == name)
+        return sorted(rows, key=lambda row: row.id)
+
+    # Идентификаторы элементов, сгруппированные по шардам (аналог group_by_shard)
+    async def group(self, model, ids):
+        groups = {}
+        for row_id in ids:
+            groups.setdefault(await self.element_shard(model, row_id), []).append(row_id)
+        return groups
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+
+
+# Функция для передачи всех миров находящихся в базе данных (аналог api_index и api_world_index)
+async def api_world_index(shards, preview, args):
+    # Получение списка всех миров по запросу в базу данных каждого шарда
+    worlds = await shards.across(columns(World, preview, 'description'), 'id')
+    return 200, [world_index_data(world, preview) for world in worlds]
+
+
+# Функция для передачи всех лонгридов находящихся в базе данных (аналог api_longread_index)
+async def api_longread_index(shards, preview, args):
+    # Получение списка всех лонгридов по запросу в базу данных каждого шарда
+    longreads = await shards.across(columns(LongRead, preview, 'description'), 'world_id')
+    return 200, [longread_index_data(longread, preview) for longread in longreads]
+
+
+# Функция для передачи информации о мире, его лонгридах и объектах мира (аналог api_world)
+async def api_world(shards, preview, args, world_id):
+    async with shards.connect(await shards.element_shard(World, world_id)) as conn:
+        # Получение мира по запросу в базу данных
+        world = (await conn.execute(select(World.__table__).where(World.id == world_id))).first()
+        if world is None:
+            return 404, {'message': 'World not found'}
+        # Получение списков лонгридов и объектов мира, связанных с миром
+        # Списки упорядочены по идентификатору, как в загрузчике запроса Flask приложения (loader.children_of)
+        longreads = (await conn.execute(columns(LongRead, preview, 'description')
+                                        .where(LongRead.world_id == world_id).order_by(LongRead.id))).all()
+        worldobjs = (await conn.execute(columns(WorldObj, preview, 'description')
+                                        .where(WorldObj.world_id == world_id).order_by(WorldObj.id))).all()
+    return 200, world_detail_data(world, longreads, worldobjs, preview)
+
+
+# Функция для передачи информации о лонгриде и его главах (аналог api_longread)
+async def api_longread(shards, preview, args, longread_id):
+    async with shards.connect(await shards.element_shard(LongRead, longread_id)) as conn:
+        # Получение лонгрида по запросу в базу данных
+        longread = (await conn.execute(select(LongRead.__table__).where(LongRead.id == longread_id))).first()
+        if longread is None:
+            return 404, {'message': 'Longread not found'}
+        # Получение списка глав, связанных с лонгридом, в порядке идентификаторов
+        chapters = (await conn.execute(select(Chapter.__table__).where(Chapter.longread_id == longread_id)
+                                       .order_by(Chapter.id))).all()
+    return 200, longread_detail_data(longread, chapters)
+
+
+# Функция для передачи информации о главе и ее контент блоках (аналог api_chapter)
+async def api_chapter(shards, preview, args, chapter_id):
+    async with shards.connect(await shards.element_shard(Chapter, chapter_id)) as conn:
+        # Получение главы по запросу в базу данных
+        chapter = (await conn.execute(select(Chapter.__table__).where(Chapter.id == chapter_id))).first()
+        if chapter is None:
+            return 404, {'message': 'Chapter not found'}
+        try:
+            page = block_page_params(args)
+        except ValueError as error:
+            return 400, {'message': str(error)}
+        if page is None:
+            # Получение списка контент блоков, связанных с главой
+            blockcontents = (await conn.execute(columns(BlockContent, preview, 'text')
+                                                .where(BlockContent.chapter_id == chapter_id)
+                                                .order_by(BlockContent.id))).all()
+            return 200, chapter_detail_data(chapter, blockcontents, preview)
+        # Постраничная выдача контент блоков (аналогично api_chapter)
+        blockcontents, page_data = block_page(
+            (await conn.execute(block_page_query(columns(BlockContent, preview, 'text'), chapter_id, *page))).all(),
+            (await conn.execute(block_count_query(chapter_id, page[0]))).one(), *page)
+    chapter_data = chapter_detail_data(chapter, blockcontents, preview)
+    chapter_data['page'] = page_data
+    return 200, chapter_data
+
+
+# Функция для пакетного чтения элементов разных типов (аналог api_batch с параметрами в строке запроса)
+async def api_batch(shards, preview, args):
+    try:
+        ids = batch_params(args, True)
+    except ValueError as error:
+        return 400, {'message': str(error)}
+    # Элементы каждого типа загружаются одним запросом IN в каждом шарде, в котором они находятся
+    found = {}
+    for name, type_ids in ids.items():
+        model = BATCH_TYPES[name][0]
+        table = model.__table__
+        found[name] = {}
+        for shard, shard_ids in (await shards.group(model, type_ids)).items():
+            async with shards.connect(shard) as conn:
+                rows = (await conn.execute(select(table).where(table.c.id.in_(shard_ids)))).all()
+            found[name].update((row.id, row) for row in rows)
+    return 200, batch_data(ids, found, preview)
+
+
+# Таблица путей асинхронного приложения, пути совпадают с путями синхронных функций
+ROUTES = [
+    (re.compile(r'^/api/$'), api_world_index),
+    (re.compile(r'^/api/worlds/$'), api_world_index),
+    (re.compile(r'^/api/explore/$'), api_longread_index),
+    (re.compile(r'^/api/worlds/(\d+)$'), api_world),
+    (re.compile(r'^/api/longreads/(\d+)$'), api_longread),
+    (re.compile(r'^/api/chapter/(\d+)$'), api_chapter),
+    (re.compile(r'^/api/batch/$'), api_batch),
+]
+
+
+# ASGI приложение, которое сопоставляет путь запроса с функцией чтения и отправляет JSON-текст
+class AsyncReadAPI:
+    def __init__(self, shards):
+        self.shards = shards
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        # Асинхронное приложение обрабатывает только запросы на чтение
+        if scope['method'] != 'GET':
+            await self.respond(send, 405, {'message': 'Method not allowed'})
+            return
+        args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        # Поток изменений SSE остается открытым, пока клиент не отключится
+        if scope['path'] == '/api/changes/stream':
+            await self.stream_changes(scope, receive, send, args)
+            return
+        # Режим превью, аналогично синхронным функциям, включается параметром preview
+        preview = preview_requested(args)
+        for pattern, handler in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                status, data = await handler(self.shards, preview, args, *(int(arg) for arg in match.groups()))
+                await self.respond(send, status, data)
+                return
+        await self.respond(send, 404, {'message': 'Not found'})
+
+    # Отправка JSON-текста с заголовком, разрешающим запросы с фронтальной части приложения
+    async def respond(self, send, status, data):
+        body = json.dumps(data).encode('utf-8')
+        await send({'type': 'http.response.start',
+                    'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode('ascii')),
+                                (b'access-control-allow-origin', b'*')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # Поток изменений мира или лонгрида в формате SSE (Flask приложение отвечает только на долгий опрос
+    # api_changes). Пример: /api/changes/stream?world_id=1&since=120. Журнал изменений проверяется
+    # с интервалом CHANGES_POLL_INTERVAL, соединение с базой данных берется только на время проверки, поэтому
+    # открытые потоки не занимают ни потоков, ни соединений. Журнал изменений мира находится в шарде мира
+    async def stream_changes(self, scope, receive, send, args):
+        headers = dict(scope['headers'])
+        try:
+            last_event_id = headers.get(b'last-event-id')
+            world_id, longread_id, since = change_params(
+                args, last_event_id.decode('latin-1') if last_event_id is not None else None)
+        except ValueError as error:
+            await self.respond(send, 400, {'message': str(error)})
+            return
+        if world_id is not None:
+            shard = await self.shards.element_shard(World, world_id)
+        else:
+            shard = await self.shards.element_shard(LongRead, longread_id)
+        if since is None:
+            async with self.shards.connect(shard) as conn:
+                since = (await conn.execute(latest_change_query())).scalar()
+        await send({'type': 'http.response.start',
+                    'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no'),
+                                (b'access-control-allow-origin', b'*')]})
+        # Задача, которая завершается при отключении клиента
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        try:
+            while not disconnected.done():
+                async with self.shards.connect(shard) as conn:
+                    changes = (await conn.execute(changes_query(world_id, longread_id, since))).all()
+                if changes:
+                    body = ''.join(sse_event(change) for change in changes)
+                    since = changes[-1].id
+                    await send({'type': 'http.response.body', 'body': body.encode('utf-8'), 'more_body': True})
+                    last_sent = loop.time()
+                    # Если получена полная пачка, следующая пачка запрашивается без ожидания
+                    if len(changes) == CHANGES_BATCH_SIZE:
+                        continue
+                elif loop.time() - last_sent >= CHANGES_HEARTBEAT:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                    last_sent = loop.time()
+                await asyncio.wait({disconnected}, timeout=CHANGES_POLL_INTERVAL)
+        finally:
+            disconnected.cancel()
+
+    # Ожидание отключения клиента
+    async def wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # Обработка событий запуска и остановки сервера, при остановке закрываются соединения с базой данных
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shards.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# Фабрика асинхронного приложения. Конфигурация берется из Flask приложения, поэтому оба приложения работают с
+# одними базами данных. Адрес основной базы данных для асинхронного драйвера можно указать явно в
+# ASYNC_DATABASE_URI, адреса шардов получаются из настройки SHARDS
+def create_asgi_app(test_config=None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from . import create_app
+
+    config = create_app(test_config).config
+    uri = config.get('ASYNC_DATABASE_URI') or async_database_uri(config['SQLALCHEMY_DATABASE_URI'])
+    engines = {MAIN_SHARD: create_async_engine(uri)}
+    for name, shard_uri in (config.get('SHARDS') or {}).items():
+        engines[name] = create_async_engine(async_database_uri(shard_uri))
+    return AsyncReadAPI(AsyncShards(engines))
@@ -0,0 +1,95 @@
+from flask import Blueprint, request, jsonify
+
+from .models import World, LongRead, Chapter, BlockContent, WorldObj
+from .serializers import (preview_requested, world_index_data, longread_item_data, chapter_item_data,
+                          blockcontent_item_data, worldobj_item_data)
+from .loader import get_loader
+from .sharding import group_by_shard, use_shard
+# Пакетное чтение элементов разных типов. Страницы React фронтальной части приложения ссылаются на десятки
+# элементов, и вместо отдельного запроса на каждый элемент клиент запрашивает их одним запросом со списками
+# идентификаторов по типам. Элементы каждого типа загружаются одним запросом IN, возвращаются в порядке запрошенных
+# идентификаторов, а идентификаторы отсутствующих элементов перечисляются отдельно. Пример:
+# GET /api/batch/?world=1,2&longread=5,3&preview=1 либо POST /api/batch/ {"world": [1, 2], "longread": [5, 3],
+# "preview": true}
+
+# Типы элементов, модели и функции формирования JSON-текста
+BATCH_TYPES = {
+    'world': (World, world_index_data),
+    'longread': (LongRead, longread_item_data),
+    'chapter': (Chapter, chapter_item_data),
+    'blockcontent': (BlockContent, blockcontent_item_data),
+    'worldobj': (WorldObj, worldobj_item_data),
+}
+# Максимальное количество идентификаторов всех типов в одном запросе
+BATCH_MAX_IDS = 1000
+
+bp = Blueprint('batch', __name__)
+
+
+# Списки идентификаторов по типам из параметров запроса (идентификаторы через запятую) либо из JSON-текста
+# (списки чисел). Повторяющиеся идентификаторы убираются с сохранением порядка. При ошибке вызывается ValueError
+def batch_params(data, from_query):
+    if not isinstance(data, dict):
+        raise ValueError('Request must be a JSON object with lists of ids by type')
+    # В JSON-тексте режим превью передается логическим значением
+    if not from_query and not isinstance(data.get('preview', False), bool):
+        raise ValueError('preview must be true or false')
+    unknown = [name for name in data if name not in BATCH_TYPES and name != 'preview']
+    if unknown:
+        raise ValueError('Unknown types %s, expected %s' % (', '.join(unknown), ', '.join(BATCH_TYPES)))
+    ids = {}
+    for name in BATCH_TYPES:
+        if name not in data:
+            continue
+        values = data[name]
+        try:
+            if from_query:
+                values = [int(value) for value in values.split(',') if value.strip()]
+            elif not isinstance(values, list) or not all(type(value) is int for value in values):
+                raise ValueError
+        except ValueError:
+            raise ValueError('%s must be a list of integer ids' % name)
+        ids[name] = list(dict.fromkeys(values))
+    if not ids:
+        raise ValueError('No ids requested, expected lists of ids for %s' % ', '.join(BATCH_TYPES))
+    if sum(len(values) for values in ids.values()) > BATCH_MAX_IDS:
+        raise ValueError('At most %d ids can be requested at once' % BATCH_MAX_IDS)
+    return ids
+
+
+# JSON-текст с элементами по типам и списками отсутствующих идентификаторов. found - словарь найденных элементов
+# по типу и идентификатору
+def batch_data(ids, found, preview):
+    data = {'items': {}, 'missing': {}}
+    for name, type_ids in ids.items():
+        serializer = BATCH_TYPES[name][1]
+        data['items'][name] = [serializer(found[name][row_id], preview) for row_id in type_ids
+                               if row_id in found[name]]
+        missing = [row_id for row_id in type_ids if row_id not in found[name]]
+        if missing:
+            data['missing'][name] = missing
+    return data
+
+
+# React Функция для пакетного чтения элементов. Параметр preview работает так же, как в функциях чтения отдельных
+# элементов, в POST запросе он передается в JSON-тексте
+@bp.route('/api/batch/', methods=['GET', 'POST'])
+def api_batch():
+    from_query = request.method == 'GET'
+    data = request.args if from_query else request.get_json(silent=True)
+    try:
+        ids = batch_params(data, from_query)
+    except ValueError as error:
+        return jsonify({'message': str(error)}), 400
+    # Элементы каждого типа загружаются загрузчиком запроса одним запросом IN в каждом шарде, в котором они находятся
+    loader = get_loader()
+    found = {}
+    for name, type_ids in ids.items():
+        found[name] = {}
+        for shard, shard_ids in group_by_shard(BATCH_TYPES[name][0], type_ids).items():
+            with use_shard(shard):
+                elements = loader.load_many(BATCH_TYPES[name][0], shard_ids)
+            found[name].update((row_id, element) for row_id, element in zip(shard_ids, elements)
+                               if element is not None)
+    preview = preview_requested(data) if from_query else data.get('preview', False)
+    return jsonify(batch_data(ids, found, preview)), 200
@@ -0,0 +1,294 @@
+from flask import Blueprint, render_template, request, url_for, redirect, jsonify
+
+from .extensions import db
+from .models import BlockContent
+from .versioning import versioned_update, parse_if_match, etag
+from .patch import validate_patch, patch_data
+from .jobs import enqueue
+from .storage import get_storage
+from .revisions import list_revisions, revision_text
+
+# Blueprint с функциями для работы с контент блоками
+bp = Blueprint('blockcontents', __name__)
+
+
+# React Функция для создания контент блока и привязки его к главе, идентификатор которой был указан.
+# При создании контент блока ему будет присвоена стандартная фотография
+@bp.route('/api/blockcontent/<int:longread_id>/<int:chapter_id>/create/', methods=('GET', 'OPTIONS', 'POST'))
+def api_blockcontent_create(longread_id, chapter_id):
+    # Фронтальная часть приложения перед отправлением запроса на создание элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    #Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Создание контент блока используя данные полученные из JSON-текста
+    blockcontent = BlockContent(longread_id=longread_id,
+                                chapter_id=chapter_id,
+                                text=json["text"])
+    # Контент блоку присваивается стандартная фотография
+    blockcontent.img_link = "/staticFiles/images/font.jpg"
+    # Добавление контент блока в сессию изменений
+    db.session.add(blockcontent)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'Blockcontent created successfully'}), 201
+
+
+# Flask Функция для создания контент блока и привязки его к главе, идентификатор которой был указан.
+# При создании контент блока ему будет присвоена стандартная фотография, либо фотография загруженная в форму
+@bp.route('/blockcontent/<int:longread_id>/<int:chapter_id>/create/', methods=('GET', 'POST'))
+def blockcontent_create(longread_id, chapter_id):
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        text = request.form['text']
+        uploaded_img = request.files['uploaded-file']
+        # Создание контент блока используя данные полученные из формы
+        blockcontent = BlockContent(longread_id=longread_id,
+                                    chapter_id=chapter_id,
+                                    text=text)
+        # Добавление контент блока в сессию изменений
+        db.session.add(blockcontent)
+        # Использование функции flush для получения id нового контент блока
+        db.session.flush()
+        # Обновление контент блока для получения id
+        db.session.refresh(blockcontent)
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename == '':
+            # Если пустой файл контент блоку присваивается стандартная фотография
+            blockcontent.img_link = "/staticFiles/images/font.jpg"
+        else:
+            # Создание уникального имени использую id контент блока
+            blockcontent_img_name = "blockcontent" + str(blockcontent.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(blockcontent_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Сохранение названия файла
+            blockcontent.img_link = get_storage().link(blockcontent_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=blockcontent.img_link)
+        # Фиксация изменений в БД
+        db.session.commit()
+        return redirect(url_for('chapters.chapter', chapter_id=chapter_id))
+
+    return render_template('create_blockcontent.html', chapter_id=chapter_id)
+
+
+# React Функция для редактирования контент блока, используя указанный идентификатор контент блока.
+@bp.route('/api/blockcontent/<int:blockcontent_id>/edit/', methods=['GET', 'POST', 'OPTIONS'])
+def api_blockcontent_edit(blockcontent_id):
+    # Фронтальная часть приложения перед отправлением запроса на редактирование элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Внесение изменений одним запросом в базу данных без предварительного чтения. Если в заголовке If-Match указана
+    # версия, изменение выполняется только при совпадении версии, иначе отсылается ответ 412
+    version = versioned_update(BlockContent, blockcontent_id, {'text': json["text"]},
+                               parse_if_match(request.headers.get('If-Match')))['version']
+    # Отсылка сообщения с новой версией
+    return jsonify({'message': 'Blockcontent updated successfully', 'version': version}), 200, etag(version)
+
+
+# React Функция для частичного изменения контент блока. Принимает JSON-текст только с изменяемыми полями и изменяет
+# их одним запросом в базу данных без предварительного чтения контент блока
+@bp.route('/api/blockcontent/<int:blockcontent_id>', methods=['PATCH'])
+def api_blockcontent_patch(blockcontent_id):
+    # Проверка полученных полей, при ошибке отсылается ответ 400 со списком ошибок
+    values = validate_patch(BlockContent, request.get_json(silent=True))
+    # Внесение изменений с учетом версии из заголовка If-Match
+    changed = versioned_update(BlockContent, blockcontent_id, values, parse_if_match(request.headers.get('If-Match')))
+    # Отсылка только измененных полей и новой версии
+    return jsonify(patch_data(blockcontent_id, changed)), 200, etag(changed['version'])
+
+
+# React Функция для получения списка ревизий текста контент блока от новых к старым. size - размер хранимых данных
+# ревизии (полного текста для снимка либо разницы с предыдущей ревизией)
+@bp.route('/api/blockcontent/<int:blockcontent_id>/revisions/', methods=['GET'])
+def api_blockcontent_revisions(blockcontent_id):
+    # Проверка существования контент блока
+    if db.session.get(BlockContent, blockcontent_id) is None:
+        return jsonify({'message': 'Blockcontent not found'}), 404
+    revisions = [{'version': row.version, 'snapshot': row.snapshot, 'created_at': row.created_at.isoformat(),
+                  'size': row.size} for row in list_revisions(blockcontent_id)]
+    return jsonify({'blockcontent_id': blockcontent_id, 'revisions': revisions}), 200
+
+
+# React Функция для получения текста контент блока в указанной версии
+@bp.route('/api/blockcontent/<int:blockcontent_id>/revisions/<int:version>', methods=['GET'])
+def api_blockcontent_revision(blockcontent_id, version):
+    # Проверка существования контент блока: ревизии контент блоков, удаленных фоновой задачей, хранятся до удаления
+    # старых ревизий
+    if db.session.get(BlockContent, blockcontent_id) is None:
+        return jsonify({'message': 'Blockcontent not found'}), 404
+    text = revision_text(blockcontent_id, version)
+    if text is None:
+        return jsonify({'message': 'Revision not found'}), 404
+    return jsonify({'blockcontent_id': blockcontent_id, 'version': version, 'text': text}), 200
+
+
+# React Функция для восстановления текста контент блока из указанной версии. Восстановление записывается как новое
+# изменение текста с новой версией, поэтому история сохраняется и восстановление можно отменить
+@bp.route('/api/blockcontent/<int:blockcontent_id>/revisions/<int:version>/restore/', methods=['POST'])
+def api_blockcontent_revision_restore(blockcontent_id, version):
+    # Проверка существования контент блока
+    if db.session.get(BlockContent, blockcontent_id) is None:
+        return jsonify({'message': 'Blockcontent not found'}), 404
+    text = revision_text(blockcontent_id, version)
+    if text is None:
+        return jsonify({'message': 'Revision not found'}), 404
+    # Изменение с учетом версии из заголовка If-Match, как при редактировании
+    restored = versioned_update(BlockContent, blockcontent_id, {'text': text},
+                                parse_if_match(request.headers.get('If-Match')))['version']
+    return jsonify({'message': 'Blockcontent restored successfully', 'version': restored}), 200, etag(restored)
+
+
+# Flask Функция для редактирования контент блока и его фотографии, используя указанный идентификатор контент блока.
+# Предыдущее изображение контент блока будет удалено, если оно не являлось стандартным
+@bp.route('/blockcontent/<int:blockcontent_id>/edit/', methods=('GET', 'POST'))
+def blockcontent_edit(blockcontent_id):
+    # Получение контент блока по запросу в базу данных
+    blockcontent = BlockContent.query.get_or_404(blockcontent_id)
+    chapter_id = blockcontent.chapter_id
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        text = request.form['text']
+        uploaded_img = request.files['uploaded-file']
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename != '':
+            # Создание уникального имени использую id контент блока
+            blockcontent_img_name = "blockcontent" + str(blockcontent.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(blockcontent_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+            if blockcontent.img_link not in ("/staticFiles/images/font.jpg", get_storage().link(blockcontent_img_name)):
+                enqueue('remove_images', img_links=[blockcontent.img_link])
+            # Внесение изменений
+            blockcontent.img_link = get_storage().link(blockcontent_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=blockcontent.img_link)
+        # Внесение изменений
+        blockcontent.text = text
+        # Добавление измененного контент блока в сессию изменений
+        db.session.add(blockcontent)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('chapters.chapter', chapter_id=chapter_id))
+
+    return render_template('edit_blockcontent.html', blockcontent=blockcontent)
+
+
+# React Функция для измененения фотографии контент блока, идентификатор которого был указан. Предыдущее изображение
+# контент блока будет удалено, если оно не являлось стандартным
+@bp.route('/api/blockcontent/<int:blockcontent_id>/update-image/', methods=['GET', 'OPTIONS', 'POST'])
+def api_update_blockcontent_image(blockcontent_id):
+    # Фронтальная часть приложения перед отправлением запроса на изменение изображения привязанного к элементу
+    # отправляет OPTIONS запрос, на который необходимо ответить ответом с необходимыми заголовками, в котором
+    # указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение контент блока по запросу в базу данных
+    blockcontent = BlockContent.query.get_or_404(blockcontent_id)
+    # Получение файла изображения из формы
+    new = request.files["image"]
+    # Сохранение названия файла
+    filename = new.filename
+    # Проверка на пустой файл
+    if filename != '':
+        # Создание уникального имени использую id контент блока
+        blockcontent_img_name = "blockcontent" + str(blockcontent.id) + ".jpg"
+        # Сохранение изображения в хранилище под уникальным именем
+        get_storage().save(blockcontent_img_name, new.stream, new.mimetype)
+        # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+        if blockcontent.img_link not in ("/staticFiles/images/font.jpg", get_storage().link(blockcontent_img_name)):
+            enqueue('remove_images', img_links=[blockcontent.img_link])
+        # Внесение изменений
+        blockcontent.img_link = get_storage().link(blockcontent_img_name)
+        # Создание миниатюры фоновой задачей
+        enqueue('thumbnail', img_link=blockcontent.img_link)
+    # Добавление измененного контент блока в сессию изменений
+    db.session.add(blockcontent)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'Blockcontent updated successfully'})
+
+
+# Flask Функция для удаления фотографии контент блока, идентификатор которого был указан. Изображение
+# контент блока будет удалено, если оно не являлось стандартным
+@bp.post('/blockcontent/<int:blockcontent_id>/delete_blockcontent_image/')
+def delete_blockcontent_image(blockcontent_id):
+    # Получение контент блока по запросу в базу данных
+    blockcontent = BlockContent.query.get_or_404(blockcontent_id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if blockcontent.img_link != "/staticFiles/images/font.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[blockcontent.img_link])
+        blockcontent.img_link = "/staticFiles/images/font.jpg"
+        # Добавление измененного контент блока в сессию изменений
+        db.session.add(blockcontent)
+        # Фиксация изменений в БД
+        db.session.commit()
+    return redirect(url_for('chapters.chapter', chapter_id=blockcontent.chapter_id))
+
+
+# React Функция для удаления контент блока, указанного по его идентификатору, а также изображения,
+# которое с ним связано
+@bp.route('/api/blockcontent/<int:blockcontent_id>/delete/', methods=('GET', 'OPTIONS', 'DELETE'))
+def api_blockcontent_delete(blockcontent_id):
+    # Фронтальная часть приложения перед отправлением запроса на удаление элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'DELETE')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение контент блока по запросу в базу данных
+    blockcontent = BlockContent.query.get_or_404(blockcontent_id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if blockcontent.img_link != "/staticFiles/images/font.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[blockcontent.img_link])
+    # Удаление контент блока
+    db.session.delete(blockcontent)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return {'message': 'Blockcontent deleted successfully'}
+
+
+# Flask Функция для удаления контент блока, указанного по его идентификатору, а также
+# изображения, которое с ним связано
+@bp.post('/blockcontent/<int:blockcontent_id>/delete/')
+def blockcontent_delete(blockcontent_id):
+    # Получение контент блока по запросу в базу данных
+    blockcontent = BlockContent.query.get_or_404(blockcontent_id)
+    chapter_id = blockcontent.chapter_id
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if blockcontent.img_link != "/staticFiles/images/font.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[blockcontent.img_link])
+    # Удаление контент блока
+    db.session.delete(blockcontent)
+    # Фиксация изменений в БД
+    db.session.commit()
+    return redirect(url_for('chapters.chapter', chapter_id=chapter_id))
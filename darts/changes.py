@@ -0,0 +1,216 @@
+import json
+import time
+import datetime
+from flask import Blueprint, request, jsonify
+from sqlalchemy import event, func, insert, inspect, literal, null, select
+
+from .extensions import db
+from .models import World, LongRead, Chapter, BlockContent, WorldObj, ChangeLog
+from .serializers import change_data
+from .export import json_value
+# Журнал изменений для совместного редактирования. Каждое создание, изменение, замена изображения и удаление элемента
+# записывается в таблицу ChangeLog в той же транзакции, что и само изменение: изменения через модели записываются
+# обработчиками событий сессии, изменения одним запросом в базу данных (versioned_update, импорт) записываются явно.
+# Клиенты подписываются на изменения мира или лонгрида через поток SSE либо через долгий опрос, вместо того чтобы
+# периодически загружать мир или главу целиком. Поток SSE отдает только асинхронное приложение (aio.py): открытый
+# поток в Flask приложении занимал бы поток синхронного сервера на все время подписки, поэтому Flask приложение
+# отвечает только на долгий опрос продолжительностью не более CHANGES_MAX_WAIT секунд. Номер записи журнала служит
+# номером изменения элемента, а записи об удалении служат отметками удаленных элементов, по ним клиенты без
+# постоянного соединения получают только изменения мира с момента последней синхронизации
+
+# Типы элементов, изменения которых записываются в журнал
+CHANGE_TYPES = {
+    World: 'world',
+    LongRead: 'longread',
+    Chapter: 'chapter',
+    BlockContent: 'blockcontent',
+    WorldObj: 'worldobj',
+}
+# Количество записей журнала, которое отдается за один раз
+CHANGES_BATCH_SIZE = 500
+# Интервал в секундах между проверками журнала на наличие новых изменений
+CHANGES_POLL_INTERVAL = 1
+# Интервал в секундах между пустыми сообщениями, которые не дают прокси-серверам закрыть поток SSE
+CHANGES_HEARTBEAT = 15
+# Максимальное время ожидания изменений при долгом опросе. Ожидающий запрос занимает поток синхронного сервера,
+# поэтому время ожидания небольшое
+CHANGES_MAX_WAIT = 10
+# Количество записей журнала, которое по умолчанию и максимально обрабатывается за одну страницу синхронизации
+SYNC_PAGE_SIZE = 1000
+SYNC_MAX_PAGE_SIZE = 5000
+
+bp = Blueprint('changes', __name__)
+
+
+# Запрос идентификаторов элементов таблицы вместе с идентификаторами мира и лонгрида, к которым они относятся
+def scope_query(model):
+    table = model.__table__
+    if model is World:
+        return select(table.c.id.label('world_id'), null(), table.c.id)
+    if model is LongRead:
+        return select(table.c.world_id, table.c.id.label('longread_id'), table.c.id)
+    if model is WorldObj:
+        return select(table.c.world_id, null(), table.c.id)
+    # Главы и контент блоки относятся к миру через лонгрид
+    longread_table = LongRead.__table__
+    return (select(longread_table.c.world_id, table.c.longread_id, table.c.id)
+            .join_from(table, longread_table, table.c.longread_id == longread_table.c.id))
+
+
+# Запись изменений элементов, которые удовлетворяют условию, в журнал. Записи добавляются одним запросом
+# INSERT ... SELECT в текущей транзакции соединения, мир и лонгрид элементов определяются тем же запросом
+def log_changes(connection, model, condition, action):
+    query = scope_query(model).where(condition).add_columns(
+        literal(CHANGE_TYPES[model]), literal(action), literal(datetime.datetime.utcnow(), ChangeLog.created.type))
+    connection.execute(insert(ChangeLog.__table__).from_select(
+        ['world_id', 'longread_id', 'entity_id', 'type', 'action', 'created'], query))
+
+
+# Запись изменения одного элемента в журнал
+def log_change(connection, model, row_id, action):
+    log_changes(connection, model, model.__table__.c.id == row_id, action)
+
+
+# Удаленные элементы записываются в журнал до выполнения запросов сессии, пока строки элемента и его лонгрида еще
+# есть в базе данных
+@event.listens_for(db.session, 'before_flush')
+def log_deleted(session, flush_context, instances):
+    for obj in session.deleted:
+        if type(obj) in CHANGE_TYPES:
+            log_change(session.connection(), type(obj), obj.id, 'delete')
+
+
+# Созданные и измененные элементы записываются в журнал после выполнения запросов сессии, когда у новых элементов
+# уже есть идентификаторы. Если изменилось только изображение, изменение записывается как image
+@event.listens_for(db.session, 'after_flush')
+def log_created_and_updated(session, flush_context):
+    for obj in session.new:
+        if type(obj) in CHANGE_TYPES:
+            log_change(session.connection(), type(obj), obj.id, 'create')
+    for obj in session.dirty:
+        if type(obj) not in CHANGE_TYPES or not session.is_modified(obj, include_collections=False):
+            continue
+        changed = {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()} - {'version'}
+        log_change(session.connection(), type(obj), obj.id, 'image' if changed == {'img_link'} else 'update')
+
+
+# Получение параметров подписки из запроса: мир или лонгрид, изменения которого нужны клиенту, и номер изменения,
+# после которого нужно отдавать изменения. Номер берется из параметра since либо из заголовка Last-Event-ID, который
+# браузер передает при переподключении к потоку SSE. Функция вызывает ValueError при некорректных параметрах
+def change_params(args, last_event_id=None):
+    world_id = args.get('world_id')
+    longread_id = args.get('longread_id')
+    if world_id is None and longread_id is None:
+        raise ValueError('world_id or longread_id is required')
+    since = args.get('since', last_event_id)
+    return (int(world_id) if world_id is not None else None,
+            int(longread_id) if longread_id is not None else None,
+            int(since) if since is not None else None)
+
+
+# Запрос изменений мира или лонгрида с номерами больше указанного
+def changes_query(world_id, longread_id, since):
+    query = select(ChangeLog.__table__).where(ChangeLog.id > since)
+    if world_id is not None:
+        query = query.where(ChangeLog.world_id == world_id)
+    if longread_id is not None:
+        query = query.where(ChangeLog.longread_id == longread_id)
+    return query.order_by(ChangeLog.id).limit(CHANGES_BATCH_SIZE)
+
+
+# Запрос номера последнего изменения. Если клиент не указал номер, он получает только изменения, сделанные после
+# подписки
+def latest_change_query():
+    return select(func.coalesce(func.max(ChangeLog.id), 0))
+
+
+# Сообщение SSE с данными изменения. Номер изменения передается в поле id, его браузер вернет в заголовке
+# Last-Event-ID при переподключении
+def sse_event(change):
+    return 'id: %d\nevent: change\ndata: %s\n\n' % (change.id, json.dumps(change_data(change)))
+
+
+# Получение изменений с номерами больше указанного. Транзакция завершается после запроса, чтобы следующая проверка
+# видела изменения, зафиксированные за это время
+def fetch_changes(world_id, longread_id, since):
+    changes = db.session.execute(changes_query(world_id, longread_id, since)).all()
+    db.session.rollback()
+    return changes
+
+
+# React Функция для получения изменений мира или лонгрида долгим опросом. Если изменений нет, ответ задерживается до
+# появления изменений, но не более чем на wait секунд. Ответ содержит номер последнего изменения, который клиент
+# передает в параметре since следующего запроса. Пример: /api/changes/?longread_id=3&since=120&wait=10
+@bp.route('/api/changes/', methods=['GET'])
+def api_changes():
+    try:
+        world_id, longread_id, since = change_params(request.args)
+        wait = min(float(request.args.get('wait', 0)), CHANGES_MAX_WAIT)
+    except ValueError as error:
+        return jsonify({'message': str(error)}), 400
+    if since is None:
+        since = db.session.execute(latest_change_query()).scalar()
+    deadline = time.monotonic() + wait
+    changes = fetch_changes(world_id, longread_id, since)
+    while not changes and time.monotonic() < deadline:
+        time.sleep(CHANGES_POLL_INTERVAL)
+        changes = fetch_changes(world_id, longread_id, since)
+    return jsonify({'changes': [change_data(change) for change in changes],
+                    'last_id': changes[-1].id if changes else since})
+
+
+# Изменения мира после указанного номера изменения: текущие данные созданных и измененных элементов и отметки
+# удаленных элементов. Обрабатывается не более limit записей журнала, для каждого элемента учитывается его последнее
+# изменение на странице, данные элементов загружаются одним запросом на каждый тип элементов
+def sync_delta(world_id, since, limit):
+    log = db.session.execute(select(ChangeLog.id, ChangeLog.type, ChangeLog.entity_id, ChangeLog.action)
+                             .where(ChangeLog.world_id == world_id, ChangeLog.id > since)
+                             .order_by(ChangeLog.id).limit(limit + 1)).all()
+    has_more = len(log) > limit
+    log = log[:limit]
+    # Последнее изменение каждого элемента на странице
+    latest = {}
+    for entry in log:
+        latest[(entry.type, entry.entity_id)] = entry
+    changed = {change_type: [] for change_type in CHANGE_TYPES.values()}
+    deleted = []
+    seqs = {change_type: {} for change_type in CHANGE_TYPES.values()}
+    for (change_type, entity_id), entry in latest.items():
+        if entry.action == 'delete':
+            deleted.append({'type': change_type, 'id': entity_id, 'seq': entry.id})
+        else:
+            seqs[change_type][entity_id] = entry.id
+    for model, change_type in CHANGE_TYPES.items():
+        if not seqs[change_type]:
+            continue
+        table = model.__table__
+        # Элемент, удаленный после последнего изменения на странице, не найдется, его отметка об удалении
+        # будет на одной из следующих страниц
+        for row in db.session.execute(select(table).where(table.c.id.in_(seqs[change_type])).order_by(table.c.id)):
+            data = {column.name: json_value(row._mapping[column]) for column in table.columns}
+            data['seq'] = seqs[change_type][row.id]
+            changed[change_type].append(data)
+    return {
+        'world_id': world_id,
+        'since': since,
+        'cursor': log[-1].id if log else since,
+        'has_more': has_more,
+        'changed': changed,
+        'deleted': deleted
+    }
+
+
+# React Функция для синхронизации клиентов без постоянного соединения. Возвращает изменения мира после номера
+# изменения since (0 для полной синхронизации). Если has_more равно true, следующая страница запрашивается с номером
+# из поля cursor. Пример: /api/sync?world_id=1&since=120
+@bp.route('/api/sync', methods=['GET'])
+def api_sync():
+    try:
+        world_id = int(request.args['world_id'])
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', SYNC_PAGE_SIZE)), SYNC_MAX_PAGE_SIZE)
+    except (KeyError, ValueError):
+        return jsonify({'message': 'world_id, since and limit must be integers, world_id is required'}), 400
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+    return jsonify(sync_delta(world_id, since, limit)), 200
@@ -0,0 +1,317 @@
+import itertools
+from flask import (Blueprint, render_template, stream_template, request, url_for, redirect, jsonify, current_app,
+                   Response)
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import defer
+
+from .extensions import db
+from .models import Chapter, BlockContent
+from .versioning import versioned_update, parse_if_match, etag
+from .patch import validate_patch, patch_data
+from .jobs import enqueue, subtree_size, CASCADE_DELETE_INLINE_LIMIT
+from .serializers import preview_requested, chapter_detail_data
+from .loader import get_loader
+from .blockcontents import blockcontent_delete
+from .reads import count_reads
+
+# Количество контент блоков на странице по умолчанию и максимальное количество
+BLOCK_PAGE_SIZE = 100
+BLOCK_MAX_PAGE_SIZE = 1000
+# Количество контент блоков, загружаемых одним запросом при потоковой отрисовке страницы главы
+CHAPTER_STREAM_BATCH_SIZE = 200
+# Количество частей шаблона, которые накапливаются перед отправкой в поток ответа
+CHAPTER_STREAM_BUFFER = 100
+
+# Blueprint с функциями для работы с главами
+bp = Blueprint('chapters', __name__)
+
+
+# Параметры постраничной выдачи контент блоков главы. Контент блоки расположены в главе в порядке идентификаторов,
+# страница начинается после контент блока с идентификатором cursor либо с позиции position (номер контент блока в
+# главе начиная с 0). Функция возвращает None, если ни один параметр не указан (выдаются все контент блоки)
+def block_page_params(args):
+    if not any(name in args for name in ('cursor', 'position', 'limit')):
+        return None
+    try:
+        cursor = int(args['cursor']) if 'cursor' in args else None
+        position = int(args.get('position', 0))
+        limit = min(int(args.get('limit', BLOCK_PAGE_SIZE)), BLOCK_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('cursor, position and limit must be integers')
+    if limit < 1 or position < 0:
+        raise ValueError('limit must be positive, position must not be negative')
+    if cursor is not None and 'position' in args:
+        raise ValueError('cursor and position cannot be used together')
+    return cursor, position, limit
+
+
+# Добавление к запросу контент блоков главы условий страницы. Запрашивается на один контент блок больше, чтобы
+# определить, есть ли следующая страница. Переход по cursor выполняется по индексу без пропуска строк, поэтому время
+# запроса не зависит от номера страницы
+def block_page_query(query, chapter_id, cursor, position, limit):
+    query = query.where(BlockContent.chapter_id == chapter_id).order_by(BlockContent.id)
+    if cursor is not None:
+        query = query.where(BlockContent.id > cursor)
+    else:
+        query = query.offset(position)
+    return query.limit(limit + 1)
+
+
+# Запрос общего количества контент блоков главы и количества контент блоков до cursor включительно
+def block_count_query(chapter_id, cursor):
+    before = func.count(case((BlockContent.id <= cursor, 1))) if cursor is not None else func.count()
+    return select(func.count(), before).select_from(BlockContent).where(BlockContent.chapter_id == chapter_id)
+
+
+# Страница контент блоков и данные страницы для JSON-текста: позиция первого контент блока, количество контент блоков
+# в главе и cursor для запроса следующей страницы
+def block_page(blockcontents, counts, cursor, position, limit):
+    total, before = counts
+    has_more = len(blockcontents) > limit
+    blockcontents = blockcontents[:limit]
+    return blockcontents, {
+        'position': before if cursor is not None else position,
+        'limit': limit,
+        'total': total,
+        'cursor': blockcontents[-1].id if blockcontents else cursor,
+        'has_more': has_more
+    }
+
+
+# Объединение частей потокового шаблона по size частей, чтобы в поток ответа не отправлялись отдельные мелкие
+# фрагменты страницы
+def buffered(chunks, size):
+    while True:
+        parts = list(itertools.islice(chunks, size))
+        if not parts:
+            return
+        yield ''.join(parts)
+
+
+# Генератор контент блоков главы для потоковой отрисовки. Контент блоки загружаются пачками по cursor, поэтому
+# в памяти находится только текущая пачка, а начало страницы отправляется до загрузки всех контент блоков
+def iter_blockcontents(chapter_id, batch_size=CHAPTER_STREAM_BATCH_SIZE):
+    query = select(BlockContent).where(BlockContent.chapter_id == chapter_id).order_by(BlockContent.id)
+    cursor = 0
+    while True:
+        batch = db.session.scalars(query.where(BlockContent.id > cursor).limit(batch_size)).all()
+        # Прочтения контент блоков учитываются по мере отправки пачек
+        count_reads('blockcontent', [blockcontent.id for blockcontent in batch])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        cursor = batch[-1].id
+
+
+# Функция для передачи на React фронтальную часть приложения информации о главе по ее индексу,
+# а также информации о всех связанных с ней контент блоков. Большие главы можно запрашивать по страницам:
+# /api/chapter/1?limit=100, следующая страница - /api/chapter/1?limit=100&cursor=<page.cursor>, переход к позиции -
+# /api/chapter/1?limit=100&position=500
+@bp.route('/api/chapter/<int:chapter_id>', methods=['GET'])
+def api_chapter(chapter_id):
+    # В режиме превью полный текст контент блоков не загружается из базы данных
+    preview = preview_requested(request.args)
+    # Получение главы и связанных с ней контент блоков через загрузчик запроса. Контент блоки выбираются только по
+    # главе: глава относится к одному лонгриду, поэтому отбор по лонгриду не нужен
+    loader = get_loader()
+    try:
+        page = block_page_params(request.args)
+    except ValueError as error:
+        return jsonify({'message': str(error)}), 400
+    chapter = loader.load_or_404(Chapter, chapter_id)
+    deferred = ('text',) if preview else ()
+    if page is None:
+        blockcontents = loader.children_of(BlockContent, 'chapter_id', chapter_id, deferred)
+    else:
+        # Постраничная выдача: страница контент блоков и их количество загружаются двумя запросами
+        query = select(BlockContent).options(*[defer(getattr(BlockContent, name)) for name in deferred])
+        blockcontents, page_data = block_page(db.session.scalars(block_page_query(query, chapter_id, *page)).all(),
+                                              db.session.execute(block_count_query(chapter_id, page[0])).one(),
+                                              *page)
+    # Прочтение главы учитывается в буфере счетчиков процесса, прочтения контент блоков - только при выдаче полного
+    # текста
+    count_reads('chapter', [chapter_id])
+    if not preview:
+        count_reads('blockcontent', [blockcontent.id for blockcontent in blockcontents])
+    # Формирование JSON-текста с данными главы и контент блоками
+    chapter_data = chapter_detail_data(chapter, blockcontents, preview)
+    if page is not None:
+        chapter_data['page'] = page_data
+    # JSON-текст перенаправляется на фронтальную часть приложения
+    return jsonify(chapter_data), 200
+
+
+# Функция для передачи на Flask фронтальную часть приложения информации о главе по ее индексу,
+# а также информации о всех связанных с ней контент блоков
+@bp.route('/chapter/<int:chapter_id>/')
+def chapter(chapter_id):
+    # Получение главы через загрузчик запроса
+    loader = get_loader()
+    chapter = loader.load_or_404(Chapter, chapter_id)
+    count_reads('chapter', [chapter_id])
+    # Потоковая отрисовка: начало страницы отправляется браузеру сразу, контент блоки загружаются пачками по мере
+    # отрисовки шаблона
+    if current_app.config.get('STREAM_CHAPTER_VIEW'):
+        stream = stream_template('chapter.html', chapter=chapter, blockcontents=iter_blockcontents(chapter_id))
+        return Response(buffered(stream, CHAPTER_STREAM_BUFFER), mimetype='text/html')
+    blockcontents = loader.children_of(BlockContent, 'chapter_id', chapter_id)
+    count_reads('blockcontent', [blockcontent.id for blockcontent in blockcontents])
+    # Отсылка собранных данных на фронтальную часть приложения для их отображения
+    return render_template('chapter.html', chapter=chapter, blockcontents=blockcontents)
+
+
+# React Функция для создания главы и привязки ее к лонгриду, идентификатор которого был указан.
+# При создании главы ей будет присвоена стандартная фотография.
+@bp.route('/api/longreads/<int:longread_id>/create/', methods=('GET', 'OPTIONS', 'POST'))
+def api_chapter_create(longread_id):
+    # Фронтальная часть приложения перед отправлением запроса на создание элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    #Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Создание главы используя данные полученные из JSON-текста
+    chapter = Chapter(longread_id=longread_id,
+                      name=json["name"])
+    # Добавление главы в сессию изменений
+    db.session.add(chapter)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'Chapter created successfully'}), 201
+
+
+# Flask Функция для создания главы и привязки ее к лонгриду, идентификатор которого был указан.
+# При создании главы ей будет присвоена стандартная фотография, либо фотография загруженная в форму
+@bp.route('/longreads/<int:longread_id>/create/', methods=('GET', 'POST'))
+def chapter_create(longread_id):
+    if request.method == 'POST':
+        # Получение данных из формы
+        name = request.form['name']
+        # Создание главы используя данные полученные из формы
+        chapter = Chapter(name=name, longread_id=longread_id)
+        # Добавление главы в сессию изменений
+        db.session.add(chapter)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('longreads.longread', longread_id=longread_id))
+
+    return render_template('create_chapter.html', longread_id=longread_id)
+
+
+# React Функция для редактирования главы, используя указанный идентификатор главы
+@bp.route('/api/chapter/<int:chapter_id>/edit/', methods=['GET', 'POST', 'OPTIONS'])
+def api_chapter_edit(chapter_id):
+    # Фронтальная часть приложения перед отправлением запроса на редактирование элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Внесение изменений одним запросом в базу данных без предварительного чтения. Если в заголовке If-Match указана
+    # версия, изменение выполняется только при совпадении версии, иначе отсылается ответ 412
+    version = versioned_update(Chapter, chapter_id, {'name': json["name"]},
+                               parse_if_match(request.headers.get('If-Match')))['version']
+    # Отсылка сообщения с новой версией
+    return jsonify({'message': 'Chapter updated successfully', 'version': version}), 200, etag(version)
+
+
+# React Функция для частичного изменения главы. Принимает JSON-текст только с изменяемыми полями и изменяет их одним
+# запросом в базу данных без предварительного чтения главы
+@bp.route('/api/chapter/<int:chapter_id>', methods=['PATCH'])
+def api_chapter_patch(chapter_id):
+    # Проверка полученных полей, при ошибке отсылается ответ 400 со списком ошибок
+    values = validate_patch(Chapter, request.get_json(silent=True))
+    # Внесение изменений с учетом версии из заголовка If-Match
+    changed = versioned_update(Chapter, chapter_id, values, parse_if_match(request.headers.get('If-Match')))
+    # Отсылка только измененных полей и новой версии
+    return jsonify(patch_data(chapter_id, changed)), 200, etag(changed['version'])
+
+
+# Flask Функция для редактирования главы, используя указанный идентификатор главы
+@bp.route('/chapter/<int:chapter_id>/edit/', methods=('GET', 'POST'))
+def chapter_edit(chapter_id):
+    # Получение объекта главы по запросу в базу данных
+    chapter = Chapter.query.get_or_404(chapter_id)
+    longread_id = chapter.longread_id
+    if request.method == 'POST':
+        # Получение данных из формы
+        name = request.form['name']
+        # Внесение изменений
+        chapter.name = name
+        chapter.longread_id = longread_id
+        # Добавление измененной главы в сессию изменений
+        db.session.add(chapter)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('chapters.chapter', chapter_id=chapter_id))
+
+    return render_template('edit_chapter.html', chapter=chapter)
+
+
+# React Функция для удаления главы, указанной по ее идентификатору,
+# а также всех контент блоков, которые с ней связаны
+@bp.route('/api/chapter/<int:chapter_id>/delete/', methods=('GET', 'OPTIONS', 'DELETE'))
+def api_chapter_delete(chapter_id):
+    # Фронтальная часть приложения перед отправлением запроса на удаление элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'DELETE')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение главы по запросу в базу данных
+    chapter = Chapter.query.get_or_404(chapter_id)
+    # Глава с большим количеством контент блоков удаляется фоновой задачей, чтобы запрос не ждал окончания удаления
+    if subtree_size('chapter', chapter_id) > CASCADE_DELETE_INLINE_LIMIT:
+        job = enqueue('cascade_delete', element='chapter', row_id=chapter_id)
+        db.session.commit()
+        return jsonify({'message': 'Chapter deletion queued', 'job_id': job.id}), 202
+    # Получение списка контент блоков по запросу в базу данных, связанных с главой
+    blockcontents = BlockContent.query.filter(BlockContent.chapter_id == chapter_id,
+                                              BlockContent.longread_id == chapter.longread_id).all()
+    # Удаление контент блоков, связанных с главой
+    for blockcontent in blockcontents:
+        blockcontent_delete(blockcontent.id)
+    # Удаление главы
+    db.session.delete(chapter)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return {'message': 'Chapter deleted successfully'}
+
+
+# Flask Функция для удаления главы, указанной по ее идентификатору,
+# а также всех контент блоков, которые с ней связаны
+@bp.post('/chapter/<int:chapter_id>/delete/')
+def chapter_delete(chapter_id):
+    # Получение главы по запросу в базу данных
+    chapter = Chapter.query.get_or_404(chapter_id)
+    longread_id = chapter.longread_id
+    # Глава с большим количеством контент блоков удаляется фоновой задачей
+    if subtree_size('chapter', chapter_id) > CASCADE_DELETE_INLINE_LIMIT:
+        enqueue('cascade_delete', element='chapter', row_id=chapter_id)
+        db.session.commit()
+        return redirect(url_for('longreads.longread', longread_id=longread_id))
+    # Получение списка контент блоков по запросу в базу данных, связанных с главой
+    blockcontents = BlockContent.query.filter(BlockContent.chapter_id == chapter_id,
+                                              BlockContent.longread_id == chapter.longread_id).all()
+    # Удаление контент блоков, связанных с главой
+    for blockcontent in blockcontents:
+        blockcontent_delete(blockcontent.id)
+    # Удаление главы
+    db.session.delete(chapter)
+    # Фиксация изменений в БД
+    db.session.commit()
+    return redirect(url_for('longreads.longread', longread_id=longread_id))
@@ -0,0 +1,131 @@
+import click
+from sqlalchemy import bindparam, func, insert, inspect, select, update
+from sqlalchemy.schema import CreateColumn
+
+from .extensions import db
+
+
+# Обновление схемы базы данных текущего шарда: создание отсутствующих таблиц и добавление в существующие таблицы
+# полей и индексов, которые появились в моделях. Функция возвращает список добавленных полей и индексов
+def upgrade_schema():
+    # Импорт моделей для регистрации таблиц в метаданных
+    from . import models  # noqa: F401
+    engine = db.session.get_bind()
+    # Создание отсутствующих таблиц. Новая база данных создается в режиме auto_vacuum = INCREMENTAL, чтобы свободные
+    # страницы можно было возвращать без полного VACUUM (см. maintenance.py). Режим применяется при создании первой
+    # таблицы, поэтому он включается в том же соединении
+    with engine.begin() as conn:
+        if not inspect(conn).get_table_names():
+            conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        db.metadata.create_all(conn)
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                conn.exec_driver_sql('ALTER TABLE %s ADD COLUMN %s' % (
+                    preparer.format_table(table), CreateColumn(column).compile(dialect=engine.dialect)))
+                added.append('%s.%s' % (table.name, column.name))
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    added.append(index.name)
+    return added
+
+
+# Заполнение журнала изменений для элементов, созданных до появления журнала. Каждому такому элементу добавляется
+# запись о создании, чтобы он получил номер изменения и попал в полную синхронизацию
+def backfill_changes():
+    from .models import ChangeLog
+    from .changes import CHANGE_TYPES, log_changes
+    filled = 0
+    for model, change_type in CHANGE_TYPES.items():
+        table = model.__table__
+        logged = select(ChangeLog.id).where(ChangeLog.type == change_type, ChangeLog.entity_id == table.c.id)
+        filled += db.session.execute(select(func.count()).select_from(table).where(~logged.exists())).scalar()
+        log_changes(db.session.connection(), model, ~logged.exists(), 'create')
+        db.session.commit()
+    return filled
+
+
+# Заполнение превью для строк, созданных до появления полей с превью
+def backfill_previews(batch_size=500):
+    from .models import World, LongRead, BlockContent, WorldObj, PREVIEW_COLUMNS, make_preview
+    filled = 0
+    for model in (World, LongRead, BlockContent, WorldObj):
+        table = model.__table__
+        for source, target in PREVIEW_COLUMNS.items():
+            if source not in table.c:
+                continue
+            while True:
+                rows = db.session.execute(select(table.c.id, table.c[source])
+                                          .where(table.c[target].is_(None), table.c[source].is_not(None))
+                                          .limit(batch_size)).all()
+                if not rows:
+                    break
+                db.session.execute(update(table).where(table.c.id == bindparam('row_id'))
+                                   .values({target: bindparam('preview')}),
+                                   [{'row_id': row.id, 'preview': make_preview(row[1])} for row in rows])
+                db.session.commit()
+                filled += len(rows)
+    return filled
+
+
+# Запись снимка текущего текста для контент блоков без ревизий, созданных до появления истории изменений текста.
+# Снимок получает текущую версию контент блока, поэтому при первом изменении такого контент блока исходный текст
+# сохраняется в истории. Сжатый текст записывается в снимок без распаковки
+def backfill_revisions(batch_size=500):
+    from .models import BlockContent, BlockRevision
+    from .revisions import revision_row
+    table = BlockContent.__table__
+    has_revisions = select(BlockRevision.id).where(BlockRevision.blockcontent_id == table.c.id).exists()
+    filled = 0
+    while True:
+        rows = db.session.execute(select(table.c.id, table.c.version, table.c.text).where(~has_revisions)
+                                  .limit(batch_size)).all()
+        if not rows:
+            break
+        db.session.execute(insert(BlockRevision.__table__),
+                           [revision_row(row.id, row.version, True, row.text) for row in rows])
+        db.session.commit()
+        filled += len(rows)
+    return filled
+
+
+# CLI команда для создания таблиц в базе данных, указанной в конфигурации приложения, и обновления схемы
+# существующей базы данных. Используется для подготовки новой базы данных, в том числе базы данных в памяти
+# для тестов, а также после обновления приложения. При включенных шардах обновляются базы данных всех шардов
+@click.command('init-db')
+def init_db_command():
+    from .sharding import shard_names, sharding_enabled, use_shard
+    for shard in shard_names():
+        with use_shard(shard):
+            if sharding_enabled():
+                click.echo('Shard %s' % shard)
+            init_shard()
+    click.echo('Database initialized')
+
+
+# Обновление схемы и заполнение новых полей базы данных текущего шарда
+def init_shard():
+    for column in upgrade_schema():
+        click.echo('Added %s' % column)
+    filled = backfill_previews()
+    if filled:
+        click.echo('Filled %d previews' % filled)
+    logged = backfill_changes()
+    if logged:
+        click.echo('Logged %d existing elements' % logged)
+    snapshots = backfill_revisions()
+    if snapshots:
+        click.echo('Saved %d block text snapshots' % snapshots)
+    # Счетчики дочерних элементов пересчитываются, в том числе сразу после добавления полей счетчиков
+    from .counters import repair_counters
+    repaired = len(repair_counters())
+    if repaired:
+        click.echo('Repaired %d counters' % repaired)
@@ -0,0 +1,336 @@
+import os
+import zlib
+import struct
+import hashlib
+import datetime
+import threading
+import collections
+from collections import UserString
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import select, update, func, bindparam, cast, LargeBinary
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.types import TypeDecorator, String
+
+from .extensions import db
+# Сжатие больших текстовых полей (полный текст контент блоков и описание мира). Включается настройкой
+# TEXT_COMPRESSION ('zlib' или 'zstd'), после чего тексты длиннее TEXT_COMPRESSION_MIN_SIZE символов сохраняются
+# в базе данных в сжатом виде с общим словарем, обученным на существующих текстах. SQLite хранит в одном поле и
+# строки, и двоичные данные, поэтому сжатые и несжатые значения уживаются в одной таблице без изменения схемы.
+# Сжатое значение распаковывается только при первом обращении к тексту (формирование JSON-текста, отрисовка
+# шаблона), а в режиме превью поле вообще не загружается. Существующие строки сжимаются и распаковываются командой
+# compress-text
+
+# Заголовок сжатого значения: признак, номер алгоритма и идентификатор словаря (первые байты его SHA-1)
+COMPRESSED_HEADER = struct.Struct('>2sB4s')
+COMPRESSED_MAGIC = b'DZ'
+# Номера алгоритмов сжатия в заголовке
+CODECS = {'zlib': 1, 'zstd': 2}
+# Идентификатор словаря для значений, сжатых без словаря
+NO_DICTIONARY = b'\0\0\0\0'
+# Тексты короче этого количества символов не сжимаются: выигрыш меньше размера заголовка и затрат на распаковку
+TEXT_COMPRESSION_MIN_SIZE = 256
+# Уровни сжатия. Тексты сжимаются при каждом сохранении, поэтому используются быстрые уровни
+COMPRESSION_LEVELS = {'zlib': 6, 'zstd': 3}
+# Размер словаря: zlib использует не более 32 КБ словаря (размер окна), для zstd словарь может быть больше
+DICTIONARY_SIZES = {'zlib': 32 * 1024, 'zstd': 64 * 1024}
+# Количество текстов, на которых обучается словарь
+DICTIONARY_SAMPLES = 1000
+# Количество строк, которые сжимаются одним запросом командой compress-text
+COMPRESSION_BATCH_SIZE = 500
+
+# Словари по идентификаторам: алгоритм и содержимое словаря. Идентификатор вычисляется по содержимому, поэтому
+# словари разных баз данных не пересекаются
+dictionaries = {}
+# Подготовленные объекты zstd для каждого потока: сжатие и распаковка с одним словарем не потокобезопасны
+zstd_local = threading.local()
+
+
+# Импорт библиотеки zstandard, которая нужна только для алгоритма zstd
+def import_zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('TEXT_COMPRESSION = "zstd" requires the zstandard package')
+    return zstandard
+
+
+# Идентификатор словаря по его содержимому
+def dictionary_id(data):
+    return hashlib.sha1(data).digest()[:4] if data else NO_DICTIONARY
+
+
+# Словарь по идентификатору. Словари, обученные другим процессом после запуска приложения, загружаются из базы
+# данных при первом обращении
+def dictionary(dict_id):
+    if dict_id == NO_DICTIONARY:
+        return b''
+    if dict_id not in dictionaries and has_app_context():
+        load_dictionaries()
+    if dict_id not in dictionaries:
+        raise LookupError('Compression dictionary %s is not loaded' % dict_id.hex())
+    return dictionaries[dict_id][1]
+
+
+# Объект zstd для сжатия или распаковки со словарем, один на поток
+def zstd_object(kind, dict_id, level=None):
+    cache = zstd_local.__dict__.setdefault('objects', {})
+    key = (kind, dict_id)
+    if key not in cache:
+        zstandard = import_zstd()
+        data = dictionary(dict_id)
+        dict_data = zstandard.ZstdCompressionDict(data) if data else None
+        if kind == 'compress':
+            cache[key] = zstandard.ZstdCompressor(level=level, dict_data=dict_data, write_checksum=False,
+                                                  write_dict_id=False)
+        else:
+            cache[key] = zstandard.ZstdDecompressor(dict_data=dict_data)
+    return cache[key]
+
+
+# Сжатие текста выбранным алгоритмом со словарем. Для zlib используется поток deflate без заголовка и контрольной
+# суммы, их роль выполняет собственный заголовок
+def compress_text(text, codec, dict_id=NO_DICTIONARY):
+    raw = text.encode('utf-8')
+    if codec == 'zstd':
+        payload = zstd_object('compress', dict_id, COMPRESSION_LEVELS[codec]).compress(raw)
+    else:
+        data = dictionary(dict_id)
+        compressor = (zlib.compressobj(COMPRESSION_LEVELS[codec], zlib.DEFLATED, -15, zdict=data) if data
+                      else zlib.compressobj(COMPRESSION_LEVELS[codec], zlib.DEFLATED, -15))
+        payload = compressor.compress(raw) + compressor.flush()
+    return COMPRESSED_HEADER.pack(COMPRESSED_MAGIC, CODECS[codec], dict_id) + payload
+
+
+# Распаковка значения, сжатого функцией compress_text
+def decompress_blob(blob):
+    magic, codec, dict_id = COMPRESSED_HEADER.unpack_from(blob)
+    if magic != COMPRESSED_MAGIC:
+        raise ValueError('Not a compressed text value')
+    payload = blob[COMPRESSED_HEADER.size:]
+    if codec == CODECS['zstd']:
+        raw = zstd_object('decompress', dict_id).decompress(payload)
+    else:
+        data = dictionary(dict_id)
+        decompressor = zlib.decompressobj(-15, zdict=data) if data else zlib.decompressobj(-15)
+        raw = decompressor.decompress(payload) + decompressor.flush()
+    return raw.decode('utf-8')
+
+
+# Текст, который распаковывается при первом обращении к нему. Объект ведет себя как строка (шаблоны, len, срезы,
+# сравнение), а в JSON-тексты передается после преобразования str(). Неизмененный текст записывается обратно
+# в базу данных в сжатом виде без повторного сжатия
+class LazyText(UserString):
+    def __init__(self, seq='', blob=None):
+        self.blob = blob
+        self.text = None if blob is not None else str(seq)
+
+    @property
+    def data(self):
+        if self.text is None:
+            self.text = decompress_blob(self.blob)
+        return self.text
+
+    @property
+    def decompressed(self):
+        return self.text is not None
+
+
+# Преобразование значения текстового поля в обычную строку для JSON-текстов
+def plain_text(value):
+    return str(value) if isinstance(value, LazyText) else value
+
+
+# Тип поля со сжатием. В базе данных поле остается строковым, сжатые значения хранятся как двоичные данные
+class CompressedText(TypeDecorator):
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, LazyText) and not value.decompressed:
+            return value.blob
+        value = str(value)
+        settings = current_app.extensions.get('darts_compression') if has_app_context() else None
+        if settings is None or settings.codec is None or len(value) < settings.min_size:
+            return value
+        return compress_text(value, settings.codec, settings.dict_id)
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, bytes):
+            return LazyText(blob=value)
+        return value
+
+
+# Настройки сжатия приложения: алгоритм, минимальный размер текста и текущий словарь алгоритма
+class TextCompression:
+    def __init__(self, codec, min_size):
+        self.codec = codec
+        self.min_size = min_size
+        self.dict_id = NO_DICTIONARY
+
+
+# Загрузка всех словарей из базы данных. Текущим словарем алгоритма становится последний обученный словарь
+def load_dictionaries():
+    from .models import CompressionDict
+    rows = db.session.execute(select(CompressionDict.codec, CompressionDict.data).order_by(CompressionDict.id)).all()
+    for codec, data in rows:
+        dictionaries[dictionary_id(data)] = (codec, data)
+    settings = current_app.extensions.get('darts_compression')
+    if settings is not None and settings.codec is not None:
+        current = [data for codec, data in rows if codec == settings.codec]
+        settings.dict_id = dictionary_id(current[-1]) if current else NO_DICTIONARY
+
+
+# Подключение настроек сжатия к приложению. Если сжатие включено, словари загружаются сразу, в том числе для
+# асинхронного API, которое работает без контекста приложения
+def init_compression(app):
+    codec = app.config.get('TEXT_COMPRESSION')
+    if codec is not None and codec not in CODECS:
+        raise ValueError('TEXT_COMPRESSION must be one of %s or None' % ', '.join(CODECS))
+    if codec == 'zstd':
+        import_zstd()
+    app.extensions['darts_compression'] = TextCompression(codec, app.config.get('TEXT_COMPRESSION_MIN_SIZE',
+                                                                                TEXT_COMPRESSION_MIN_SIZE))
+    if codec is not None:
+        with app.app_context():
+            try:
+                load_dictionaries()
+            except OperationalError:
+                # Таблица словарей появляется после init-db
+                db.session.rollback()
+
+
+# Поля со сжатием: модель и имя поля
+def compressed_columns():
+    from .models import World, BlockContent
+    return [(World, 'description'), (BlockContent, 'text')]
+
+
+# Случайная выборка текстов для обучения словаря
+def sample_texts(count):
+    samples = []
+    for model, name in compressed_columns():
+        column = model.__table__.c[name]
+        rows = db.session.execute(select(column).where(column.is_not(None)).order_by(func.random()).limit(count))
+        samples += [str(row[0]) for row in rows]
+    return samples
+
+
+# Словарь из частых фрагментов текстов для zlib: слова и сочетания из двух и трех слов, которые встречаются
+# в нескольких текстах. Фрагменты с наибольшим выигрышем записываются в конец словаря, ближе к сжимаемым данным
+def build_raw_dictionary(samples, size):
+    counts = collections.Counter()
+    for text in samples:
+        words = text.split()
+        counts.update({' '.join(words[i:i + n]) for n in (1, 2, 3) for i in range(len(words) - n + 1)})
+    fragments = []
+    total = 0
+    for fragment, count in sorted(counts.items(), key=lambda item: (item[1] - 1) * len(item[0]), reverse=True):
+        if count < 2 or total >= size:
+            break
+        encoded = fragment.encode('utf-8') + b' '
+        fragments.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(fragments))[-size:]
+
+
+# Обучение словаря алгоритма на выборке текстов. Для zstd используется обучение библиотеки zstandard, если
+# текстов достаточно для обучения
+def train_dictionary(codec, samples):
+    size = DICTIONARY_SIZES[codec]
+    if codec == 'zstd':
+        zstandard = import_zstd()
+        try:
+            return zstandard.train_dictionary(size, [text.encode('utf-8') for text in samples]).as_bytes()
+        except zstandard.ZstdError:
+            pass
+    return build_raw_dictionary(samples, size)
+
+
+# Сохранение словаря в базе данных и назначение его текущим словарем приложения
+def save_dictionary(codec, data, samples):
+    from .models import CompressionDict
+    db.session.add(CompressionDict(codec=codec, data=data, samples=samples,
+                                   created_at=datetime.datetime.now(datetime.timezone.utc)))
+    db.session.commit()
+    dict_id = dictionary_id(data)
+    dictionaries[dict_id] = (codec, data)
+    current_app.extensions['darts_compression'].dict_id = dict_id
+    return dict_id
+
+
+# Размер значений поля в байтах (для двоичных значений и строк в UTF-8)
+def stored_bytes(model, name):
+    column = model.__table__.c[name]
+    return db.session.execute(select(func.coalesce(func.sum(func.length(cast(column, LargeBinary))), 0))).scalar()
+
+
+# Перезапись всех значений поля с текущими настройками сжатия: значения сжимаются текущим словарем либо
+# распаковываются, если сжатие выключено. Версии элементов и журнал изменений не изменяются, тк текст остается
+# прежним. Строки обрабатываются пачками по идентификатору
+def rewrite_column(model, name, batch_size=COMPRESSION_BATCH_SIZE):
+    table = model.__table__
+    column = table.c[name]
+    statement = update(table).where(table.c.id == bindparam('row_id')).values({name: bindparam('value')})
+    last_id = 0
+    rewritten = 0
+    while True:
+        rows = db.session.execute(select(table.c.id, column).where(table.c.id > last_id, column.is_not(None))
+                                  .order_by(table.c.id).limit(batch_size)).all()
+        if not rows:
+            return rewritten
+        db.session.execute(statement, [{'row_id': row[0], 'value': str(row[1])} for row in rows])
+        db.session.commit()
+        last_id = rows[-1][0]
+        rewritten += len(rows)
+
+
+# CLI команда для сжатия существующих текстов: обучение словаря на выборке текстов и перезапись полей со сжатием.
+# С флагом --decompress тексты распаковываются, после чего сжатие можно выключить. Словарь обучается на текстах всех
+# шардов и хранится в основной базе данных, поля перезаписываются в каждом шарде
+@click.command('compress-text')
+@click.option('--codec', type=click.Choice(sorted(CODECS)), help='Алгоритм сжатия (по умолчанию TEXT_COMPRESSION)')
+@click.option('--train/--no-train', default=True, help='Обучить новый словарь на существующих текстах')
+@click.option('--samples', type=int, default=DICTIONARY_SAMPLES, help='Количество текстов для обучения словаря')
+@click.option('--decompress', is_flag=True, help='Распаковать все тексты')
+@click.option('--vacuum', is_flag=True, help='Выполнить VACUUM, чтобы уменьшить файлы баз данных')
+def compress_text_command(codec, train, samples, decompress, vacuum):
+    from .sharding import shard_names, sharding_enabled, use_shard
+    settings = current_app.extensions['darts_compression']
+    if decompress:
+        settings.codec = None
+    else:
+        settings.codec = codec or settings.codec
+        if settings.codec is None:
+            raise click.UsageError('Set TEXT_COMPRESSION or pass --codec')
+        load_dictionaries()
+        if train:
+            # Выборка делится между шардами поровну
+            texts = []
+            for shard in shard_names():
+                with use_shard(shard):
+                    texts += sample_texts(max(1, samples // len(shard_names())))
+            data = train_dictionary(settings.codec, texts)
+            dict_id = save_dictionary(settings.codec, data, len(texts))
+            click.echo('Trained %s dictionary %s: %d bytes from %d texts' % (settings.codec, dict_id.hex(),
+                                                                             len(data), len(texts)))
+    for shard in shard_names():
+        with use_shard(shard):
+            prefix = shard + ': ' if sharding_enabled() else ''
+            for model, name in compressed_columns():
+                before = stored_bytes(model, name)
+                rewritten = rewrite_column(model, name)
+                click.echo('%s%s.%s: %d rows, %d -> %d bytes' % (prefix, model.__tablename__, name, rewritten, before,
+                                                                 stored_bytes(model, name)))
+            if vacuum:
+                # База данных текущего шарда
+                engine = db.session.get_bind()
+                path = engine.url.database
+                size = os.path.getsize(path) if path and os.path.exists(path) else None
+                # VACUUM нельзя выполнить внутри транзакции
+                with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                    connection.exec_driver_sql('VACUUM')
+                if size is not None:
+                    click.echo('%sDatabase file: %d -> %d bytes' % (prefix, size, os.path.getsize(path)))
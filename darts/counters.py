@@ -0,0 +1,106 @@
+import click
+from sqlalchemy import event, func, select, update
+
+from .extensions import db
+from .models import World, LongRead, Chapter, BlockContent, WorldObj
+from .sharding import shard_names, sharding_enabled, use_shard
+# Счетчики дочерних элементов миров и лонгридов (количество лонгридов, глав, контент блоков и объектов мира). Счетчики
+# хранятся в строках мира и лонгрида, поэтому карточки на индексных страницах выводятся из одной строки без загрузки
+# списков дочерних элементов. Счетчики изменяются в той же транзакции, что и создание или удаление элементов: при
+# работе через модели - обработчиками событий сессии, при вставке и удалении одним запросом (импорт, фоновое
+# удаление) - явно. Команда repair-counters пересчитывает счетчики по таблицам
+
+# Счетчики, которые изменяются при создании и удалении элементов каждого типа: родительская таблица и поле счетчика
+COUNTERS = {
+    LongRead: [(World, 'longread_count')],
+    Chapter: [(World, 'chapter_count'), (LongRead, 'chapter_count')],
+    BlockContent: [(World, 'blockcontent_count'), (LongRead, 'blockcontent_count')],
+    WorldObj: [(World, 'worldobj_count')],
+}
+# Поля счетчиков, которые не заполняются из внешних данных (импорт)
+COUNTER_COLUMNS = {counter for counters in COUNTERS.values() for parent, counter in counters}
+
+
+# Таблица элементов и поле с идентификатором родительского элемента. Главы и контент блоки относятся к миру через
+# лонгрид, поэтому для них таблица соединяется с таблицей лонгридов
+def parent_key(model, parent):
+    table = model.__table__
+    if parent is World and model in (Chapter, BlockContent):
+        longread_table = LongRead.__table__
+        return table.join(longread_table, table.c.longread_id == longread_table.c.id), longread_table.c.world_id
+    return table, table.c[parent.__tablename__.lower() + '_id']
+
+
+# Изменение счетчиков родительских элементов на количество элементов, которые удовлетворяют условию, умноженное на
+# delta (1 при создании, -1 при удалении). Каждый счетчик изменяется одним запросом UPDATE с подзапросом, поэтому
+# количество запросов не зависит от количества элементов. При удалении функция вызывается до удаления строк
+def adjust_counters(connection, model, condition, delta):
+    for parent, counter in COUNTERS.get(model, []):
+        parent_table = parent.__table__
+        source, key = parent_key(model, parent)
+        affected = select(func.count()).select_from(source).where(condition, key == parent_table.c.id)
+        connection.execute(update(parent_table)
+                           .where(parent_table.c.id.in_(select(key).select_from(source).where(condition)))
+                           .values({counter: parent_table.c[counter] + delta * affected.scalar_subquery()}))
+
+
+# Изменение счетчиков для объектов сессии: одно изменение на каждый тип элементов
+def adjust_for_objects(session, objects, delta):
+    ids = {}
+    for obj in objects:
+        if type(obj) in COUNTERS:
+            ids.setdefault(type(obj), []).append(obj.id)
+    for model, model_ids in ids.items():
+        adjust_counters(session.connection(), model, model.__table__.c.id.in_(model_ids), delta)
+
+
+# Удаленные элементы учитываются до выполнения запросов сессии, пока строки элемента и его лонгрида еще есть в базе
+# данных
+@event.listens_for(db.session, 'before_flush')
+def count_deleted(session, flush_context, instances):
+    adjust_for_objects(session, session.deleted, -1)
+
+
+# Созданные элементы учитываются после выполнения запросов сессии, когда у них уже есть идентификаторы
+@event.listens_for(db.session, 'after_flush')
+def count_created(session, flush_context):
+    adjust_for_objects(session, session.new, 1)
+
+
+# Подзапрос с фактическим количеством дочерних элементов для поля счетчика
+def actual_count(model, parent):
+    source, key = parent_key(model, parent)
+    return select(func.count()).select_from(source).where(key == parent.__table__.c.id).scalar_subquery()
+
+
+# Пересчет всех счетчиков по таблицам. Функция возвращает список расхождений (таблица, поле, идентификатор,
+# сохраненное и фактическое значение); при dry_run счетчики не изменяются
+def repair_counters(dry_run=False):
+    mismatches = []
+    for model, counters in COUNTERS.items():
+        for parent, counter in counters:
+            parent_table = parent.__table__
+            actual = actual_count(model, parent)
+            rows = db.session.execute(select(parent_table.c.id, parent_table.c[counter], actual)
+                                      .where(parent_table.c[counter] != actual)).all()
+            mismatches += [(parent.__tablename__, counter, row[0], row[1], row[2]) for row in rows]
+            if rows and not dry_run:
+                db.session.execute(update(parent_table).where(parent_table.c[counter] != actual)
+                                   .values({counter: actual}))
+    db.session.commit()
+    return mismatches
+
+
+# CLI команда для проверки и пересчета счетчиков дочерних элементов миров и лонгридов во всех шардах
+@click.command('repair-counters')
+@click.option('--dry-run', is_flag=True, help='Только показать расхождения, не изменяя счетчики')
+def repair_counters_command(dry_run):
+    total = 0
+    for shard in shard_names():
+        with use_shard(shard):
+            mismatches = repair_counters(dry_run)
+        for table, counter, row_id, stored, actual in mismatches:
+            click.echo('%s%s %d %s: %s -> %d' % (shard + ': ' if sharding_enabled() else '', table, row_id, counter,
+                                                stored, actual))
+        total += len(mismatches)
+    click.echo('%d counters %s' % (total, 'out of date' if dry_run else 'repaired'))
@@ -0,0 +1,133 @@
+import json
+import shutil
+import zipfile
+import datetime
+import click
+from urllib.parse import urlsplit
+from sqlalchemy import select, union
+
+from .extensions import db
+from .models import World, LongRead, Chapter, BlockContent, WorldObj, blockcontents, DEFAULT_IMAGES
+from .storage import get_storage
+from .compression import plain_text
+# Экспорт мира со всеми связанными данными в формате NDJSON (одна JSON-запись на строку). Каждая таблица читается
+# отдельным запросом с курсором на стороне сервера, строки отдаются по мере чтения, поэтому объем используемой
+# памяти не зависит от размера мира. Записи идут в порядке от родительских элементов к дочерним, чтобы при импорте
+# родительский элемент всегда был создан раньше дочерних
+
+# Версия формата экспорта
+EXPORT_VERSION = 1
+# Количество строк, которое курсор получает из базы данных за один раз
+EXPORT_BATCH_SIZE = 500
+
+
+# Преобразование значения поля в значение, которое можно записать в JSON-текст
+def json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return plain_text(value)
+
+
+# Формирование строки NDJSON с типом записи и значениями всех полей строки таблицы
+def record(record_type, table, row):
+    data = {column.name: json_value(row._mapping[column]) for column in table.columns}
+    return json.dumps({'type': record_type, 'data': data}, ensure_ascii=False) + '\n'
+
+
+# Потоковое чтение строк запроса с курсором на стороне сервера
+def stream(query):
+    return db.session.execute(query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+
+
+# Генератор строк NDJSON с данными мира, лонгридов, глав, контент блоков, объектов мира, связей контент блоков с
+# объектами мира и ссылками на изображения
+def export_world(world_id):
+    world_table = World.__table__
+    longread_table = LongRead.__table__
+    chapter_table = Chapter.__table__
+    blockcontent_table = BlockContent.__table__
+    worldobj_table = WorldObj.__table__
+    # Подзапросы с идентификаторами лонгридов и объектов мира, связанных с миром
+    longread_ids = select(longread_table.c.id).where(longread_table.c.world_id == world_id)
+    worldobj_ids = select(worldobj_table.c.id).where(worldobj_table.c.world_id == world_id)
+
+    # Заголовок с версией формата
+    yield json.dumps({'type': 'header', 'version': EXPORT_VERSION, 'world_id': world_id}) + '\n'
+    for row in stream(select(world_table).where(world_table.c.id == world_id)):
+        yield record('world', world_table, row)
+    for row in stream(select(longread_table).where(longread_table.c.world_id == world_id)
+                      .order_by(longread_table.c.id)):
+        yield record('longread', longread_table, row)
+    for row in stream(select(chapter_table).where(chapter_table.c.longread_id.in_(longread_ids))
+                      .order_by(chapter_table.c.id)):
+        yield record('chapter', chapter_table, row)
+    for row in stream(select(worldobj_table).where(worldobj_table.c.world_id == world_id)
+                      .order_by(worldobj_table.c.id)):
+        yield record('worldobj', worldobj_table, row)
+    for row in stream(select(blockcontent_table).where(blockcontent_table.c.longread_id.in_(longread_ids))
+                      .order_by(blockcontent_table.c.id)):
+        yield record('blockcontent', blockcontent_table, row)
+    for row in stream(select(blockcontents).where(blockcontents.c.worldobj_id.in_(worldobj_ids))):
+        yield record('link', blockcontents, row)
+    # Список изображений, на которые ссылаются элементы мира, без повторов. Уникальность обеспечивается
+    # запросом в базу данных, а не множеством в памяти
+    images = union(
+        select(world_table.c.img_link.label('img_link')).where(world_table.c.id == world_id),
+        select(longread_table.c.img_link).where(longread_table.c.world_id == world_id),
+        select(worldobj_table.c.img_link).where(worldobj_table.c.world_id == world_id),
+        select(blockcontent_table.c.img_link).where(blockcontent_table.c.longread_id.in_(longread_ids)),
+    )
+    for row in stream(select(images.subquery())):
+        if row.img_link is not None:
+            yield json.dumps({'type': 'image', 'data': {'img_link': row.img_link}}, ensure_ascii=False) + '\n'
+
+
+# Путь к изображению в архиве: путь из ссылки img_link без начального символа /, для ссылок на хранилище S3 - путь
+# из адреса объекта
+def archive_name(img_link):
+    return urlsplit(img_link).path.lstrip('/')
+
+
+# Запись мира в zip архив: NDJSON файл и изображения, на которые ссылаются элементы мира. Изображения сохраняются
+# по путям, совпадающим со ссылками img_link, чтобы импорт мог найти их по этим ссылкам. Изображения читаются из
+# хранилища, стандартные изображения в архив не добавляются
+def export_world_archive(world_id, path):
+    storage = get_storage()
+    images = []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('world%d.ndjson' % world_id, 'w') as stream:
+            for line in export_world(world_id):
+                stream.write(line.encode('utf-8'))
+                if line.startswith('{"type": "image"'):
+                    images.append(json.loads(line)['data']['img_link'])
+        for img_link in images:
+            name = storage.name(img_link)
+            image = storage.open(name) if name is not None and img_link not in DEFAULT_IMAGES else None
+            if image is None:
+                continue
+            # Изображения уже сжаты, поэтому добавляются в архив без сжатия
+            info = zipfile.ZipInfo(archive_name(img_link), datetime.datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with image, archive.open(info, 'w') as target:
+                shutil.copyfileobj(image, target)
+
+
+# CLI команда для экспорта мира в файл или в стандартный вывод, либо в zip архив вместе с изображениями. Мир
+# экспортируется из шарда, в котором он находится по каталогу
+@click.command('export-world')
+@click.argument('world_id', type=int)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='Файл для записи NDJSON (по умолчанию стандартный вывод)')
+@click.option('--archive', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Zip архив для записи NDJSON вместе с изображениями')
+def export_world_command(world_id, output, archive):
+    from .sharding import use_shard, world_shard
+    with use_shard(world_shard(world_id)[0]):
+        # Проверка существования мира
+        if db.session.get(World, world_id) is None:
+            raise click.ClickException('World %d not found' % world_id)
+        if archive is not None:
+            export_world_archive(world_id, archive)
+            return
+        for line in export_world(world_id):
+            output.write(line)
@@ -0,0 +1,38 @@
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from flask_cors import CORS
+# Расширения создаются без привязки к приложению и подключаются к нему в фабрике create_app, благодаря чему
+# в одном процессе может существовать несколько приложений с разными базами данных (например, в тестах)
+
+# Имя основной базы данных (SQLALCHEMY_DATABASE_URI) среди шардов
+MAIN_SHARD = 'main'
+
+
+# Таблица, к которой относится запрос сессии
+def clause_table(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table
+    if isinstance(clause, sa.Table):
+        return clause
+    if isinstance(clause, sa.UpdateBase) and isinstance(clause.table, sa.Table):
+        return clause.table
+    return None
+
+
+# Сессия, которая выполняет запросы в базе данных текущего шарда (см. sharding.py). Шард выбирается для каждого
+# запроса к приложению (g.shard), для CLI команд и процесса фоновых задач - настройкой SHARD. Таблицы каталога
+# (с info['catalog']) всегда находятся в основной базе данных
+class ShardedSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shard = g.get('shard') or current_app.config.get('SHARD') or MAIN_SHARD
+            table = clause_table(mapper, clause)
+            if shard != MAIN_SHARD and not (table is not None and table.info.get('catalog')):
+                return self._db.engines['shard:' + shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': ShardedSession})
+cors = CORS()
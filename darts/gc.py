@@ -0,0 +1,171 @@
+import time
+import click
+from sqlalchemy import select, union_all, update
+
+from .extensions import db, MAIN_SHARD
+from .models import World, LongRead, BlockContent, WorldObj, DEFAULT_IMAGES
+from .changes import log_changes
+from .sharding import shard_names, use_shard, world_placement
+from .storage import get_storage, thumbnail_name, THUMBS_PREFIX
+# Сборка мусора в хранилище изображений. Файлы и строки таблиц удаляются разными операциями, поэтому после сбоев
+# в хранилище остаются файлы, на которые не ссылается ни один элемент, а у элементов остаются ссылки на отсутствующие
+# файлы. Хранилище перечисляется потоком, имена файлов проверяются по ссылкам img_link пачками одним запросом на пачку,
+# а скорость обработки ограничивается, чтобы сборка мусора не мешала работе приложения. В памяти находится только
+# текущая пачка файлов или строк. Ссылки проверяются во всех шардах (см. sharding.py)
+
+# Таблицы со ссылками на изображения (у глав изображений нет)
+IMAGE_MODELS = (World, LongRead, BlockContent, WorldObj)
+# Количество файлов или строк, которые проверяются одним запросом в базу данных
+GC_BATCH_SIZE = 500
+
+
+# Ссылки из списка, на которые ссылается хотя бы один элемент любого шарда
+def referenced_links(img_links):
+    query = union_all(*[select(model.img_link).where(model.img_link.in_(img_links)) for model in IMAGE_MODELS])
+    used = set()
+    for shard in shard_names():
+        with use_shard(shard):
+            used.update(row[0] for row in db.session.execute(query))
+    return used
+
+
+# Ограничение скорости: ожидание, пока с начала обработки не пройдет столько времени, сколько нужно для обработки
+# processed элементов со скоростью rate элементов в секунду
+def throttle(started, processed, rate):
+    if rate:
+        delay = started + processed / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Поиск изображений в хранилище, на которые не ссылается ни один элемент. Генератор возвращает имя и размер
+# каждого такого изображения. Изображения моложе min_age секунд пропускаются: обработчики сохраняют изображение до
+# фиксации строки в базе данных, а при прямой загрузке изображение появляется до подтверждения загрузки. Миниатюры,
+# исходное изображение которых удалено, тоже считаются лишними
+def find_orphans(storage, min_age, rate, batch_size=GC_BATCH_SIZE):
+    started = time.monotonic()
+    processed = 0
+    newest = time.time() - min_age
+    batch = {}
+    for name, size, modified in storage.list():
+        if name.startswith(THUMBS_PREFIX):
+            if not storage.exists(name[len(THUMBS_PREFIX):]):
+                yield name, size
+            continue
+        img_link = storage.link(name)
+        if img_link in DEFAULT_IMAGES or modified > newest:
+            continue
+        batch[img_link] = (name, size)
+        if len(batch) >= batch_size:
+            yield from check_batch(batch)
+            processed += len(batch)
+            batch = {}
+            throttle(started, processed, rate)
+    yield from check_batch(batch)
+
+
+# Проверка пачки изображений по ссылкам из базы данных
+def check_batch(batch):
+    if not batch:
+        return
+    used = referenced_links(list(batch))
+    for img_link, (name, size) in batch.items():
+        if img_link not in used:
+            yield name, size
+
+
+# Поиск элементов, ссылающихся на отсутствующие изображения или на изображения вне хранилища. Генератор возвращает
+# шард, модель, идентификатор элемента и ссылку
+def find_missing(storage, rate, batch_size=GC_BATCH_SIZE):
+    started = time.monotonic()
+    processed = 0
+    for shard in shard_names():
+        for model in IMAGE_MODELS:
+            # Шард выбирается только для выполнения запроса, строки читаются потоком вне блока with
+            with use_shard(shard):
+                rows = db.session.execute(select(model.id, model.img_link).where(model.img_link.is_not(None))
+                                          .execution_options(stream_results=True, yield_per=batch_size))
+            for row in rows:
+                if row.img_link not in DEFAULT_IMAGES:
+                    name = storage.name(row.img_link)
+                    if name is None or not storage.exists(name):
+                        yield shard, model, row.id, row.img_link
+                processed += 1
+                if processed % batch_size == 0:
+                    throttle(started, processed, rate)
+
+
+# Запрос идентификаторов миров и ссылок на изображения всех элементов мира
+def world_images_query():
+    return union_all(
+        select(World.id.label('world_id'), World.img_link),
+        select(LongRead.world_id, LongRead.img_link),
+        select(WorldObj.world_id, WorldObj.img_link),
+        select(LongRead.world_id, BlockContent.img_link).join_from(BlockContent, LongRead,
+                                                                  BlockContent.longread_id == LongRead.id),
+    )
+
+
+# Объем изображений каждого мира: количество файлов и их общий размер. Строки читаются потоком, в памяти хранятся
+# только суммы по мирам. Стандартные изображения не учитываются. Для хранилища S3 размер каждого изображения
+# запрашивается отдельным запросом HEAD. Строки мира учитываются только в шарде мира по каталогу, чтобы строки
+# прерванного переноса не учитывались дважды
+def storage_by_world(storage, batch_size=GC_BATCH_SIZE):
+    usage = {}
+    placement = world_placement()
+    for shard in shard_names():
+        with use_shard(shard):
+            rows = db.session.execute(select(world_images_query().subquery())
+                                      .execution_options(stream_results=True, yield_per=batch_size))
+        for row in rows:
+            if not row.img_link or row.img_link in DEFAULT_IMAGES or placement.get(row.world_id, MAIN_SHARD) != shard:
+                continue
+            name = storage.name(row.img_link)
+            size = storage.size(name) if name is not None else None
+            if size is None:
+                continue
+            files, total = usage.get(row.world_id, (0, 0))
+            usage[row.world_id] = (files + 1, total + size)
+    return usage
+
+
+# Замена ссылки на отсутствующий файл ссылкой на стандартное изображение в шарде элемента
+def reset_missing_image(shard, model, row_id):
+    default = DEFAULT_IMAGES[1] if model is BlockContent else DEFAULT_IMAGES[0]
+    with use_shard(shard):
+        db.session.execute(update(model).where(model.id == row_id)
+                           .values(img_link=default, version=model.version + 1))
+        log_changes(db.session.connection(), model, model.id == row_id, 'image')
+        db.session.commit()
+
+
+# CLI команда для сборки мусора в папке с изображениями и отчета об объеме изображений по мирам
+@click.command('gc-images')
+@click.option('--dry-run', is_flag=True, help='Только показать лишние файлы, не удаляя их')
+@click.option('--min-age', type=int, default=3600, help='Не удалять файлы моложе указанного количества секунд')
+@click.option('--rate', type=float, default=500, help='Максимальное количество файлов или строк в секунду (0 - без '
+                                                      'ограничения)')
+@click.option('--reset-missing', is_flag=True, help='Заменить ссылки на отсутствующие файлы стандартным изображением')
+def gc_images_command(dry_run, min_age, rate, reset_missing):
+    storage = get_storage()
+    orphans = orphan_bytes = 0
+    for name, size in find_orphans(storage, min_age, rate):
+        orphans += 1
+        orphan_bytes += size
+        click.echo('%s %s (%d bytes)' % ('orphan' if dry_run else 'removed', name, size))
+        if not dry_run:
+            storage.delete(name)
+            storage.delete(thumbnail_name(name))
+    missing = 0
+    # Элементы собираются до изменения ссылок, чтобы не изменять таблицу во время потокового чтения
+    rows = list(find_missing(storage, rate)) if reset_missing else find_missing(storage, rate)
+    for shard, model, row_id, img_link in rows:
+        missing += 1
+        click.echo('missing %s %d %s' % (model.__tablename__, row_id, img_link))
+        if reset_missing and not dry_run:
+            reset_missing_image(shard, model, row_id)
+    click.echo('World  Files  Bytes')
+    for world_id, (files, total) in sorted(storage_by_world(storage).items()):
+        click.echo('%5d  %5d  %d' % (world_id, files, total))
+    click.echo('%d orphaned files (%d bytes) %s, %d elements reference missing files' % (
+        orphans, orphan_bytes, 'found' if dry_run else 'removed', missing))
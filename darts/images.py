@@ -0,0 +1,111 @@
+import uuid
+from flask import Blueprint, request, jsonify
+from itsdangerous import BadData
+
+from .extensions import db
+from .models import World, LongRead, BlockContent, WorldObj, DEFAULT_IMAGES
+from .jobs import enqueue
+from .serializers import image_url
+from .sharding import route_element
+from .storage import get_storage, FileSystemStorage, valid_name
+from .versioning import etag
+# Прямая загрузка изображений. Клиент запрашивает подписанную ссылку, загружает изображение по ней напрямую
+# в хранилище (для хранилища S3 файл не проходит через сервер приложения) и подтверждает загрузку, после чего
+# изображение присваивается элементу. Пример:
+# 1. POST /api/images/upload-url/ {"type": "world", "id": 1, "content_type": "image/png"}
+# 2. PUT <upload.url> с заголовками из upload.headers и файлом в теле запроса
+# 3. POST /api/images/confirm/ {"type": "world", "id": 1, "name": "<name из ответа на первый запрос>"}
+
+# Элементы, у которых есть изображения
+IMAGE_ELEMENTS = {
+    'world': World,
+    'longread': LongRead,
+    'blockcontent': BlockContent,
+    'worldobj': WorldObj,
+}
+# Типы изображений, которые можно загрузить, и расширения файлов для них
+IMAGE_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+bp = Blueprint('images', __name__)
+
+
+# Получение типа и элемента из JSON-текста запроса. Идентификатора элемента нет в адресе, поэтому шард элемента
+# выбирается здесь, и задачи обработчика добавляются в тот же шард. Функция возвращает элемент либо ответ с ошибкой
+def image_element(data):
+    if not isinstance(data, dict) or data.get('type') not in IMAGE_ELEMENTS or not isinstance(data.get('id'), int):
+        return None, (jsonify({'message': 'type must be one of %s, id must be an integer'
+                                          % ', '.join(IMAGE_ELEMENTS)}), 400)
+    model = IMAGE_ELEMENTS[data['type']]
+    error = route_element(model, data['id'])
+    if error is not None:
+        return None, error
+    element = db.session.get(model, data['id'])
+    if element is None:
+        return None, (jsonify({'message': '%s %d not found' % (data['type'], data['id'])}), 404)
+    return element, None
+
+
+# React Функция для получения подписанной ссылки для прямой загрузки изображения элемента. Имя изображения
+# уникально для каждой загрузки, поэтому новое изображение не перезаписывает текущее до подтверждения загрузки
+@bp.route('/api/images/upload-url/', methods=['POST'])
+def api_image_upload_url():
+    data = request.get_json(silent=True)
+    element, error = image_element(data)
+    if error is not None:
+        return error
+    content_type = data.get('content_type')
+    if content_type not in IMAGE_TYPES:
+        return jsonify({'message': 'content_type must be one of %s' % ', '.join(IMAGE_TYPES)}), 400
+    name = '%s%d-%s%s' % (data['type'], element.id, uuid.uuid4().hex[:8], IMAGE_TYPES[content_type])
+    return jsonify({'name': name, 'upload': get_storage().upload_url(name, content_type)}), 200
+
+
+# Прием прямой загрузки для хранилища в папке на диске. Для хранилища S3 изображение загружается в бакет по
+# подписанной ссылке S3, и этот обработчик не используется
+@bp.route('/api/images/upload/<token>', methods=['PUT'])
+def api_direct_upload(token):
+    storage = get_storage()
+    if not isinstance(storage, FileSystemStorage):
+        return jsonify({'message': 'Direct uploads go to the object storage'}), 404
+    try:
+        name, content_type = storage.verify_upload(token)
+    except BadData:
+        return jsonify({'message': 'Invalid or expired upload URL'}), 403
+    # Тип содержимого входит в подпись, как и в подписанных ссылках S3
+    if request.mimetype != content_type:
+        return jsonify({'message': 'Content-Type must be %s' % content_type}), 400
+    storage.save(name, request.stream, content_type)
+    return '', 200
+
+
+# React Функция для подтверждения прямой загрузки: загруженное изображение присваивается элементу, предыдущее
+# изображение удаляется фоновой задачей, если оно не стандартное
+@bp.route('/api/images/confirm/', methods=['POST'])
+def api_image_confirm():
+    data = request.get_json(silent=True)
+    element, error = image_element(data)
+    if error is not None:
+        return error
+    name = data.get('name')
+    storage = get_storage()
+    # Элементу можно присвоить только изображение, загруженное по ссылке для этого элемента
+    if (not isinstance(name, str) or not valid_name(name) or '/' in name
+            or not name.startswith('%s%d-' % (data['type'], element.id))):
+        return jsonify({'message': 'name does not belong to this element'}), 400
+    if not storage.exists(name):
+        return jsonify({'message': 'Image %s has not been uploaded' % name}), 409
+    img_link = storage.link(name)
+    if element.img_link != img_link:
+        if element.img_link not in DEFAULT_IMAGES:
+            enqueue('remove_images', img_links=[element.img_link])
+        element.img_link = img_link
+        # Создание миниатюры фоновой задачей
+        enqueue('thumbnail', img_link=img_link)
+        db.session.commit()
+    return jsonify({'message': 'Image updated successfully', 'img_link': image_url(img_link),
+                    'version': element.version}), 200, etag(element.version)
@@ -0,0 +1,270 @@
+import io
+import json
+import tarfile
+import zipfile
+import datetime
+import mimetypes
+import posixpath
+import click
+from sqlalchemy import insert, select
+
+from .extensions import db
+from .models import (World, LongRead, Chapter, BlockContent, BlockRevision, WorldObj, ImportJob, ImportIdMap,
+                     blockcontents, PREVIEW_COLUMNS, DEFAULT_IMAGES, make_preview)
+from .export import EXPORT_VERSION, archive_name
+from .changes import CHANGE_TYPES, log_changes
+from .storage import get_storage
+from .counters import COUNTER_COLUMNS, adjust_counters
+from .sharding import allocate_ids
+from .reads import READ_COLUMNS
+from .revisions import revision_row
+# Импорт мира из NDJSON файла, созданного экспортом, или из архива (zip/tar), в котором вместе с NDJSON файлом лежат
+# изображения. Элементы создаются заново с новыми идентификаторами, ссылки между элементами переводятся на новые
+# идентификаторы. Строки вставляются пачками с фиксацией транзакции после каждой пачки, вместе с пачкой сохраняется
+# номер последней обработанной строки и соответствие идентификаторов, поэтому после сбоя импорт можно продолжить
+
+# Количество строк NDJSON, которые вставляются в базу данных в одной транзакции
+IMPORT_BATCH_SIZE = 5000
+
+# Таблицы, в которые импортируются записи каждого типа
+TABLES = {
+    'world': World.__table__,
+    'longread': LongRead.__table__,
+    'chapter': Chapter.__table__,
+    'blockcontent': BlockContent.__table__,
+    'worldobj': WorldObj.__table__,
+    'link': blockcontents,
+}
+# Поля, которые ссылаются на другие элементы, и типы этих элементов
+REFERENCES = {
+    'longread': {'world_id': 'world'},
+    'chapter': {'longread_id': 'longread'},
+    'blockcontent': {'longread_id': 'longread', 'chapter_id': 'chapter'},
+    'worldobj': {'world_id': 'world'},
+    'link': {'blockcontent_id': 'blockcontent', 'worldobj_id': 'worldobj'},
+}
+
+
+# Источник импорта: NDJSON файл, изображения для которого берутся из хранилища изображений этого сервера
+class NDJSONSource:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def lines(self):
+        for line in self.stream:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            yield line
+
+    # Открытие файла изображения по ссылке из поля img_link, если файла нет функция возвращает None
+    def open_image(self, img_link):
+        storage = get_storage()
+        name = storage.name(img_link)
+        return storage.open(name) if name is not None else None
+
+
+# Источник импорта: zip архив с NDJSON файлом и изображениями, пути к которым совпадают со ссылками img_link
+class ZipSource:
+    def __init__(self, fileobj):
+        self.archive = zipfile.ZipFile(fileobj)
+
+    def lines(self):
+        name = next(name for name in self.archive.namelist() if name.endswith('.ndjson'))
+        with self.archive.open(name) as stream:
+            yield from io.TextIOWrapper(stream, encoding='utf-8')
+
+    def open_image(self, img_link):
+        try:
+            return self.archive.open(archive_name(img_link))
+        except KeyError:
+            return None
+
+
+# Источник импорта: tar архив с NDJSON файлом и изображениями
+class TarSource:
+    def __init__(self, fileobj):
+        self.archive = tarfile.open(fileobj=fileobj)
+
+    def lines(self):
+        member = next(member for member in self.archive.getmembers() if member.name.endswith('.ndjson'))
+        yield from io.TextIOWrapper(self.archive.extractfile(member), encoding='utf-8')
+
+    def open_image(self, img_link):
+        try:
+            return self.archive.extractfile(archive_name(img_link))
+        except KeyError:
+            return None
+
+
+# Выбор источника импорта по имени файла
+def open_source(fileobj, filename):
+    if filename.endswith('.zip'):
+        return ZipSource(fileobj)
+    if filename.endswith(('.tar', '.tar.gz', '.tgz')):
+        return TarSource(fileobj)
+    return NDJSONSource(fileobj)
+
+
+# Импорт мира из источника в рамках задачи импорта. Если задача уже выполнялась и завершилась сбоем, импорт
+# продолжается с первой незафиксированной строки
+def import_world(source, job):
+    job.status = 'running'
+    job.error = None
+    db.session.add(job)
+    db.session.commit()
+    importer = WorldImporter(job, source)
+    try:
+        importer.run()
+    except Exception as error:
+        # Незафиксированная пачка отменяется, задача помечается как завершившаяся сбоем
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(error)[:1000]
+        db.session.commit()
+        raise
+    return job
+
+
+class WorldImporter:
+    def __init__(self, job, source):
+        self.job = job
+        self.source = source
+        # Соответствие старых и новых идентификаторов для каждого типа элементов, при продолжении импорта
+        # загружается из базы данных
+        self.ids = {record_type: {} for record_type in TABLES}
+        for row in db.session.execute(select(ImportIdMap.type, ImportIdMap.old_id, ImportIdMap.new_id)
+                                      .where(ImportIdMap.job_id == job.id)):
+            self.ids[row.type][row.old_id] = row.new_id
+        self.pending = []
+
+    def run(self):
+        number = 0
+        for number, line in enumerate(self.source.lines(), 1):
+            # Строки, зафиксированные до сбоя, пропускаются
+            if number <= self.job.lines_done or not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry['type'] == 'header':
+                if entry.get('version') != EXPORT_VERSION:
+                    raise ValueError('Unsupported export version: %r' % entry.get('version'))
+            elif entry['type'] in TABLES:
+                self.pending.append((entry['type'], entry['data']))
+                if len(self.pending) >= IMPORT_BATCH_SIZE:
+                    self.flush(number)
+        self.flush(number)
+        self.job.status = 'done'
+        db.session.commit()
+
+    # Вставка накопленных записей и фиксация транзакции вместе с номером последней обработанной строки
+    def flush(self, number):
+        # Записи вставляются группами подряд идущих записей одного типа, чтобы родительские элементы
+        # создавались раньше дочерних
+        start = 0
+        while start < len(self.pending):
+            record_type = self.pending[start][0]
+            end = start
+            while end < len(self.pending) and self.pending[end][0] == record_type:
+                end += 1
+            self.insert(record_type, [data for _, data in self.pending[start:end]])
+            start = end
+        self.job.rows_done += len(self.pending)
+        self.job.lines_done = max(self.job.lines_done, number)
+        db.session.commit()
+        self.pending = []
+
+    def insert(self, record_type, records):
+        table = TABLES[record_type]
+        rows = [self.prepare(record_type, table, data) for data in records]
+        if record_type == 'link':
+            db.session.execute(insert(table), rows)
+            return
+        # При включенных шардах идентификаторы выдает приложение
+        ids = allocate_ids(table, len(rows))
+        if ids is not None:
+            for row, row_id in zip(rows, ids):
+                row['id'] = row_id
+        # Вставка пачки строк одним запросом с получением новых идентификаторов в порядке исходных строк
+        result = db.session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+        new_ids = [row.id for row in result]
+        id_map = self.ids[record_type]
+        mapping = []
+        for data, new_id in zip(records, new_ids):
+            id_map[data['id']] = new_id
+            mapping.append({'job_id': self.job.id, 'type': record_type, 'old_id': data['id'], 'new_id': new_id})
+        db.session.execute(insert(ImportIdMap.__table__), mapping)
+        # Созданные элементы записываются в журнал изменений одним запросом на пачку
+        model = next(model for model in CHANGE_TYPES if model.__table__ is table)
+        log_changes(db.session.connection(), model, table.c.id.in_(new_ids), 'create')
+        # Счетчики родительских элементов увеличиваются одним запросом на пачку
+        adjust_counters(db.session.connection(), model, table.c.id.in_(new_ids), 1)
+        # Снимки текста импортированных контент блоков, чтобы первое изменение текста можно было отменить
+        if record_type == 'blockcontent':
+            db.session.execute(insert(BlockRevision.__table__),
+                               [revision_row(new_id, row.get('version', 1), True, row.get('text'))
+                                for row, new_id in zip(rows, new_ids)])
+        if record_type == 'world' and self.job.world_id is None:
+            self.job.world_id = new_ids[0]
+
+    # Подготовка строки для вставки: перевод ссылок на новые идентификаторы, преобразование дат и копирование
+    # изображений
+    def prepare(self, record_type, table, data):
+        row = {}
+        for column in table.columns:
+            # Счетчики дочерних элементов не переносятся, они увеличиваются при вставке дочерних элементов. Счетчики
+            # прочтений относятся к копии мира, из которой он экспортирован
+            if (column.name not in data or column.name == 'id' or column.name in COUNTER_COLUMNS
+                    or column.name in READ_COLUMNS):
+                continue
+            value = data[column.name]
+            if column.name in REFERENCES.get(record_type, {}):
+                reference = REFERENCES[record_type][column.name]
+                if value not in self.ids[reference]:
+                    raise ValueError('Unknown %s id %r in %s record' % (reference, value, record_type))
+                value = self.ids[reference][value]
+            elif value is not None and isinstance(column.type, db.DateTime):
+                value = datetime.datetime.fromisoformat(value)
+            row[column.name] = value
+        # Превью вычисляется заново, тк вставка выполняется без участия моделей
+        for source, target in PREVIEW_COLUMNS.items():
+            if source in row and target in table.c:
+                row[target] = make_preview(row[source])
+        if row.get('img_link'):
+            row['img_link'] = self.copy_image(record_type, row['img_link'])
+        return row
+
+    # Копирование изображения из источника в хранилище изображений под именем, уникальным для задачи импорта.
+    # Если изображения нет в источнике, элементу присваивается стандартная фотография
+    def copy_image(self, record_type, img_link):
+        if img_link in DEFAULT_IMAGES:
+            return img_link
+        image = self.source.open_image(img_link)
+        if image is None:
+            return DEFAULT_IMAGES[1] if record_type == 'blockcontent' else DEFAULT_IMAGES[0]
+        img_name = 'import%d-%s' % (self.job.id, posixpath.basename(archive_name(img_link)))
+        storage = get_storage()
+        with image:
+            storage.save(img_name, image, mimetypes.guess_type(img_name)[0])
+        return storage.link(img_name)
+
+
+# CLI команда для импорта мира из NDJSON файла или архива. Для продолжения импорта после сбоя указывается
+# идентификатор задачи импорта
+@click.command('import-world')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--resume', type=int, default=None, help='Идентификатор задачи импорта, которую нужно продолжить')
+def import_world_command(path, resume):
+    if resume is None:
+        job = ImportJob()
+    else:
+        job = db.session.get(ImportJob, resume)
+        if job is None:
+            raise click.ClickException('Import job %d not found' % resume)
+    started = datetime.datetime.now()
+    with open(path, 'rb') as fileobj:
+        try:
+            import_world(open_source(fileobj, path), job)
+        except Exception as error:
+            raise click.ClickException('Import failed: %s. Resume with --resume %d' % (error, job.id))
+    elapsed = (datetime.datetime.now() - started).total_seconds()
+    click.echo('Imported world %d: %d rows in %.1f s (%.0f rows/s), job %d' % (
+        job.world_id, job.rows_done, elapsed, job.rows_done / max(elapsed, 1e-6), job.id))
@@ -0,0 +1,283 @@
+import io
+import os
+import json
+import time
+import socket
+import signal
+import datetime
+import click
+from flask import Blueprint, request, jsonify
+from sqlalchemy import delete, func, select, update
+
+from .extensions import db
+from .models import (World, LongRead, Chapter, BlockContent, WorldObj, Job, BlockRevision, blockcontents,
+                     DEFAULT_IMAGES)
+from .changes import log_changes
+from .counters import adjust_counters
+from .serializers import job_data
+from .storage import get_storage, thumbnail_name
+from .variants import purge_variants
+from .sharding import across_shards, shard_names, use_shard
+# Очередь фоновых задач в базе данных приложения, без отдельного брокера сообщений. Обработчики запросов только
+# добавляют задачу в ту же транзакцию, что и изменение данных (удаление файлов изображений, создание миниатюр,
+# удаление больших миров, лонгридов и глав), поэтому задача появляется в очереди тогда и только тогда, когда
+# зафиксировано изменение. Задачи выполняет отдельный процесс: flask --app app run-worker
+
+# Количество строк, которое удаляется в одной транзакции при удалении большого мира, лонгрида или главы
+JOB_DELETE_BATCH_SIZE = 500
+# Мир, лонгрид или глава, у которых больше дочерних элементов, удаляются фоновой задачей
+CASCADE_DELETE_INLINE_LIMIT = 200
+# Задержка в секундах перед первым повтором задачи, перед каждым следующим повтором задержка удваивается
+JOB_RETRY_DELAY = 10
+# Время в секундах, после которого задача, выполнение которой не завершилось (процесс был остановлен), снова
+# ставится в очередь
+JOB_LOCK_TIMEOUT = 600
+# Размер миниатюры изображения по большей стороне
+THUMBNAIL_SIZE = 320
+
+bp = Blueprint('jobs', __name__)
+
+# Обработчики задач по видам задач
+JOB_HANDLERS = {}
+
+
+# Декоратор для регистрации обработчика задач
+def job_handler(kind):
+    def register(function):
+        JOB_HANDLERS[kind] = function
+        return function
+    return register
+
+
+# Добавление задачи в сессию изменений. Задача фиксируется вместе с остальными изменениями сессии
+def enqueue(kind, **payload):
+    job = Job(kind=kind, payload=json.dumps(payload))
+    db.session.add(job)
+    return job
+
+
+# Удаление изображений и их миниатюр из хранилища по ссылкам img_link. Отсутствующие изображения пропускаются,
+# поэтому повтор задачи безопасен. Удаляются только изображения из хранилища, стандартные изображения и ссылки на
+# файлы вне хранилища не удаляются никогда
+@job_handler('remove_images')
+def remove_images(img_links):
+    storage = get_storage()
+    removed = 0
+    for img_link in img_links:
+        name = storage.name(img_link)
+        if img_link in DEFAULT_IMAGES or name is None:
+            continue
+        for image_name in (name, thumbnail_name(name)):
+            removed += storage.delete(image_name)
+        removed += purge_variants(name)
+    return 'removed %d files' % removed
+
+
+# Задачи удаления файлов по путям, добавленные в очередь до появления хранилища
+@job_handler('remove_files')
+def remove_files(paths):
+    return remove_images(['/' + path for path in paths])
+
+
+# Создание миниатюры изображения. Задача добавляется при каждой замене изображения, поэтому она же удаляет копии
+# прежнего изображения с тем же именем. Для создания миниатюр нужна библиотека Pillow, без нее задача пропускается
+@job_handler('thumbnail')
+def make_thumbnail(img_link):
+    storage = get_storage()
+    name = storage.name(img_link)
+    if name is None:
+        return 'skipped: image is not in the storage'
+    purge_variants(name)
+    try:
+        from PIL import Image
+    except ImportError:
+        return 'skipped: Pillow is not installed'
+    source = storage.open(name)
+    if source is None:
+        return 'skipped: image not found'
+    # Pillow нужен файл с произвольным доступом, а объект из S3 читается только последовательно
+    with source:
+        data = io.BytesIO(source.read())
+    target = io.BytesIO()
+    with Image.open(data) as image:
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image.convert('RGB').save(target, 'JPEG', quality=85)
+    target.seek(0)
+    storage.save(thumbnail_name(name), target, 'image/jpeg')
+    return thumbnail_name(name)
+
+
+# Удаление строк таблицы, которые удовлетворяют условию, пачками по JOB_DELETE_BATCH_SIZE строк. Вместе с каждой
+# пачкой удаляются связи контент блоков с объектами мира, записываются изменения в журнал и добавляется задача на
+# удаление файлов изображений. Функция возвращает количество удаленных строк
+def delete_rows(model, condition):
+    table = model.__table__
+    # У глав нет изображений
+    has_images = 'img_link' in table.c
+    columns = [table.c.id, table.c.img_link] if has_images else [table.c.id]
+    deleted = 0
+    while True:
+        rows = db.session.execute(select(*columns).where(condition).limit(JOB_DELETE_BATCH_SIZE)).all()
+        if not rows:
+            return deleted
+        ids = [row.id for row in rows]
+        log_changes(db.session.connection(), model, table.c.id.in_(ids), 'delete')
+        adjust_counters(db.session.connection(), model, table.c.id.in_(ids), -1)
+        if model is BlockContent:
+            db.session.execute(delete(blockcontents).where(blockcontents.c.blockcontent_id.in_(ids)))
+            db.session.execute(delete(BlockRevision).where(BlockRevision.blockcontent_id.in_(ids)))
+        # Снимки опубликованных лонгридов удаляются задачей из publish.py
+        if model is LongRead:
+            published = db.session.execute(select(table.c.id).where(table.c.id.in_(ids),
+                                                                    table.c.published_version.is_not(None)))
+            published_ids = published.scalars().all()
+            if published_ids:
+                enqueue('remove_published', longread_ids=published_ids)
+        if model is WorldObj:
+            db.session.execute(delete(blockcontents).where(blockcontents.c.worldobj_id.in_(ids)))
+        db.session.execute(delete(table).where(table.c.id.in_(ids)))
+        img_links = [row.img_link for row in rows
+                     if has_images and row.img_link and row.img_link not in DEFAULT_IMAGES]
+        if img_links:
+            enqueue('remove_images', img_links=img_links)
+        db.session.commit()
+        deleted += len(ids)
+
+
+# Условия выбора дочерних элементов мира, лонгрида или главы в порядке удаления (от дочерних к родительским)
+def subtree(element, row_id):
+    if element == 'world':
+        longread_ids = select(LongRead.id).where(LongRead.world_id == row_id)
+        return [(BlockContent, BlockContent.longread_id.in_(longread_ids)),
+                (Chapter, Chapter.longread_id.in_(longread_ids)),
+                (LongRead, LongRead.world_id == row_id),
+                (WorldObj, WorldObj.world_id == row_id),
+                (World, World.id == row_id)]
+    if element == 'longread':
+        return [(BlockContent, BlockContent.longread_id == row_id),
+                (Chapter, Chapter.longread_id == row_id),
+                (LongRead, LongRead.id == row_id)]
+    if element == 'chapter':
+        return [(BlockContent, BlockContent.chapter_id == row_id),
+                (Chapter, Chapter.id == row_id)]
+    raise ValueError('Unknown element type %r' % element)
+
+
+# Количество дочерних элементов мира, лонгрида или главы
+def subtree_size(element, row_id):
+    return sum(db.session.execute(select(func.count()).select_from(model).where(condition)).scalar()
+               for model, condition in subtree(element, row_id)[:-1])
+
+
+# Удаление мира, лонгрида или главы со всеми дочерними элементами. Удаление продолжается с места остановки, если
+# задача была прервана
+@job_handler('cascade_delete')
+def cascade_delete(element, row_id):
+    deleted = sum(delete_rows(model, condition) for model, condition in subtree(element, row_id))
+    return 'deleted %d rows' % deleted
+
+
+# Выбор следующей задачи и пометка ее как выполняемой одним запросом, поэтому одну задачу не получат два процесса
+def claim_job(worker):
+    now = datetime.datetime.utcnow()
+    # Задачи процессов, остановленных во время выполнения, снова ставятся в очередь
+    db.session.execute(update(Job).where(Job.status == 'running',
+                                         Job.locked_at < now - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT))
+                       .values(status='queued', locked_by=None, locked_at=None))
+    candidate = (select(Job.id).where(Job.status == 'queued', Job.run_at <= now)
+                 .order_by(Job.run_at, Job.id).limit(1).scalar_subquery())
+    job_id = db.session.execute(update(Job).where(Job.id == candidate, Job.status == 'queued')
+                                .values(status='running', attempts=Job.attempts + 1, locked_by=worker,
+                                        locked_at=now, updated=now)
+                                .returning(Job.id)).scalar()
+    db.session.commit()
+    return db.session.get(Job, job_id) if job_id is not None else None
+
+
+# Выполнение задачи. При ошибке изменения задачи отменяются, и задача ставится в очередь повторно с задержкой либо
+# помечается как завершившаяся ошибкой, если попытки исчерпаны
+def run_job(job):
+    try:
+        handler = JOB_HANDLERS[job.kind]
+        result = handler(**json.loads(job.payload))
+    except Exception as error:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.error = ('%s: %s' % (type(error).__name__, error))[:1000]
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+        else:
+            job.status = 'queued'
+            job.run_at = datetime.datetime.utcnow() + datetime.timedelta(
+                seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        job.locked_by = None
+        db.session.commit()
+        return False
+    job.status = 'done'
+    job.result = str(result)[:1000] if result is not None else None
+    job.error = None
+    db.session.commit()
+    return True
+
+
+# CLI команда для запуска процесса, выполняющего фоновые задачи. Процесс завершается после выполнения текущей
+# задачи при получении сигнала SIGTERM или SIGINT
+@click.command('run-worker')
+@click.option('--once', is_flag=True, help='Выполнить задачи, готовые к выполнению, и завершить работу')
+@click.option('--poll-interval', type=float, default=1.0, help='Интервал проверки очереди в секундах')
+def run_worker_command(once, poll_interval):
+    worker = '%s:%d' % (socket.gethostname(), os.getpid())
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stopping.append(True))
+    click.echo('Worker %s started' % worker)
+    while not stopping:
+        # Задачи находятся в шардах вместе с данными, которые они изменяют, и выполняются в своем шарде
+        claimed = False
+        for shard in shard_names():
+            with use_shard(shard):
+                job = claim_job(worker)
+                if job is None:
+                    continue
+                claimed = True
+                succeeded = run_job(job)
+                click.echo('Job %d %s: %s' % (job.id, job.kind, 'done' if succeeded else job.status))
+            if stopping:
+                break
+        if not claimed:
+            if once:
+                break
+            time.sleep(poll_interval)
+    click.echo('Worker %s stopped' % worker)
+
+
+# React Функция для получения состояния фоновой задачи
+@bp.route('/api/jobs/<int:job_id>/', methods=['GET'])
+def api_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    return jsonify(job_data(job)), 200
+
+
+# React Функция для получения списка последних фоновых задач, с отбором по состоянию. Пример: /api/jobs/?status=failed
+@bp.route('/api/jobs/', methods=['GET'])
+def api_job_index():
+    query = Job.query.order_by(Job.id.desc())
+    if 'status' in request.args:
+        query = query.filter(Job.status == request.args['status'])
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    # Последние задачи всех шардов
+    jobs = across_shards(query.limit(limit))[::-1][:limit]
+    return jsonify([job_data(job) for job in jobs]), 200
+
+
+# React Функция для повторного запуска задачи, которая завершилась ошибкой после всех попыток
+@bp.route('/api/jobs/<int:job_id>/retry/', methods=['POST'])
+def api_job_retry(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'failed':
+        return jsonify({'message': 'Only failed jobs can be retried'}), 409
+    job.status = 'queued'
+    job.attempts = 0
+    job.run_at = datetime.datetime.utcnow()
+    db.session.commit()
+    return jsonify(job_data(job)), 200
@@ -0,0 +1,89 @@
+from flask import abort, g, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.util import identity_key
+
+from .extensions import db
+# Кэш элементов в рамках одного запроса. Элементы по идентификатору берутся из загруженных ранее элементов и карты
+# объектов сессии (identity map), а недостающие элементы списка (пакетное чтение, списки самых читаемых элементов)
+# загружаются одним запросом IN. Дочерние элементы родительского элемента (контент блоки главы, главы лонгрида,
+# лонгриды и объекты мира) загружаются одним запросом и запоминаются до конца запроса, поэтому повторные обращения
+# к одним и тем же элементам в обработчике и в шаблоне не выполняют запросов в базу данных
+
+# Максимальное количество идентификаторов в одном запросе IN
+LOADER_BATCH_SIZE = 500
+
+
+class Loader:
+    def __init__(self, session):
+        self.session = session
+        # Загруженные элементы по модели и идентификатору. Карта объектов сессии хранит слабые ссылки, поэтому
+        # без этого словаря загруженные пачкой элементы удалялись бы сборщиком мусора до обращения к ним
+        self.objects = {}
+        # Идентификаторы, которых нет в базе данных
+        self.missing = set()
+        # Дочерние элементы по модели, полю связи, идентификатору родителя и списку отложенных полей
+        self.children = {}
+
+    # Элемент, если он уже загружен
+    def cached(self, model, row_id):
+        obj = self.objects.get((model, row_id))
+        if obj is None:
+            obj = self.session.identity_map.get(identity_key(model, row_id))
+            if obj is not None:
+                self.objects[(model, row_id)] = obj
+        return obj
+
+    # Элементы по списку идентификаторов в порядке списка, для отсутствующих элементов возвращается None. Элементы,
+    # которых нет в кэше, загружаются запросами IN по LOADER_BATCH_SIZE идентификаторов
+    def load_many(self, model, ids):
+        pending = sorted({row_id for row_id in ids
+                          if (model, row_id) not in self.missing and self.cached(model, row_id) is None})
+        for start in range(0, len(pending), LOADER_BATCH_SIZE):
+            batch = pending[start:start + LOADER_BATCH_SIZE]
+            for obj in self.session.scalars(select(model).where(model.id.in_(batch))):
+                self.objects[(model, obj.id)] = obj
+            self.missing.update((model, row_id) for row_id in batch if (model, row_id) not in self.objects)
+        return [self.cached(model, row_id) for row_id in ids]
+
+    def load(self, model, row_id):
+        return self.load_many(model, [row_id])[0]
+
+    # Элемент по идентификатору либо ответ 404
+    def load_or_404(self, model, row_id):
+        obj = self.load(model, row_id)
+        if obj is None:
+            abort(404)
+        return obj
+
+    # Дочерние элементы родительского элемента в порядке идентификаторов. Отложенные поля (deferred) не загружаются
+    # из базы данных, например полный текст в режиме превью
+    def children_of(self, model, column, key, deferred=()):
+        cache_key = (model, column, key, tuple(deferred))
+        if cache_key not in self.children:
+            query = select(model).where(getattr(model, column) == key).order_by(model.id)
+            if deferred:
+                query = query.options(*[defer(getattr(model, name)) for name in deferred])
+            self.children[cache_key] = list(self.session.scalars(query))
+        return self.children[cache_key]
+
+    # Очистка запомненных результатов после изменения данных
+    def clear(self):
+        self.objects.clear()
+        self.missing.clear()
+        self.children.clear()
+
+
+# Загрузчик текущего запроса, создается при первом обращении и удаляется вместе с контекстом запроса
+def get_loader():
+    if 'darts_loader' not in g:
+        g.darts_loader = Loader(db.session)
+    return g.darts_loader
+
+
+# После фиксации или отмены транзакции запомненные списки могут быть устаревшими, поэтому они очищаются
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def clear_loader(session):
+    if has_app_context() and 'darts_loader' in g:
+        g.darts_loader.clear()
@@ -0,0 +1,339 @@
+from flask import Blueprint, render_template, request, url_for, redirect, jsonify
+
+from sqlalchemy.orm import defer
+
+from .extensions import db
+from .models import LongRead, Chapter
+from .versioning import versioned_update, parse_if_match, etag
+from .patch import validate_patch, patch_data
+from .jobs import enqueue, subtree_size, CASCADE_DELETE_INLINE_LIMIT
+from .storage import get_storage
+from .loader import get_loader
+from .serializers import preview_requested, longread_index_data, longread_detail_data
+from .chapters import chapter_delete
+from .sharding import across_shards
+from .reads import count_reads
+
+# Blueprint с функциями для работы с лонгридами
+bp = Blueprint('longreads', __name__)
+
+
+# Функция для передачи на React фронтальную часть приложения всех лонгридов находящихся в базе данных
+@bp.route('/api/explore/')
+def api_longread_index():
+    # В режиме превью полное описание лонгридов не загружается из базы данных
+    preview = preview_requested(request.args)
+    # Получение списка всех лонгридов по запросу в базы данных всех шардов
+    longreads = across_shards(LongRead.query.options(defer(LongRead.description)) if preview else LongRead.query,
+                              'world_id')
+    # JSON-текст в котором указаны данные лонгрида
+    longreads_data = [longread_index_data(longread, preview) for longread in longreads]
+    # JSON-текст перенаправляется на фронтальную часть приложения
+    return jsonify(longreads_data), 200
+
+
+# Функция для передачи на Flask фронтальную часть приложения всех лонгридов находящихся в базе данных
+@bp.route('/explore/')
+def longread_index():
+    # Получение списка всех лонгридов по запросу в базы данных всех шардов, в списке отображается превью
+    # описания, поэтому полное описание не загружается
+    longreads = across_shards(LongRead.query.options(defer(LongRead.description)), 'world_id')
+    # Отсылка собранных данных на фронтальную часть приложения для их отображения
+    return render_template('longread_index.html', longreads=longreads)
+
+
+# Функция для передачи на React фронтальную часть приложения информации о лонгриде по его индексу,
+# а также информации о всех связанных с ним глав
+@bp.route('/api/longreads/<int:longread_id>', methods=['GET'])
+def api_longread(longread_id):
+    # Получение лонгрида и списка связанных с ним глав через загрузчик запроса
+    loader = get_loader()
+    longread = loader.load_or_404(LongRead, longread_id)
+    chapters = loader.children_of(Chapter, 'longread_id', longread_id)
+    # Просмотр учитывается в буфере счетчиков процесса
+    count_reads('longread', [longread_id])
+    # Формирование JSON-текста с данными лонгрида и главами
+    longread_data = longread_detail_data(longread, chapters)
+    # JSON-текст перенаправляется на фронтальную часть приложения
+    return jsonify(longread_data), 200
+
+
+# Функция для передачи на Flask фронтальную часть приложения информации о лонгриде по его индексу,
+# а также информации о всех связанных с ним глав
+@bp.route('/longreads/<int:longread_id>/')
+def longread(longread_id):
+    # Получение лонгрида и списка связанных с ним глав через загрузчик запроса
+    loader = get_loader()
+    longread = loader.load_or_404(LongRead, longread_id)
+    chapters = loader.children_of(Chapter, 'longread_id', longread_id)
+    count_reads('longread', [longread_id])
+    # Отсылка собранных данных на фронтальную часть приложения для их отображения
+    return render_template('longread.html', longread=longread, chapters=chapters)
+
+
+# React Функция для создания лонгрида и привязки его к миру, идентификатор которого был указан.
+# При создании лонгрида ему будет присвоена стандартная фотография
+@bp.route('/api/worlds/<int:world_id>/create/', methods=('GET', 'OPTIONS', 'POST'))
+def api_longread_create(world_id):
+    # Фронтальная часть приложения перед отправлением запроса на создание элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    #Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Создание лонгрида используя данные полученные из JSON-текста
+    longread = LongRead(world_id=world_id,
+                        name=json["name"],
+                        description=json["description"])
+    # Лонгриду присваивается стандартная фотография
+    longread.img_link = "/staticFiles/images/QuestionMark.jpg"
+    # Добавление нового лонгрида в сессию изменений
+    db.session.add(longread)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'Longread created successfully'}), 201
+
+
+# Flask Функция для создания лонгрида и привязки его к миру, идентификатор которого был указан.
+# При создании лонгрида ему будет присвоена стандартная фотография, либо фотография загруженная в форму
+@bp.route('/worlds/<int:world_id>/create/', methods=('GET', 'POST'))
+def longread_create(world_id):
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        name = request.form['name']
+        description = request.form['description']
+        uploaded_img = request.files['uploaded-file']
+        # Создание лонгрида используя данные полученные из форм
+        longread = LongRead(world_id=world_id,
+                            name=name,
+                            description=description)
+        # Добавление нового лонгрида в сессию изменений
+        db.session.add(longread)
+        # Использование функции flush для получения id нового лонгрида
+        db.session.flush()
+        # Обновление лонгрида для получения id
+        db.session.refresh(longread)
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename == '':
+            # Если пустой файл лонгриду присваивается стандартная фотография
+            longread.img_link = "/staticFiles/images/QuestionMark.jpg"
+        else:
+            # Создание уникального имени использую id лонгрида
+            longread_img_name = "longread" + str(longread.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(longread_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Сохранение названия файла
+            longread.img_link = get_storage().link(longread_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=longread.img_link)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('worlds.world', world_id=world_id))
+
+    return render_template('create_longread.html', world_id=world_id)
+
+
+# React Функция для редактирования лонгрида, идентификатор которого был указан
+@bp.route('/api/longreads/<int:longread_id>/edit/', methods=['GET', 'POST', 'OPTIONS'])
+def api_longread_edit(longread_id):
+    # Фронтальная часть приложения перед отправлением запроса на редактирование элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Внесение изменений одним запросом в базу данных без предварительного чтения. Если в заголовке If-Match указана
+    # версия, изменение выполняется только при совпадении версии, иначе отсылается ответ 412
+    version = versioned_update(LongRead, longread_id, {'name': json["name"], 'description': json["description"]},
+                               parse_if_match(request.headers.get('If-Match')))['version']
+    # Отсылка сообщения с новой версией
+    return jsonify({'message': 'Longread updated successfully', 'version': version}), 200, etag(version)
+
+
+# React Функция для частичного изменения лонгрида. Принимает JSON-текст только с изменяемыми полями и изменяет их одним
+# запросом в базу данных без предварительного чтения лонгрида
+@bp.route('/api/longreads/<int:longread_id>', methods=['PATCH'])
+def api_longread_patch(longread_id):
+    # Проверка полученных полей, при ошибке отсылается ответ 400 со списком ошибок
+    values = validate_patch(LongRead, request.get_json(silent=True))
+    # Внесение изменений с учетом версии из заголовка If-Match
+    changed = versioned_update(LongRead, longread_id, values, parse_if_match(request.headers.get('If-Match')))
+    # Отсылка только измененных полей и новой версии
+    return jsonify(patch_data(longread_id, changed)), 200, etag(changed['version'])
+
+
+# Flask Функция для редактирования лонгрида и его фотографии, используя указанный идентификатор лонгрида. Предыдущее
+# изображение лонгрида будет удалено, если оно не являлось стандартным
+@bp.route('/longreads/<int:longread_id>/edit/', methods=('GET', 'POST'))
+def longread_edit(longread_id):
+    # Получение лонгрида по запросу в базу данных
+    longread = LongRead.query.get_or_404(longread_id)
+    longread_id = longread.id
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        name = request.form['name']
+        description = request.form['description']
+        uploaded_img = request.files['uploaded-file']
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename != '':
+            # Создание уникального имени использую id лонгрида
+            longread_img_name = "longread" + str(longread.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(longread_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+            if longread.img_link not in ("/staticFiles/images/QuestionMark.jpg",
+                                         get_storage().link(longread_img_name)):
+                enqueue('remove_images', img_links=[longread.img_link])
+            # Внесение изменений
+            longread.img_link = get_storage().link(longread_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=longread.img_link)
+        # Внесение изменений
+        longread.name = name
+        longread.description = description
+        # Добавление измененного лонгрида в сессию изменений
+        db.session.add(longread)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('longreads.longread', longread_id=longread_id))
+
+    return render_template('edit_longread.html', longread=longread)
+
+
+# React Функция для измененения фотографии лонгрида, идентификатор которого был указан. Предыдущее изображение
+# лонгрида будет удалено, если оно не являлось стандартным
+@bp.route('/api/longreads/<int:longread_id>/update-image/', methods=['GET', 'OPTIONS', 'POST'])
+def api_update_longread_image(longread_id):
+    # Фронтальная часть приложения перед отправлением запроса на изменение изображения привязанного к элементу
+    # отправляет OPTIONS запрос, на который необходимо ответить ответом с необходимыми заголовками, в котором
+    # указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение лонгрида по запросу в базу данных
+    longread = LongRead.query.get_or_404(longread_id)
+    # Получение файла изображения из формы
+    new = request.files["image"]
+    # Сохранение названия файла
+    filename = new.filename
+    # Проверка на пустой файл
+    if filename != '':
+        # Создание уникального имени использую id лонгрида
+        longread_img_name = "longread" + str(longread.id) + ".jpg"
+        # Сохранение изображения в хранилище под уникальным именем
+        get_storage().save(longread_img_name, new.stream, new.mimetype)
+        # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+        if longread.img_link not in ("/staticFiles/images/QuestionMark.jpg",
+                                     get_storage().link(longread_img_name)):
+            enqueue('remove_images', img_links=[longread.img_link])
+        # Внесение изменений
+        longread.img_link = get_storage().link(longread_img_name)
+        # Создание миниатюры фоновой задачей
+        enqueue('thumbnail', img_link=longread.img_link)
+    # Добавление измененного лонгрида в сессию изменений
+    db.session.add(longread)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'Longread updated successfully'})
+
+
+# Flask Функция для удаления фотографии лонгрида, идентификатор которого был указан. Изображение
+# лонгрида будет удалено, если оно не являлось стандартным
+@bp.post('/longreads/<int:longread_id>/delete_longread_image/')
+def delete_longread_image(longread_id):
+    # Получение лонгрида по запросу в базу данных
+    longread = LongRead.query.get_or_404(longread_id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if longread.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[longread.img_link])
+        # Лонгриду присваивается стандартная фотография
+        longread.img_link = "/staticFiles/images/QuestionMark.jpg"
+        # Добавление измененного лонгрида в сессию изменений
+        db.session.add(longread)
+        # Фиксация изменений в БД
+        db.session.commit()
+    return redirect(url_for('longreads.longread', longread_id=longread_id))
+
+
+# React Функция для удаления лонгрида, указанного по его идентификатору, а также всех глав и изображения,
+# которое с ним связано
+@bp.route('/api/longreads/<int:longread_id>/delete/', methods=('GET', 'OPTIONS', 'DELETE'))
+def api_longread_delete(longread_id):
+    # Фронтальная часть приложения перед отправлением запроса на удаление элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'DELETE')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение лонгрида по запросу в базу данных
+    longread = LongRead.query.get_or_404(longread_id)
+    # Лонгрид с большим количеством дочерних элементов удаляется фоновой задачей, чтобы запрос не ждал удаления
+    if subtree_size('longread', longread_id) > CASCADE_DELETE_INLINE_LIMIT:
+        job = enqueue('cascade_delete', element='longread', row_id=longread_id)
+        db.session.commit()
+        return jsonify({'message': 'Longread deletion queued', 'job_id': job.id}), 202
+    # Получение списка глав по запросу в базу данных, связанных с лонгридом
+    chapters = Chapter.query.filter(Chapter.longread_id == longread_id).all()
+    # Удаление глав, связанных с лонгридом
+    for chapter in chapters:
+        chapter_delete(chapter.id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if longread.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[longread.img_link])
+    # Удаление лонгрида
+    db.session.delete(longread)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return {'message': 'Longread deleted successfully'}
+
+
+# Flask Функция для удаления лонгрида, указанного по его идентификатору, а также всех глав и изображения,
+# которое с ним связано
+@bp.post('/longreads/<int:longread_id>/delete/')
+def longread_delete(longread_id):
+    # Получение лонгрида по запросу в базу данных
+    longread = LongRead.query.get_or_404(longread_id)
+    world_id = longread.world_id
+    # Лонгрид с большим количеством дочерних элементов удаляется фоновой задачей
+    if subtree_size('longread', longread_id) > CASCADE_DELETE_INLINE_LIMIT:
+        enqueue('cascade_delete', element='longread', row_id=longread_id)
+        db.session.commit()
+        return redirect(url_for('worlds.world', world_id=world_id))
+    # Получение списка глав по запросу в базу данных, связанных с лонгридом
+    chapters = Chapter.query.filter(Chapter.longread_id == longread_id).all()
+    # Удаление глав, связанных с лонгридом
+    for chapter in chapters:
+        chapter_delete(chapter.id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if longread.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[longread.img_link])
+    # Удаление лонгрида
+    db.session.delete(longread)
+    # Фиксация изменений в БД
+    db.session.commit()
+    return redirect(url_for('worlds.world', world_id=world_id))
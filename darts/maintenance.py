@@ -0,0 +1,270 @@
+import os
+import time
+import sqlite3
+import datetime
+import click
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from .extensions import db, MAIN_SHARD
+from .models import Job
+from .jobs import enqueue, job_handler
+from .sharding import shard_names, shard_engine, use_shard
+# Обслуживание баз данных SQLite всех шардов: резервное копирование без остановки приложения, возврат свободных
+# страниц (incremental vacuum), обновление статистики планировщика запросов и проверка целостности. Каскадное
+# удаление миров, лонгридов и глав оставляет в файле свободные страницы, а статистика sqlite_stat1 без ANALYZE не
+# обновляется. Каждая команда выводит количество страниц и фрагментацию до и после обслуживания. Регулярное
+# обслуживание выполняет фоновая задача maintain_db, которая ставит себя в очередь снова через
+# DB_MAINTENANCE_INTERVAL секунд (первая задача добавляется командой maintain-db --schedule)
+
+# Количество страниц, которые копируются за один шаг резервного копирования. Между шагами база данных не
+# заблокирована, и другие соединения могут записывать изменения
+BACKUP_STEP_PAGES = 256
+# Пауза в секундах между шагами резервного копирования
+BACKUP_STEP_SLEEP = 0.05
+# Количество резервных копий каждого шарда, которые хранятся в папке копий
+BACKUP_KEEP = 7
+# Количество свободных страниц, которые возвращаются за один шаг incremental vacuum. Каждый шаг - отдельная
+# транзакция, поэтому запись блокируется только на время шага
+VACUUM_STEP_PAGES = 1000
+# Пауза в секундах между шагами incremental vacuum
+VACUUM_STEP_SLEEP = 0.05
+# Приблизительное количество строк каждого индекса, которое читает ANALYZE (PRAGMA analysis_limit)
+ANALYSIS_LIMIT = 1000
+# Значение PRAGMA auto_vacuum в режиме incremental
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+# Соединение с базой данных шарда вне транзакции: PRAGMA и VACUUM нельзя выполнять внутри транзакции
+def maintenance_connection(name):
+    return shard_engine(name).connect().execution_options(isolation_level='AUTOCOMMIT')
+
+
+# Состояние файла базы данных: размер страницы, количество страниц, свободные страницы и режим auto_vacuum.
+# Фрагментация определяется по виртуальной таблице dbstat (если SQLite собран с ней): доля листовых страниц
+# таблиц и индексов, которые расположены в файле не сразу за предыдущей страницей, и доля неиспользуемого места
+# в занятых страницах
+def database_stats(connection):
+    stats = {name: connection.exec_driver_sql('PRAGMA %s' % name).scalar()
+             for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+    stats['scattered'] = stats['unused'] = None
+    try:
+        rows = connection.exec_driver_sql("SELECT name, pageno FROM dbstat WHERE pagetype = 'leaf' "
+                                          "ORDER BY name, path").all()
+        usage = connection.exec_driver_sql('SELECT sum(pgsize), sum(unused) FROM dbstat').one()
+    except OperationalError:
+        return stats
+    scattered = sum(1 for previous, row in zip(rows, rows[1:])
+                    if previous.name == row.name and row.pageno != previous.pageno + 1)
+    stats['scattered'] = scattered / max(len(rows) - 1, 1)
+    stats['unused'] = (usage[1] or 0) / max(usage[0] or 0, 1)
+    return stats
+
+
+# Строка отчета о состоянии файла базы данных
+def format_stats(stats):
+    text = '%d pages x %d bytes, %d free (%.1f%%)' % (stats['page_count'], stats['page_size'],
+                                                       stats['freelist_count'],
+                                                       100 * stats['freelist_count'] / max(stats['page_count'], 1))
+    if stats['scattered'] is not None:
+        text += ', %.1f%% leaf pages out of order, %.1f%% unused space' % (100 * stats['scattered'],
+                                                                           100 * stats['unused'])
+    return text
+
+
+# Возврат свободных страниц файлу базы данных шагами по VACUUM_STEP_PAGES страниц, не больше pages страниц (0 - все
+# свободные страницы). Функция возвращает количество возвращенных страниц. Если база данных создана без режима
+# incremental, режим включается полным VACUUM (при full), который перестраивает весь файл и на время выполнения
+# блокирует запись, иначе вызывается ValueError
+def incremental_vacuum(connection, pages=0, full=False):
+    if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() != AUTO_VACUUM_INCREMENTAL:
+        if not full:
+            raise ValueError('auto_vacuum is not incremental, run vacuum-db --full once to enable it')
+        before = connection.exec_driver_sql('PRAGMA page_count').scalar()
+        connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.exec_driver_sql('VACUUM')
+        return max(before - connection.exec_driver_sql('PRAGMA page_count').scalar(), 0)
+    freed = 0
+    while not pages or freed < pages:
+        free = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+        if not free:
+            break
+        step = min(free, VACUUM_STEP_PAGES, pages - freed if pages else free)
+        # Модуль sqlite3 выполняет только первый шаг PRAGMA без результата, а incremental_vacuum возвращает одну
+        # страницу за шаг, поэтому PRAGMA выполняется через executescript до конца
+        connection.connection.driver_connection.executescript('PRAGMA incremental_vacuum(%d)' % step)
+        freed += step
+        time.sleep(VACUUM_STEP_SLEEP)
+    return freed
+
+
+# Обновление статистики планировщика запросов. ANALYZE читает не больше ANALYSIS_LIMIT строк каждого индекса,
+# PRAGMA optimize пересчитывает только статистику, которая могла устареть
+def analyze(connection, full=True):
+    if full:
+        connection.exec_driver_sql('PRAGMA analysis_limit = %d' % ANALYSIS_LIMIT).all()
+        connection.exec_driver_sql('ANALYZE')
+    connection.exec_driver_sql('PRAGMA optimize').all()
+
+
+# Проверка целостности базы данных и внешних ключей. Функция возвращает список найденных ошибок
+def integrity_errors(connection, quick=False):
+    rows = connection.exec_driver_sql('PRAGMA %s' % ('quick_check' if quick else 'integrity_check')).scalars().all()
+    errors = [row for row in rows if row != 'ok']
+    for table, rowid, parent, key in connection.exec_driver_sql('PRAGMA foreign_key_check').all():
+        errors.append('%s row %s: missing %s (foreign key %s)' % (table, rowid, parent, key))
+    return errors
+
+
+# Папка резервных копий (по умолчанию instance/backups)
+def backup_folder():
+    return current_app.config.get('BACKUP_FOLDER') or os.path.join(current_app.instance_path, 'backups')
+
+
+# Резервная копия базы данных шарда через SQLite backup API. Копия записывается во временный файл шагами по
+# BACKUP_STEP_PAGES страниц и переименовывается после проверки, поэтому в папке копий нет неполных файлов. Если
+# между шагами другое соединение изменило базу данных, SQLite начинает копирование заново, и копия соответствует
+# одному состоянию базы данных. Старые копии шарда сверх keep удаляются. Функция возвращает путь к копии
+def backup_database(name, folder, keep=BACKUP_KEEP):
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(folder, '%s-%s.db' % (name, stamp))
+    temporary = path + '.tmp'
+    source = shard_engine(name).raw_connection()
+    target = sqlite3.connect(temporary)
+    try:
+        source.driver_connection.backup(target, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+        check = target.execute('PRAGMA quick_check').fetchall()
+    finally:
+        target.close()
+        source.close()
+    if check != [('ok',)]:
+        os.remove(temporary)
+        raise ValueError('Backup of shard %s failed quick_check: %s' % (name, check[0][0]))
+    os.replace(temporary, path)
+    # Имена копий шарда упорядочены по времени создания
+    backups = sorted(entry for entry in os.listdir(folder)
+                     if entry.startswith(name + '-') and entry.endswith('.db') and len(entry) == len(name) + 19)
+    for entry in backups[:-keep] if keep else []:
+        os.remove(os.path.join(folder, entry))
+    return path
+
+
+# Регулярное обслуживание всех шардов: возврат свободных страниц и PRAGMA optimize. Полный VACUUM при регулярном
+# обслуживании не выполняется. Функция возвращает количество возвращенных страниц по шардам
+def maintain_databases():
+    freed = {}
+    for name in shard_names():
+        with maintenance_connection(name) as connection:
+            if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() == AUTO_VACUUM_INCREMENTAL:
+                freed[name] = incremental_vacuum(connection)
+            analyze(connection, full=False)
+    return freed
+
+
+# Добавление задачи регулярного обслуживания в очередь основной базы данных, если такой задачи еще нет
+def schedule_maintenance(delay=0):
+    with use_shard(MAIN_SHARD):
+        queued = db.session.execute(select(Job.id).where(Job.kind == 'maintain_db', Job.status == 'queued')
+                                    .limit(1)).first()
+        if queued is not None:
+            return False
+        job = enqueue('maintain_db')
+        job.run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        db.session.commit()
+        return True
+
+
+# Фоновая задача регулярного обслуживания. Следующая задача добавляется, если указана настройка
+# DB_MAINTENANCE_INTERVAL
+@job_handler('maintain_db')
+def maintain_db_job():
+    freed = maintain_databases()
+    interval = current_app.config.get('DB_MAINTENANCE_INTERVAL')
+    if interval:
+        # Текущая задача еще выполняется, поэтому следующая задача добавляется без проверки очереди
+        with use_shard(MAIN_SHARD):
+            job = enqueue('maintain_db')
+            job.run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=interval)
+            db.session.commit()
+    return ', '.join('%s: %d pages freed' % item for item in freed.items())
+
+
+# Выполнение операции обслуживания для каждого шарда с выводом состояния базы данных до и после
+def each_shard(operation):
+    for name in shard_names():
+        with maintenance_connection(name) as connection:
+            click.echo('%s: %s' % (name, format_stats(database_stats(connection))))
+            message = operation(connection)
+            if message:
+                click.echo('%s: %s' % (name, message))
+            click.echo('%s: %s' % (name, format_stats(database_stats(connection))))
+
+
+# CLI команда для резервного копирования баз данных всех шардов без остановки приложения
+@click.command('backup-db')
+@click.option('--output', type=click.Path(file_okay=False), help='Папка для копий (по умолчанию BACKUP_FOLDER)')
+@click.option('--keep', type=int, default=BACKUP_KEEP, help='Количество хранимых копий каждого шарда, 0 - все')
+def backup_db_command(output, keep):
+    for name in shard_names():
+        started = time.monotonic()
+        try:
+            path = backup_database(name, output or backup_folder(), keep)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+        click.echo('%s: %s, %d bytes in %.1f s' % (name, path, os.path.getsize(path), time.monotonic() - started))
+
+
+# CLI команда для возврата свободных страниц баз данных всех шардов
+@click.command('vacuum-db')
+@click.option('--pages', type=int, default=0, help='Максимальное количество возвращаемых страниц, 0 - все')
+@click.option('--full', is_flag=True, help='Включить режим incremental полным VACUUM, если он не включен')
+def vacuum_db_command(pages, full):
+    def vacuum(connection):
+        try:
+            return '%d pages freed' % incremental_vacuum(connection, pages, full)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+    each_shard(vacuum)
+
+
+# CLI команда для обновления статистики планировщика запросов
+@click.command('analyze-db')
+def analyze_db_command():
+    each_shard(analyze)
+
+
+# CLI команда для проверки целостности баз данных всех шардов. При ошибках команда завершается с ненулевым кодом
+@click.command('check-db')
+@click.option('--quick', is_flag=True, help='Быстрая проверка (PRAGMA quick_check) без проверки индексов')
+def check_db_command(quick):
+    failed = []
+    for name in shard_names():
+        with maintenance_connection(name) as connection:
+            errors = integrity_errors(connection, quick)
+        for error in errors:
+            click.echo('%s: %s' % (name, error))
+        click.echo('%s: %s' % (name, '%d problems' % len(errors) if errors else 'ok'))
+        if errors:
+            failed.append(name)
+    if failed:
+        raise click.ClickException('Integrity check failed for %s' % ', '.join(failed))
+
+
+# CLI команда для регулярного обслуживания всех шардов. С флагом --schedule обслуживание добавляется в очередь
+# фоновых задач и затем повторяется через DB_MAINTENANCE_INTERVAL секунд
+@click.command('maintain-db')
+@click.option('--schedule', is_flag=True, help='Добавить задачу регулярного обслуживания в очередь')
+def maintain_db_command(schedule):
+    if schedule:
+        click.echo('Maintenance job queued' if schedule_maintenance() else 'Maintenance job is already queued')
+        return
+    for name in shard_names():
+        with maintenance_connection(name) as connection:
+            click.echo('%s: %s' % (name, format_stats(database_stats(connection))))
+    for name, freed in maintain_databases().items():
+        click.echo('%s: %d pages freed' % (name, freed))
+    for name in shard_names():
+        with maintenance_connection(name) as connection:
+            click.echo('%s: %s' % (name, format_stats(database_stats(connection))))
@@ -0,0 +1,340 @@
+import datetime
+from sqlalchemy.orm import validates
+
+from .extensions import db
+from .compression import CompressedText
+
+# Длина сокращенного текста (превью), который хранится рядом с полным текстом и используется в списках
+PREVIEW_LENGTH = 200
+# Поля с полным текстом и поля, в которых хранится их превью
+PREVIEW_COLUMNS = {'description': 'description_preview', 'text': 'text_preview'}
+# Стандартные изображения (для миров, лонгридов и объектов мира и для контент блоков), которые есть на каждом
+# сервере, не копируются при импорте и никогда не удаляются
+DEFAULT_IMAGES = ('/staticFiles/images/QuestionMark.jpg', '/staticFiles/images/font.jpg')
+
+
+# Формирование превью текста: текст обрезается по границе слова и дополняется многоточием
+def make_preview(text):
+    if text is None or len(text) <= PREVIEW_LENGTH:
+        return text
+    cut = text[:PREVIEW_LENGTH - 1]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip() + '…'
+
+
+# Определение полей и связей класса World (Мир)
+class World(db.Model):
+    __tablename__ = 'World'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    img_link = db.Column(db.String(200), nullable=True)
+    # Описание сжимается при включенной настройке TEXT_COMPRESSION (см. compression.py)
+    description = db.Column(CompressedText(10000), nullable=False)
+    description_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=True)
+
+    # Счетчики дочерних элементов, изменяются при создании и удалении элементов (см. counters.py)
+    longread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    chapter_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    blockcontent_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    worldobj_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Номер версии для оптимистичной блокировки, увеличивается при каждом изменении
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+    longreads = db.relationship('LongRead', backref='world', lazy=True)
+    worldodjs = db.relationship('WorldObj', backref='world', lazy=True)
+
+    # Превью обновляется при каждом изменении полного текста
+    @validates('description')
+    def update_description_preview(self, key, value):
+        self.description_preview = make_preview(value)
+        return value
+
+    def __repr__(self):
+        return f'<World {self.name}>'
+
+
+# Определение полей и связей класса LongRead (Лонгрид)
+class LongRead(db.Model):
+    __tablename__ = 'LongRead'
+    id = db.Column(db.Integer, primary_key=True)
+    world_id = db.Column(db.Integer, db.ForeignKey('World.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.String(1000), nullable=False)
+    description_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=True)
+    img_link = db.Column(db.String(200), nullable=True)
+
+    map_link = db.Column(db.String(200), nullable=True)
+    time_line_link = db.Column(db.String(200), nullable=True)
+
+    # Счетчики дочерних элементов, изменяются при создании и удалении элементов (см. counters.py)
+    chapter_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    blockcontent_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Номер последнего опубликованного снимка лонгрида и время публикации (см. publish.py). Лонгрид без времени
+    # публикации является черновиком, номер при снятии с публикации сохраняется, чтобы номера снимков не повторялись
+    published_version = db.Column(db.Integer, nullable=True)
+    published_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    # Количество просмотров лонгрида, увеличивается пачками из буфера процесса (см. reads.py)
+    view_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Номер версии для оптимистичной блокировки, увеличивается при каждом изменении
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+    chapters = db.relationship('Chapter', backref='longread', lazy=True)
+    blockcontents = db.relationship('BlockContent', backref='longread', lazy=True)
+
+    # Превью обновляется при каждом изменении полного текста
+    @validates('description')
+    def update_description_preview(self, key, value):
+        self.description_preview = make_preview(value)
+        return value
+
+    def __repr__(self):
+        return f'<LongRead {self.name}>'
+
+
+# Определение полей и связей класса Chapter (Глава)
+class Chapter(db.Model):
+    __tablename__ = 'Chapter'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    longread_id = db.Column(db.Integer, db.ForeignKey('LongRead.id'), nullable=False)
+
+    # Количество прочтений главы, увеличивается пачками из буфера процесса (см. reads.py)
+    read_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Номер версии для оптимистичной блокировки, увеличивается при каждом изменении
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+    blockcontents = db.relationship('BlockContent', backref='chapter', lazy=True)
+
+    def __repr__(self):
+        return f'<Chapter {self.name}>'
+
+
+# Определение полей и связей класса BlockContent (Контент блок)
+class BlockContent(db.Model):
+    __tablename__ = 'BlockContent'
+    id = db.Column(db.Integer, primary_key=True)
+    longread_id = db.Column(db.Integer, db.ForeignKey('LongRead.id'), nullable=False)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('Chapter.id'), nullable=False)
+    # Полный текст сжимается при включенной настройке TEXT_COMPRESSION (см. compression.py)
+    text = db.Column(CompressedText(10000), nullable=True)
+    text_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=True)
+    img_link = db.Column(db.String(200), nullable=True)
+
+    coordx = db.Column(db.Integer, nullable=True)
+    coordy = db.Column(db.Integer, nullable=True)
+    time = db.Column(db.DateTime(timezone=True), nullable=True)
+    floating_text = db.Column(db.String(200), nullable=True)
+
+    # Количество прочтений контент блока (выдач полного текста), увеличивается пачками из буфера процесса
+    read_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Номер версии для оптимистичной блокировки, увеличивается при каждом изменении
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+    # Индекс для выборки контент блоков главы по порядку и постраничной выдачи по идентификатору
+    __table_args__ = (db.Index('ix_BlockContent_chapter_id_id', 'chapter_id', 'id'),)
+
+    # Превью обновляется при каждом изменении полного текста
+    @validates('text')
+    def update_text_preview(self, key, value):
+        self.text_preview = make_preview(value)
+        return value
+
+    def __repr__(self):
+        return f'<BlockContent {self.name}>'
+
+
+blockcontents = db.Table('blockcontents',
+                         db.Column('blockcontent_id', db.Integer, db.ForeignKey('BlockContent.id'), primary_key=True),
+                         db.Column('worldobj_id', db.Integer, db.ForeignKey('WorldObj.id'), primary_key=True)
+                         )
+
+
+# Определение полей и связей класса WorldObj (Объект мира)
+class WorldObj(db.Model):
+    __tablename__ = 'WorldObj'
+    id = db.Column(db.Integer, primary_key=True)
+    world_id = db.Column(db.Integer, db.ForeignKey('World.id'), nullable=False)
+    description = db.Column(db.String(1000), nullable=False)
+    description_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=True)
+    img_link = db.Column(db.String(200), nullable=True)
+
+    # Номер версии для оптимистичной блокировки, увеличивается при каждом изменении
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+    blockcontents = db.relationship('BlockContent',
+                                    secondary=blockcontents,
+                                    lazy='subquery',
+                                    backref=db.backref('worldobj', lazy=True))
+
+    # Превью обновляется при каждом изменении полного текста
+    @validates('description')
+    def update_description_preview(self, key, value):
+        self.description_preview = make_preview(value)
+        return value
+
+    def __repr__(self):
+        return f'<WorldObj {self.name}>'
+
+
+# Определение полей класса ImportJob (Задача импорта). Задача хранит количество уже обработанных строк NDJSON,
+# что позволяет продолжить импорт после сбоя с места последней зафиксированной транзакции
+class ImportJob(db.Model):
+    __tablename__ = 'ImportJob'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')
+    world_id = db.Column(db.Integer, nullable=True)
+    lines_done = db.Column(db.Integer, nullable=False, default=0)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(1000), nullable=True)
+    created = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.datetime.utcnow)
+    updated = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.datetime.utcnow,
+                        onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImportJob {self.id}>'
+
+
+# Соответствие идентификаторов элементов в импортируемом файле и идентификаторов созданных элементов
+class ImportIdMap(db.Model):
+    __tablename__ = 'ImportIdMap'
+    job_id = db.Column(db.Integer, db.ForeignKey('ImportJob.id'), primary_key=True)
+    type = db.Column(db.String(20), primary_key=True)
+    old_id = db.Column(db.Integer, primary_key=True)
+    new_id = db.Column(db.Integer, nullable=False)
+
+
+# Определение полей класса ChangeLog (Журнал изменений). Запись добавляется в той же транзакции, что и изменение
+# элемента, поэтому журнал содержит все зафиксированные изменения и только их. Идентификатор записи служит номером
+# изменения, по которому клиенты получают изменения, произошедшие после известного им номера
+class ChangeLog(db.Model):
+    __tablename__ = 'ChangeLog'
+    id = db.Column(db.Integer, primary_key=True)
+    # Мир и лонгрид, к которым относится измененный элемент, по ним клиенты выбирают нужные изменения
+    world_id = db.Column(db.Integer, nullable=True, index=True)
+    longread_id = db.Column(db.Integer, nullable=True, index=True)
+    type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    # Вид изменения: create, update, image или delete
+    action = db.Column(db.String(20), nullable=False)
+    created = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.datetime.utcnow)
+
+    # Индекс для поиска изменений отдельного элемента
+    __table_args__ = (db.Index('ix_ChangeLog_type_entity_id', 'type', 'entity_id'),)
+
+    def __repr__(self):
+        return f'<ChangeLog {self.id}>'
+
+
+# Определение полей класса Job (Фоновая задача). Задачи добавляются в базу данных в той же транзакции, что и
+# изменение, которое их вызвало, и выполняются отдельным процессом (flask run-worker). Задача, завершившаяся
+# ошибкой, повторяется с увеличивающейся задержкой, пока не исчерпано количество попыток
+class Job(db.Model):
+    __tablename__ = 'Job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # Параметры задачи в формате JSON
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    # Состояние задачи: queued, running, done или failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    # Время, раньше которого задача не выполняется (используется для задержки перед повтором)
+    run_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    result = db.Column(db.String(1000), nullable=True)
+    error = db.Column(db.String(1000), nullable=True)
+    created = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.datetime.utcnow)
+    updated = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.datetime.utcnow,
+                        onupdate=datetime.datetime.utcnow)
+
+    # Индекс для выбора следующей задачи
+    __table_args__ = (db.Index('ix_Job_status_run_at', 'status', 'run_at'),)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind}>'
+
+
+# Словари для сжатия текстов. Сжатые значения ссылаются на словарь по идентификатору, который вычисляется по
+# содержимому словаря, поэтому старые словари не удаляются после обучения нового. Словари общие для всех шардов и
+# хранятся в основной базе данных, чтобы сжатые тексты можно было переносить между шардами
+class CompressionDict(db.Model):
+    __tablename__ = 'CompressionDict'
+    id = db.Column(db.Integer, primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    # Количество текстов, на которых обучен словарь
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    __table_args__ = {'info': {'catalog': True}}
+
+
+# Ревизии текста контент блоков. Каждая ревизия хранит текст версии контент блока либо целиком (снимок), либо
+# в виде разницы с предыдущей ревизией (см. revisions.py)
+class BlockRevision(db.Model):
+    __tablename__ = 'BlockRevision'
+    id = db.Column(db.Integer, primary_key=True)
+    blockcontent_id = db.Column(db.Integer, nullable=False)
+    # Версия контент блока, текст которой хранит ревизия
+    version = db.Column(db.Integer, nullable=False)
+    snapshot = db.Column(db.Boolean, nullable=False, default=False)
+    # Полный текст для снимка либо JSON-текст с изменениями относительно предыдущей ревизии
+    data = db.Column(CompressedText, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    __table_args__ = (db.Index('ix_BlockRevision_blockcontent_id_version', 'blockcontent_id', 'version'),)
+
+
+# Каталог шардов: шард, в базе данных которого находятся мир и все его дочерние элементы (см. sharding.py). Миры без
+# строки в каталоге находятся в основной базе данных. Таблица каталога всегда находится в основной базе данных
+class WorldShard(db.Model):
+    __tablename__ = 'WorldShard'
+    world_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shard = db.Column(db.String(50), nullable=False)
+    # Мир переносится в другой шард, изменения мира временно запрещены
+    moving = db.Column(db.Boolean, nullable=False, default=False)
+    __table_args__ = {'info': {'catalog': True}}
+
+
+# Последний выданный идентификатор таблицы в шарде. При включенных шардах идентификаторы элементов выдаются
+# приложением, а не базой данных, чтобы они не повторялись в разных шардах (см. sharding.py)
+class ShardSequence(db.Model):
+    __tablename__ = 'ShardSequence'
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False)
+
+
+# Количество прочтений элементов по дням (UTC). Таблица общая для всех шардов и хранится в основной базе данных,
+# из нее раз в час пересчитываются итоги за неделю (см. reads.py)
+class ReadDaily(db.Model):
+    __tablename__ = 'ReadDaily'
+    type = db.Column(db.String(20), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    world_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    __table_args__ = {'info': {'catalog': True}}
+
+
+# Количество прочтений элементов за последние семь дней, пересчитывается из ReadDaily. Списки самых читаемых
+# элементов выбираются из этой таблицы одним запросом по индексу
+class ReadRollup(db.Model):
+    __tablename__ = 'ReadRollup'
+    type = db.Column(db.String(20), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    world_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.Index('ix_ReadRollup_type_count', 'type', 'count'),
+                      db.Index('ix_ReadRollup_world_id_type_count', 'world_id', 'type', 'count'),
+                      {'info': {'catalog': True}})
@@ -0,0 +1,84 @@
+import datetime
+from flask import jsonify
+from sqlalchemy.types import TypeDecorator
+
+from .extensions import db
+from .export import json_value
+from .models import World, LongRead, Chapter, BlockContent, WorldObj
+# Частичное изменение элементов (PATCH). Клиент передает JSON-текст только с изменяемыми полями, поля проверяются по
+# описанию полей модели (тип, длина строки, допустимость пустого значения) и изменяются одним запросом в базу данных
+
+# Поля, которые можно изменять частичным изменением. Идентификаторы, связи, изображения, превью и версия изменяются
+# только приложением
+EDITABLE_FIELDS = {
+    World: ('name', 'description'),
+    LongRead: ('name', 'description', 'map_link', 'time_line_link'),
+    Chapter: ('name',),
+    BlockContent: ('text', 'coordx', 'coordy', 'time', 'floating_text'),
+    WorldObj: ('description',),
+}
+
+
+# Исключение при получении некорректных полей, содержит описание ошибки для каждого поля
+class InvalidPatch(Exception):
+    def __init__(self, errors):
+        super().__init__('Invalid data')
+        self.errors = errors
+
+
+# Проверка значения поля по описанию поля модели, функция возвращает значение для записи в базу данных
+def validate_value(column, value):
+    if value is None:
+        if not column.nullable:
+            raise ValueError('must not be null')
+        return None
+    # Поля собственных типов (например сжатый текст) проверяются по типу, который хранится в базе данных
+    column_type = column.type.impl if isinstance(column.type, TypeDecorator) else column.type
+    if isinstance(column_type, db.String):
+        if not isinstance(value, str):
+            raise ValueError('must be a string')
+        if column_type.length is not None and len(value) > column_type.length:
+            raise ValueError('must be at most %d characters' % column_type.length)
+        return value
+    if isinstance(column_type, db.Integer):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError('must be an integer')
+        return value
+    if isinstance(column_type, db.DateTime):
+        if not isinstance(value, str):
+            raise ValueError('must be an ISO 8601 date')
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+# Проверка JSON-текста частичного изменения. Функция возвращает словарь значений для изменения либо вызывает
+# исключение InvalidPatch со списком ошибок
+def validate_patch(model, data):
+    if not isinstance(data, dict) or not data:
+        raise InvalidPatch({'': 'expected a non-empty JSON object'})
+    table = model.__table__
+    values = {}
+    errors = {}
+    for name, value in data.items():
+        if name not in EDITABLE_FIELDS[model]:
+            errors[name] = 'unknown or read-only field'
+            continue
+        try:
+            values[name] = validate_value(table.c[name], value)
+        except ValueError as error:
+            errors[name] = str(error)
+    if errors:
+        raise InvalidPatch(errors)
+    return values
+
+
+# JSON-текст ответа на частичное изменение: идентификатор и только измененные поля, включая новую версию и превью
+def patch_data(row_id, changed):
+    data = {name: json_value(value) for name, value in changed.items()}
+    data['id'] = row_id
+    return data
+
+
+# Ответ на запрос с некорректными полями
+def invalid_patch(error):
+    return jsonify({'message': 'Invalid data', 'errors': error.errors}), 400
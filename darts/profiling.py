@@ -0,0 +1,231 @@
+import os
+import sys
+import hmac
+import json
+import time
+import random
+import cProfile
+import datetime
+import itertools
+import threading
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .warmup import WARMUP_ENVIRON
+# Профилирование отдельных запросов в рабочем приложении. Медленный запрос (например api_world или world_delete на
+# большом мире) нельзя воспроизвести на маленькой базе данных разработки, поэтому профиль снимается с настоящего
+# запроса: по заголовку X-Profile с секретом PROFILE_TOKEN либо для случайной доли запросов PROFILE_SAMPLE_RATE
+# (только для эндпоинтов PROFILE_ENDPOINTS, если они указаны). Для запроса записываются профиль процессора и
+# последовательность SQL запросов с временем выполнения. Профиль сохраняется в папку PROFILE_FOLDER после отправки
+# ответа, поэтому запись файла не увеличивает время ответа. Форматы профилей:
+#   speedscope - сэмплирующий профилировщик (стек потока запроса раз в PROFILE_SAMPLE_INTERVAL секунд) и SQL запросы
+#                в одном файле .speedscope.json, который открывается на https://www.speedscope.app
+#   pstats     - точный профиль cProfile в файле .prof (python -m pstats, snakeviz) и SQL запросы в файле
+#                .sql.speedscope.json
+
+# Заголовок запроса, включающий профилирование, и заголовок ответа с именем файла профиля
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+# Интервал между снимками стека потока запроса в секундах
+PROFILE_SAMPLE_INTERVAL = 0.001
+# Количество файлов профилей, которые хранятся в папке профилей
+PROFILE_KEEP = 200
+# Максимальная длина текста SQL запроса в профиле
+SQL_TEXT_LENGTH = 300
+
+# Профили выполняющихся запросов по идентификатору потока
+active_profiles = {}
+# Номера профилей процесса для уникальных имен файлов
+profile_numbers = itertools.count(1)
+
+
+# Профиль одного запроса: снимки стека потока запроса либо профиль cProfile и SQL запросы с временем начала и
+# окончания
+class RequestProfile:
+    def __init__(self, name, sampled):
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.samples = []
+        self.queries = []
+        self.stopped = threading.Event()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.profiler = None
+        self.sampler = None
+        if sampled:
+            self.sampler = threading.Thread(target=self.sample, name='darts-profile-sampler', daemon=True)
+            self.sampler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    # Снимки стека потока запроса. Вес снимка - время с предыдущего снимка, тк поток сэмплирования получает GIL не
+    # точно через интервал
+    def sample(self):
+        previous = self.started
+        while not self.stopped.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            self.samples.append((now - previous, stack[::-1]))
+            previous = now
+
+    def stop(self):
+        self.finished = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+
+
+# Папка профилей (по умолчанию instance/profiles)
+def profile_folder():
+    return current_app.config.get('PROFILE_FOLDER') or os.path.join(current_app.instance_path, 'profiles')
+
+
+# Причина профилирования текущего запроса: header - заголовок с секретом (действует, только если указан
+# PROFILE_TOKEN), sample - случайная выборка, None - запрос не профилируется. Запросы прогрева процесса не
+# профилируются
+def profile_reason():
+    if request.environ.get(WARMUP_ENVIRON):
+        return None
+    token = current_app.config.get('PROFILE_TOKEN')
+    header = request.headers.get(PROFILE_HEADER)
+    if token and header and hmac.compare_digest(header.encode(), token.encode()):
+        return 'header'
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE')
+    endpoints = current_app.config.get('PROFILE_ENDPOINTS')
+    if rate and (not endpoints or request.endpoint in endpoints) and random.random() < rate:
+        return 'sample'
+    return None
+
+
+# Начало профилирования перед вызовом обработчика запроса
+def start_profile():
+    reason = profile_reason()
+    if reason is None:
+        return
+    name = '%s %s' % (request.method, request.full_path.rstrip('?'))
+    try:
+        profile = RequestProfile(name, current_app.config.get('PROFILE_FORMAT') != 'pstats')
+    except ValueError:
+        # В потоке уже работает другой профилировщик
+        return
+    active_profiles[profile.thread_id] = profile
+    g.profile = profile
+    g.profile_reason = reason
+
+
+# Окончание профилирования после отправки ответа, в том числе потокового. Имя файла профиля отсылается в заголовке
+# ответа на запросы с заголовком X-Profile
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d-%H%M%S')
+    profile_id = '%s-%s-%d-%d' % (stamp, request.endpoint or 'unknown', os.getpid(), next(profile_numbers))
+    if g.profile_reason == 'header':
+        response.headers[PROFILE_ID_HEADER] = profile_id
+    folder = profile_folder()
+    app = current_app._get_current_object()
+
+    def write():
+        profile.stop()
+        active_profiles.pop(profile.thread_id, None)
+        try:
+            write_profile(profile, folder, profile_id)
+        except OSError:
+            app.logger.exception('Profile %s was not written', profile_id)
+
+    response.call_on_close(write)
+    return response
+
+
+# Остановка профилирования запроса, ответ на который не был сформирован (ошибка в обработчиках after_request)
+def discard_profile(error):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+        active_profiles.pop(profile.thread_id, None)
+
+
+# Кадры и события SQL запросов в формате speedscope: корневой кадр запроса и вложенный кадр на каждый запрос
+def sql_profile(profile, frames):
+    frames.append({'name': profile.name})
+    root = len(frames) - 1
+    events = [{'type': 'O', 'frame': root, 'at': 0}]
+    for started, finished, statement in profile.queries:
+        frames.append({'name': statement, 'file': 'sql'})
+        events.append({'type': 'O', 'frame': len(frames) - 1, 'at': started - profile.started})
+        events.append({'type': 'C', 'frame': len(frames) - 1, 'at': finished - profile.started})
+    duration = profile.finished - profile.started
+    events.append({'type': 'C', 'frame': root, 'at': duration})
+    return {'type': 'evented', 'name': '%s (%d SQL queries, %.1f ms)' % (
+                profile.name, len(profile.queries), 1000 * sum(end - start for start, end, _ in profile.queries)),
+            'unit': 'seconds', 'startValue': 0, 'endValue': duration, 'events': events}
+
+
+# Снимки стека в формате speedscope. Одинаковые функции в разных снимках ссылаются на один кадр
+def cpu_profile(profile, frames):
+    indexes = {}
+    samples = []
+    for weight, stack in profile.samples:
+        sample = []
+        for name, path, line in stack:
+            if (name, path, line) not in indexes:
+                indexes[(name, path, line)] = len(frames)
+                frames.append({'name': name, 'file': path, 'line': line})
+            sample.append(indexes[(name, path, line)])
+        samples.append(sample)
+    return {'type': 'sampled', 'name': '%s (CPU, %d samples)' % (profile.name, len(samples)), 'unit': 'seconds',
+            'startValue': 0, 'endValue': profile.finished - profile.started, 'samples': samples,
+            'weights': [weight for weight, stack in profile.samples]}
+
+
+# Запись файлов профиля и удаление старых профилей сверх PROFILE_KEEP
+def write_profile(profile, folder, profile_id):
+    os.makedirs(folder, exist_ok=True)
+    frames = []
+    profiles = [sql_profile(profile, frames)]
+    if profile.profiler is not None:
+        profile.profiler.dump_stats(os.path.join(folder, profile_id + '.prof'))
+        path = os.path.join(folder, profile_id + '.sql.speedscope.json')
+    else:
+        profiles.insert(0, cpu_profile(profile, frames))
+        path = os.path.join(folder, profile_id + '.speedscope.json')
+    document = {'$schema': 'https://www.speedscope.app/file-format-schema.json', 'name': profile.name,
+                'exporter': 'darts', 'activeProfileIndex': 0, 'shared': {'frames': frames}, 'profiles': profiles}
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(document, output)
+    # Имена файлов начинаются со времени записи, поэтому они упорядочены по времени
+    entries = sorted(os.listdir(folder))
+    for entry in entries[:-PROFILE_KEEP]:
+        os.remove(os.path.join(folder, entry))
+
+
+# Время SQL запросов потока, для которого снимается профиль
+@event.listens_for(Engine, 'before_cursor_execute')
+def query_started(connection, cursor, statement, parameters, context, executemany):
+    if threading.get_ident() in active_profiles:
+        connection.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def query_finished(connection, cursor, statement, parameters, context, executemany):
+    profile = active_profiles.get(threading.get_ident())
+    started = connection.info.get('profile_started')
+    if profile is not None and started:
+        profile.queries.append((started.pop(), time.perf_counter(), ' '.join(statement.split())[:SQL_TEXT_LENGTH]))
+
+
+# Подключение профилирования к приложению
+def init_profiling(app):
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(discard_profile)
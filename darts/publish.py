@@ -0,0 +1,258 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, send_file, stream_with_context, url_for, abort
+from sqlalchemy import event, func, select, update
+
+from .extensions import db
+from .models import LongRead, Chapter, BlockContent, WorldObj, blockcontents
+from .serializers import longread_detail_data, chapter_detail_data, blockcontent_item_data, worldobj_item_data
+from .changes import log_change
+from .jobs import enqueue, job_handler
+from .reads import count_reads
+# Публикация лонгридов. Читатели получают лонгрид целиком (главы, контент блоки, связанные объекты мира и ссылки на
+# копии изображений) одним JSON-документом, который при публикации один раз формируется из базы данных, сжимается
+# gzip и записывается в файл на диске (PUBLISH_FOLDER). Каждая публикация создает новый снимок с новым номером,
+# снимок никогда не изменяется, поэтому его ссылка /api/published/longreads/<id>/<номер>.json кэшируется браузером
+# и прокси-серверами навсегда. Ссылка для читателей /api/read/longreads/<id> отдает последний снимок без запросов к
+# таблицам глав и контент блоков, а для неопубликованного лонгрида (черновика) формирует документ из текущих данных.
+# Авторы по-прежнему редактируют лонгрид через /api/longreads/<id>, изменения видны читателям после новой публикации
+
+# Количество предыдущих снимков, которые хранятся после новой публикации для клиентов, получивших их ссылки раньше
+PUBLISH_KEEP_SNAPSHOTS = 3
+# Количество контент блоков, которые читаются из базы данных за один раз при формировании документа
+PUBLISH_BATCH_SIZE = 200
+# Время кэширования снимков в секундах (год, максимальное значение по RFC 9111)
+PUBLISHED_MAX_AGE = 365 * 24 * 3600
+
+bp = Blueprint('publish', __name__)
+
+
+# Папка со снимками лонгридов (по умолчанию instance/published)
+def publish_folder():
+    return current_app.config.get('PUBLISH_FOLDER') or os.path.join(current_app.instance_path, 'published')
+
+
+# Путь к файлу снимка лонгрида
+def snapshot_path(longread_id, number):
+    return os.path.join(publish_folder(), 'longreads', str(longread_id), '%d.json.gz' % number)
+
+
+# Идентификаторы объектов мира, связанных с контент блоками, по идентификаторам контент блоков
+def linked_worldobjs(blockcontent_ids):
+    links = {}
+    rows = db.session.execute(select(blockcontents.c.blockcontent_id, blockcontents.c.worldobj_id)
+                              .where(blockcontents.c.blockcontent_id.in_(blockcontent_ids))
+                              .order_by(blockcontents.c.worldobj_id))
+    for blockcontent_id, worldobj_id in rows:
+        links.setdefault(blockcontent_id, []).append(worldobj_id)
+    return links
+
+
+# JSON-текст объекта без закрывающей скобки, чтобы после него можно было дописать поле со списком по частям
+def open_object(data):
+    return json.dumps(data, ensure_ascii=False)[:-1]
+
+
+# Генератор частей JSON-документа лонгрида: данные лонгрида, главы с полным текстом контент блоков и
+# идентификаторами связанных объектов мира, объекты мира. Контент блоки читаются пачками, поэтому объем используемой
+# памяти не зависит от размера лонгрида
+def document_chunks(longread):
+    data = longread_detail_data(longread, [])
+    del data['chapters']
+    yield open_object(data) + ', "chapters": ['
+    worldobj_ids = set()
+    chapters = db.session.scalars(select(Chapter).where(Chapter.longread_id == longread.id).order_by(Chapter.id))
+    for index, chapter in enumerate(chapters.all()):
+        chapter_data = chapter_detail_data(chapter, [])
+        del chapter_data['blockcontents']
+        yield (', ' if index else '') + open_object(chapter_data) + ', "blockcontents": ['
+        query = (select(BlockContent).where(BlockContent.chapter_id == chapter.id).order_by(BlockContent.id)
+                 .limit(PUBLISH_BATCH_SIZE))
+        separator = ''
+        cursor = 0
+        while True:
+            batch = db.session.scalars(query.where(BlockContent.id > cursor)).all()
+            if not batch:
+                break
+            links = linked_worldobjs([blockcontent.id for blockcontent in batch])
+            for blockcontent in batch:
+                blockcontent_data = blockcontent_item_data(blockcontent)
+                blockcontent_data['worldobj_ids'] = links.get(blockcontent.id, [])
+                worldobj_ids.update(blockcontent_data['worldobj_ids'])
+                yield separator + json.dumps(blockcontent_data, ensure_ascii=False)
+                separator = ', '
+            cursor = batch[-1].id
+        yield ']}'
+    yield '], "worldobjs": ['
+    worldobj_ids = sorted(worldobj_ids)
+    separator = ''
+    for start in range(0, len(worldobj_ids), PUBLISH_BATCH_SIZE):
+        worldobjs = db.session.scalars(select(WorldObj).where(
+            WorldObj.id.in_(worldobj_ids[start:start + PUBLISH_BATCH_SIZE])).order_by(WorldObj.id))
+        for worldobj in worldobjs.all():
+            yield separator + json.dumps(worldobj_item_data(worldobj), ensure_ascii=False)
+            separator = ', '
+    yield ']}'
+
+
+# Запись снимка лонгрида в файл со следующим свободным номером начиная с number. Снимок записывается во временный
+# файл и создается под своим именем жесткой ссылкой, которая не перезаписывает существующий файл, поэтому
+# одновременные публикации одного лонгрида получат разные номера, а читатели никогда не получат недописанный файл.
+# Функция возвращает номер снимка
+def write_snapshot(longread, number):
+    folder = os.path.dirname(snapshot_path(longread.id, number))
+    os.makedirs(folder, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=folder)
+    try:
+        # Время в заголовке gzip не записывается, чтобы одинаковые документы давали одинаковые файлы
+        with os.fdopen(descriptor, 'wb') as target, gzip.GzipFile(fileobj=target, mode='wb', mtime=0) as stream:
+            for chunk in document_chunks(longread):
+                stream.write(chunk.encode('utf-8'))
+        while True:
+            try:
+                os.link(temp_path, snapshot_path(longread.id, number))
+                return number
+            except FileExistsError:
+                # Номер занят одновременной публикацией либо файлом публикации, прерванной до сохранения номера
+                number += 1
+    finally:
+        os.remove(temp_path)
+
+
+# Публикация лонгрида: запись нового снимка и сохранение его номера. Номер изменяется запросом с условием, что
+# сохраненный номер меньше нового, поэтому если одновременно был опубликован более новый снимок, он не заменяется.
+# Функция возвращает номер снимка либо None, если более новый снимок опубликовал другой запрос
+def publish_longread(longread):
+    number = write_snapshot(longread, (longread.published_version or 0) + 1)
+    published = db.session.execute(update(LongRead).where(LongRead.id == longread.id,
+                                                          func.coalesce(LongRead.published_version, 0) < number)
+                                   .values(published_version=number,
+                                           published_at=datetime.datetime.now(datetime.timezone.utc))
+                                   .execution_options(synchronize_session=False)).rowcount
+    if not published:
+        db.session.rollback()
+        os.remove(snapshot_path(longread.id, number))
+        return None
+    # Запись в журнал изменений: номер снимка входит в данные лонгрида
+    log_change(db.session.connection(), LongRead, longread.id, 'update')
+    # Старые снимки удаляются фоновой задачей
+    if number > PUBLISH_KEEP_SNAPSHOTS + 1:
+        enqueue('remove_published', longread_ids=[longread.id], before=number - PUBLISH_KEEP_SNAPSHOTS)
+    db.session.commit()
+    return number
+
+
+# Удаление снимков лонгридов с номерами меньше before, без before - всех снимков (для удаленных лонгридов).
+# Отсутствующие файлы пропускаются, поэтому повтор задачи безопасен
+@job_handler('remove_published')
+def remove_published(longread_ids, before=None):
+    removed = 0
+    for longread_id in longread_ids:
+        folder = os.path.dirname(snapshot_path(longread_id, 0))
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            number = name.split('.', 1)[0]
+            # Временные файлы незавершенных публикаций не удаляются
+            if not name.endswith('.json.gz') or not number.isdigit():
+                continue
+            if before is None or int(number) < before:
+                try:
+                    os.remove(os.path.join(folder, name))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        if before is None:
+            shutil.rmtree(folder, ignore_errors=True)
+    return 'removed %d snapshots' % removed
+
+
+# Снимки удаленных через модели лонгридов удаляются фоновой задачей после фиксации удаления
+@event.listens_for(db.session, 'before_flush')
+def remove_deleted_snapshots(session, flush_context, instances):
+    ids = [obj.id for obj in session.deleted if isinstance(obj, LongRead) and obj.published_version is not None]
+    if ids:
+        enqueue('remove_published', longread_ids=ids)
+
+
+# Ответ со снимком лонгрида. Файл отдается без распаковки, если клиент поддерживает gzip, иначе распаковывается
+def snapshot_response(path, max_age, immutable):
+    if 'gzip' in request.accept_encodings:
+        response = send_file(path, mimetype='application/json', conditional=True, max_age=max_age)
+        response.headers['Content-Encoding'] = 'gzip'
+        # Имя файла снимка не относится к документу
+        del response.headers['Content-Disposition']
+    else:
+        with gzip.open(path, 'rb') as stream:
+            response = Response(stream.read(), mimetype='application/json')
+        response.cache_control.max_age = max_age
+        response.add_etag()
+        response.make_conditional(request)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        # Ответ проверяется при каждом запросе по заголовку ETag
+        response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# React Функция для публикации лонгрида: формирование снимка лонгрида из текущих данных. Отсылается номер снимка и
+# ссылка на него
+@bp.route('/api/longreads/<int:longread_id>/publish/', methods=['POST'])
+def api_longread_publish(longread_id):
+    longread = LongRead.query.get_or_404(longread_id)
+    number = publish_longread(longread)
+    if number is None:
+        return jsonify({'message': 'A newer snapshot was published by another request'}), 409
+    url = url_for('publish.published_longread', longread_id=longread_id, number=number)
+    return jsonify({'message': 'Longread published successfully', 'published_version': number, 'url': url}), 200
+
+
+# React Функция для снятия лонгрида с публикации. Снимки удаляются фоновой задачей, читатели получают текущие данные
+@bp.route('/api/longreads/<int:longread_id>/publish/', methods=['DELETE'])
+def api_longread_unpublish(longread_id):
+    longread = LongRead.query.get_or_404(longread_id)
+    if longread.published_at is not None:
+        db.session.execute(update(LongRead).where(LongRead.id == longread_id).values(published_at=None)
+                           .execution_options(synchronize_session=False))
+        log_change(db.session.connection(), LongRead, longread_id, 'update')
+        # Удаляются только снимки до текущего, чтобы задача не удалила снимок публикации, выполненной после снятия
+        enqueue('remove_published', longread_ids=[longread_id], before=longread.published_version + 1)
+        db.session.commit()
+    return jsonify({'message': 'Longread unpublished successfully'}), 200
+
+
+# Функция для получения снимка лонгрида по номеру. Снимок никогда не изменяется и кэшируется навсегда
+@bp.route('/api/published/longreads/<int:longread_id>/<int:number>.json', methods=['GET'])
+def published_longread(longread_id, number):
+    path = snapshot_path(longread_id, number)
+    if not os.path.isfile(path):
+        abort(404)
+    return snapshot_response(path, PUBLISHED_MAX_AGE, True)
+
+
+# Функция для чтения лонгрида читателями: последний снимок опубликованного лонгрида либо документ из текущих данных
+# для черновика. Ссылка не меняется при новой публикации, поэтому ответ проверяется при каждом запросе по ETag,
+# а ссылка на снимок с кэшированием навсегда передается в заголовке Content-Location
+@bp.route('/api/read/longreads/<int:longread_id>', methods=['GET'])
+def api_read_longread(longread_id):
+    longread = LongRead.query.get_or_404(longread_id)
+    # Просмотр лонгрида читателем учитывается в буфере счетчиков процесса
+    count_reads('longread', [longread_id])
+    if longread.published_at is not None:
+        path = snapshot_path(longread_id, longread.published_version)
+        if os.path.isfile(path):
+            response = snapshot_response(path, 0, False)
+            response.headers['Content-Location'] = url_for('publish.published_longread', longread_id=longread_id,
+                                                           number=longread.published_version)
+            return response
+    # Черновик (или снимок, который еще не скопирован на этот сервер) формируется из текущих данных по частям
+    response = Response(stream_with_context(document_chunks(longread)), mimetype='application/json')
+    response.cache_control.no_store = True
+    return response
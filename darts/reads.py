@@ -0,0 +1,238 @@
+import os
+import time
+import atexit
+import weakref
+import datetime
+import threading
+import collections
+import click
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .extensions import db, MAIN_SHARD
+from .models import LongRead, Chapter, BlockContent, Job, ReadDaily, ReadRollup
+from .changes import CHANGE_TYPES, scope_query
+from .jobs import enqueue, job_handler
+from .loader import get_loader
+from .serializers import preview_requested, longread_item_data, chapter_item_data
+from .sharding import current_shard, group_by_shard, use_shard
+from .warmup import WARMUP_ENVIRON
+# Счетчики просмотров лонгридов и прочтений глав и контент блоков. Увеличение строки при каждом чтении превратило бы
+# чтения в запись в SQLite, поэтому обработчики запросов только увеличивают счетчики в памяти процесса, а отдельный
+# поток раз в READ_FLUSH_INTERVAL секунд записывает накопленные значения: один запрос UPDATE с пачкой параметров на
+# каждую таблицу и шард. Оставшиеся значения записываются при штатном завершении процесса. Прочтения лонгридов и
+# глав также суммируются по дням, из дневных значений раз в час фоновая задача пересчитывает итоги за неделю для
+# списка самых читаемых элементов /api/most-read/
+
+# Счетчики по типам элементов: модель и поле счетчика
+READ_COUNTERS = {
+    'longread': (LongRead, 'view_count'),
+    'chapter': (Chapter, 'read_count'),
+    'blockcontent': (BlockContent, 'read_count'),
+}
+# Поля счетчиков, которые не заполняются из внешних данных (импорт)
+READ_COLUMNS = {counter for model, counter in READ_COUNTERS.values()}
+# Типы элементов, прочтения которых суммируются по дням для списков самых читаемых элементов
+ROLLUP_TYPES = {'longread': longread_item_data, 'chapter': chapter_item_data}
+# Количество дней, за которые суммируются прочтения в итогах
+ROLLUP_DAYS = 7
+# Дневные значения хранятся это количество дней
+READ_DAILY_KEEP_DAYS = 35
+# Минимальный интервал в секундах между пересчетами итогов
+ROLLUP_INTERVAL = 3600
+# При таком количестве разных элементов в буфере значения записываются, не дожидаясь интервала
+READ_FLUSH_MAX_KEYS = 10000
+# Максимальная длина списка самых читаемых элементов
+MOST_READ_MAX_LIMIT = 100
+
+bp = Blueprint('reads', __name__)
+
+# Буферы счетчиков всех приложений процесса для записи при завершении процесса. Ссылки слабые, поэтому буфер не
+# удерживает в памяти приложение, которое больше не используется (например в тестах)
+read_buffers = weakref.WeakSet()
+
+
+# Буфер счетчиков процесса: количество прочтений по шарду, типу и идентификатору элемента
+class ReadBuffer:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.pending = collections.Counter()
+        self.wake = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.rollup_at = 0
+
+    def add(self, shard, type_name, ids):
+        with self.lock:
+            # После fork процесса (gunicorn --preload) значения родительского процесса не записываются повторно,
+            # а поток записи запускается заново
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.pending.clear()
+                self.thread = None
+            for row_id in ids:
+                self.pending[(shard, type_name, row_id)] += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=flush_loop, args=(weakref.ref(self), self.wake),
+                                               name='darts-read-flush', daemon=True)
+                self.thread.start()
+            if len(self.pending) >= READ_FLUSH_MAX_KEYS:
+                self.wake.set()
+
+    # Запись накопленных значений. Буфер заменяется пустым, поэтому обработчики запросов не ждут окончания записи.
+    # При ошибке значения возвращаются в буфер и записываются в следующий раз
+    def flush(self):
+        with self.lock:
+            if self.pid != os.getpid() or not self.pending:
+                return 0
+            pending, self.pending = self.pending, collections.Counter()
+        with self.app.app_context():
+            try:
+                write_reads(pending)
+                if not self.rollup_at or time.monotonic() - self.rollup_at >= ROLLUP_INTERVAL:
+                    self.rollup_at = time.monotonic()
+                    schedule_rollup()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Read counters were not written, will retry')
+                with self.lock:
+                    self.pending.update(pending)
+                return 0
+        return sum(pending.values())
+
+
+# Поток записи: значения записываются раз в интервал либо при переполнении буфера. Поток хранит только слабую ссылку
+# на буфер и завершается, когда буфер удален вместе с приложением
+def flush_loop(buffer_ref, wake):
+    while True:
+        buffer = buffer_ref()
+        if buffer is None:
+            return
+        interval = buffer.app.config['READ_FLUSH_INTERVAL']
+        del buffer
+        wake.wait(interval)
+        wake.clear()
+        buffer = buffer_ref()
+        if buffer is None:
+            return
+        buffer.flush()
+        del buffer
+
+
+# Запись значений буферов всех приложений при штатном завершении процесса
+@atexit.register
+def flush_read_buffers():
+    for buffer in list(read_buffers):
+        buffer.flush()
+
+
+def read_buffer():
+    return current_app.extensions['darts_reads']
+
+
+# Учет прочтения элементов одного типа в текущем шарде. Запросы прогрева процесса (см. warmup.py) не учитываются
+def count_reads(type_name, ids):
+    if current_app.config.get('READ_COUNTERS') and not request.environ.get(WARMUP_ENVIRON):
+        read_buffer().add(current_shard(), type_name, ids)
+
+
+# Запись значений буфера: увеличение счетчиков в таблицах элементов каждого шарда и дневных значений в основной
+# базе данных. Счетчики изменяются без увеличения версии элемента и без записи в журнал изменений
+def write_reads(pending):
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    groups = collections.defaultdict(dict)
+    for (shard, type_name, row_id), count in pending.items():
+        groups[(shard, type_name)][row_id] = count
+    daily = []
+    for (shard, type_name), counts in groups.items():
+        model, counter = READ_COUNTERS[type_name]
+        table = model.__table__
+        with use_shard(shard):
+            db.session.execute(update(table).where(table.c.id == bindparam('row_id'))
+                               .values({counter: table.c[counter] + bindparam('count')}),
+                               [{'row_id': row_id, 'count': count} for row_id, count in counts.items()])
+            if type_name not in ROLLUP_TYPES:
+                continue
+            # Мир элемента для списков самых читаемых элементов мира. Удаленные элементы пропускаются
+            worlds = db.session.execute(scope_query(model).where(table.c.id.in_(list(counts)))).all()
+        daily.extend({'type': type_name, 'row_id': row.id, 'day': today, 'world_id': row.world_id,
+                      'count': counts[row.id]} for row in worlds)
+    if daily:
+        statement = sqlite_insert(ReadDaily)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[ReadDaily.type, ReadDaily.row_id, ReadDaily.day],
+            set_={'count': ReadDaily.count + statement.excluded.count}), daily)
+    db.session.commit()
+
+
+# Добавление задачи пересчета итогов в основной базе данных, если такой задачи еще нет в очереди
+def schedule_rollup():
+    with use_shard(MAIN_SHARD):
+        queued = db.session.execute(select(Job.id).where(Job.kind == 'rollup_reads', Job.status == 'queued')
+                                    .limit(1)).first()
+        if queued is None:
+            enqueue('rollup_reads')
+            db.session.commit()
+
+
+# Пересчет итогов за последние ROLLUP_DAYS дней и удаление старых дневных значений одной транзакцией. Функция
+# возвращает количество элементов в итогах
+def rollup_reads():
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    since = today - datetime.timedelta(days=ROLLUP_DAYS - 1)
+    db.session.execute(delete(ReadRollup))
+    totals = (select(ReadDaily.type, ReadDaily.row_id, func.max(ReadDaily.world_id), func.sum(ReadDaily.count))
+              .where(ReadDaily.day >= since).group_by(ReadDaily.type, ReadDaily.row_id))
+    db.session.execute(insert(ReadRollup).from_select(['type', 'row_id', 'world_id', 'count'], totals))
+    db.session.execute(delete(ReadDaily).where(ReadDaily.day < today - datetime.timedelta(days=READ_DAILY_KEEP_DAYS)))
+    db.session.commit()
+    return db.session.execute(select(func.count()).select_from(ReadRollup)).scalar()
+
+
+# Фоновая задача пересчета итогов
+@job_handler('rollup_reads')
+def rollup_reads_job():
+    return 'rolled up %d elements' % rollup_reads()
+
+
+# Функция для передачи на React фронтальную часть приложения списка самых читаемых за неделю лонгридов либо глав:
+# /api/most-read/?type=longread&limit=10, для одного мира - /api/most-read/?type=chapter&world_id=1. Список берется
+# из итогов, которые пересчитываются раз в час, поэтому запрос не суммирует прочтения
+@bp.route('/api/most-read/', methods=['GET'])
+def api_most_read():
+    type_name = request.args.get('type', 'longread')
+    if type_name not in ROLLUP_TYPES:
+        return jsonify({'message': 'Unknown type %s, expected %s' % (type_name, ', '.join(ROLLUP_TYPES))}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), MOST_READ_MAX_LIMIT))
+    query = select(ReadRollup.row_id, ReadRollup.count).where(ReadRollup.type == type_name)
+    world_id = request.args.get('world_id', type=int)
+    if world_id is not None:
+        query = query.where(ReadRollup.world_id == world_id)
+    rows = db.session.execute(query.order_by(ReadRollup.count.desc(), ReadRollup.row_id).limit(limit)).all()
+    # Элементы загружаются загрузчиком запроса в шардах, в которых они находятся. Удаленные элементы пропускаются
+    model = next(model for model, name in CHANGE_TYPES.items() if name == type_name)
+    loader = get_loader()
+    found = {}
+    for shard, shard_ids in group_by_shard(model, [row.row_id for row in rows]).items():
+        with use_shard(shard):
+            found.update(zip(shard_ids, loader.load_many(model, shard_ids)))
+    preview = preview_requested(request.args)
+    items = []
+    for row in rows:
+        if found.get(row.row_id) is not None:
+            items.append(dict(ROLLUP_TYPES[type_name](found[row.row_id], preview), week_reads=row.count))
+    return jsonify(items), 200
+
+
+# Подключение буфера счетчиков к приложению. Значения буфера записываются при штатном завершении процесса
+def init_reads(app):
+    app.extensions['darts_reads'] = ReadBuffer(app)
+    read_buffers.add(app.extensions['darts_reads'])
+
+
+# CLI команда для пересчета итогов прочтений за неделю
+@click.command('rollup-reads')
+def rollup_reads_command():
+    click.echo('Rolled up reads of %d elements' % rollup_reads())
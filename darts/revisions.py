@@ -0,0 +1,233 @@
+import re
+import json
+import difflib
+import datetime
+import click
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+
+from .extensions import db
+from .models import BlockContent, BlockRevision, Job
+from .jobs import job_handler
+from .compression import plain_text
+from .sharding import allocate_ids, shard_names, use_shard
+# История изменений текста контент блоков. При каждом изменении текста в таблицу BlockRevision добавляется ревизия
+# с разницей между новым и предыдущим текстом (список замененных фрагментов), а каждая REVISION_SNAPSHOT_INTERVAL-я
+# ревизия хранит полный текст (снимок), поэтому для восстановления любой версии применяется не больше
+# REVISION_SNAPSHOT_INTERVAL - 1 разниц. Ревизии записываются в той же транзакции, что и изменение текста: при
+# изменении через модели - обработчиком событий сессии, при изменении одним запросом (versioned_update) - явно.
+# Импорт записывает снимок текста каждого импортированного контент блока, а команда init-db - снимок текущего текста
+# каждого контент блока без ревизий (созданного до появления истории), поэтому первое изменение любого контент блока
+# можно отменить. Старые ревизии удаляются фоновой задачей и командой compact-revisions
+
+# Каждая ревизия с этим номером по порядку хранит полный текст
+REVISION_SNAPSHOT_INTERVAL = 10
+# Количество последних ревизий каждого контент блока, которые хранятся всегда
+REVISION_KEEP = 50
+# Ревизии старше этого количества дней удаляются, даже если их меньше REVISION_KEEP (последняя ревизия хранится
+# всегда)
+REVISION_MAX_AGE_DAYS = 180
+# Фрагменты текста для сравнения: пробелы, слова и отдельные знаки. Сравнение по словам работает быстрее
+# посимвольного и дает более короткую разницу
+TEXT_TOKENS = re.compile(r'\s+|\w+|[^\w\s]')
+
+
+# Разница между текстами: список замен [начало, конец, новый фрагмент], где начало и конец - позиции символов
+# в предыдущем тексте. Неизмененные части текста в разницу не входят
+def text_diff(old, new):
+    old_tokens = TEXT_TOKENS.findall(old)
+    new_tokens = TEXT_TOKENS.findall(new)
+    offsets = [0]
+    for token in old_tokens:
+        offsets.append(offsets[-1] + len(token))
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    return [[offsets[i1], offsets[i2], ''.join(new_tokens[j1:j2])]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+# Применение разницы к предыдущему тексту
+def apply_diff(old, diff):
+    parts = []
+    position = 0
+    for start, end, fragment in diff:
+        parts.append(old[position:start])
+        parts.append(fragment)
+        position = end
+    parts.append(old[position:])
+    return ''.join(parts)
+
+
+# Строка таблицы ревизий
+def revision_row(blockcontent_id, version, snapshot, data):
+    return {'blockcontent_id': blockcontent_id, 'version': version, 'snapshot': snapshot, 'data': data,
+            'created_at': datetime.datetime.now(datetime.timezone.utc)}
+
+
+# Запись ревизии новой версии текста. previous - версия и текст контент блока до изменения, если они известны.
+# Разница записывается, только если последняя ревизия относится именно к предыдущей версии (иначе между чтением
+# предыдущего текста и изменением текст изменил другой запрос) и разница короче текста
+def record_revision(connection, blockcontent_id, version, text, previous=None):
+    text = plain_text(text)
+    recent = connection.execute(select(BlockRevision.version, BlockRevision.snapshot)
+                                .where(BlockRevision.blockcontent_id == blockcontent_id)
+                                .order_by(BlockRevision.version.desc())
+                                .limit(REVISION_SNAPSHOT_INTERVAL)).all()
+    rows = []
+    # Снимок текста перед первым изменением контент блока без истории
+    if not recent and previous is not None and previous[1] is not None:
+        rows.append(revision_row(blockcontent_id, previous[0], True, plain_text(previous[1])))
+        recent = [(previous[0], True)]
+    data = None
+    if (previous is not None and recent and recent[0][0] == previous[0] == version - 1
+            and text is not None and previous[1] is not None):
+        # Количество разниц после последнего снимка
+        diffs = next((index for index, row in enumerate(recent) if row[1]), len(recent))
+        if diffs < REVISION_SNAPSHOT_INTERVAL - 1:
+            encoded = json.dumps(text_diff(plain_text(previous[1]), text), ensure_ascii=False,
+                                 separators=(',', ':'))
+            if len(encoded) < len(text):
+                data = encoded
+    snapshot = data is None
+    rows.append(revision_row(blockcontent_id, version, snapshot, text if snapshot else data))
+    connection.execute(insert(BlockRevision.__table__), rows)
+    # Проверка количества ревизий выполняется только при записи снимка, то есть раз в REVISION_SNAPSHOT_INTERVAL
+    # ревизий. Задача добавляется запросом в базу данных, тк запись может выполняться во время flush сессии
+    if snapshot and revision_count(connection, blockcontent_id) > REVISION_KEEP + REVISION_SNAPSHOT_INTERVAL:
+        values = {'kind': 'compact_revisions', 'payload': json.dumps({'blockcontent_id': blockcontent_id})}
+        ids = allocate_ids(Job.__table__, 1)
+        if ids is not None:
+            values['id'] = ids[0]
+        connection.execute(insert(Job.__table__).values(**values))
+
+
+# Количество ревизий контент блока
+def revision_count(connection, blockcontent_id):
+    return connection.execute(select(func.count()).select_from(BlockRevision)
+                              .where(BlockRevision.blockcontent_id == blockcontent_id)).scalar()
+
+
+# Запись ревизии после изменения текста одним запросом (versioned_update). changed - значения, которые вернул
+# запрос UPDATE. Строка перед изменением не читается, предыдущий текст восстанавливается из ревизий по версии,
+# которую заменил запрос. Если ревизии предыдущей версии нет (ревизии удалены), записывается снимок
+def record_update(connection, model, row_id, changed):
+    if model is BlockContent and 'text' in changed:
+        version = changed['version']
+        previous = (version - 1, revision_text(row_id, version - 1))
+        record_revision(connection, row_id, version, changed['text'], previous)
+
+
+# Текст ревизии контент блока: текст ближайшего предыдущего снимка с последовательно примененными разницами.
+# Функция возвращает None, если ревизии нет
+def revision_text(blockcontent_id, version):
+    snapshot_version = (select(func.max(BlockRevision.version))
+                        .where(BlockRevision.blockcontent_id == blockcontent_id, BlockRevision.snapshot.is_(True),
+                               BlockRevision.version <= version).scalar_subquery())
+    rows = db.session.execute(select(BlockRevision.version, BlockRevision.snapshot, BlockRevision.data)
+                              .where(BlockRevision.blockcontent_id == blockcontent_id,
+                                     BlockRevision.version >= snapshot_version, BlockRevision.version <= version)
+                              .order_by(BlockRevision.version)).all()
+    if not rows or rows[-1].version != version:
+        return None
+    text = plain_text(rows[0].data)
+    for row in rows[1:]:
+        text = apply_diff(text, json.loads(plain_text(row.data)))
+    return text
+
+
+# Список ревизий контент блока от новых к старым
+def list_revisions(blockcontent_id):
+    return db.session.execute(select(BlockRevision.version, BlockRevision.snapshot, BlockRevision.created_at,
+                                     func.length(BlockRevision.data).label('size'))
+                              .where(BlockRevision.blockcontent_id == blockcontent_id)
+                              .order_by(BlockRevision.version.desc())).all()
+
+
+# Удаление старых ревизий контент блока: остаются последние keep ревизий, из них удаляются ревизии старше max_age
+# дней, кроме последней. Самая старая оставшаяся ревизия превращается в снимок, тк ее разница относится к удаленной
+# ревизии. Функция возвращает количество удаленных ревизий
+def compact_block(blockcontent_id, keep=REVISION_KEEP, max_age_days=REVISION_MAX_AGE_DAYS):
+    rows = db.session.execute(select(BlockRevision.id, BlockRevision.version, BlockRevision.snapshot,
+                                     BlockRevision.created_at)
+                              .where(BlockRevision.blockcontent_id == blockcontent_id)
+                              .order_by(BlockRevision.version.desc())).all()
+    oldest = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=max_age_days)
+    kept = rows[:1] + [row for row in rows[1:keep] if aware(row.created_at) >= oldest]
+    removed = [row.id for row in rows if row not in kept]
+    if not removed:
+        return 0
+    first = kept[-1]
+    if not first.snapshot:
+        db.session.execute(update(BlockRevision).where(BlockRevision.id == first.id)
+                           .values(snapshot=True, data=revision_text(blockcontent_id, first.version)))
+    db.session.execute(delete(BlockRevision).where(BlockRevision.id.in_(removed)))
+    return len(removed)
+
+
+# Время из базы данных с часовым поясом. SQLite не хранит часовой пояс, все время в приложении записывается в UTC
+def aware(moment):
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=datetime.timezone.utc)
+
+
+# Фоновая задача удаления старых ревизий контент блока
+@job_handler('compact_revisions')
+def compact_revisions_job(blockcontent_id):
+    removed = compact_block(blockcontent_id)
+    db.session.commit()
+    return 'removed %d revisions' % removed
+
+
+# Удаление старых ревизий всех контент блоков и ревизий удаленных контент блоков. Функция возвращает количество
+# удаленных ревизий удаленных контент блоков и количество удаленных старых ревизий
+def compact_revisions(keep=REVISION_KEEP, max_age_days=REVISION_MAX_AGE_DAYS):
+    orphaned = db.session.execute(delete(BlockRevision).where(
+        BlockRevision.blockcontent_id.not_in(select(BlockContent.id)))).rowcount
+    db.session.commit()
+    removed = 0
+    oldest = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=max_age_days)
+    # Контент блоки, у которых больше keep ревизий либо есть ревизии старше max_age_days
+    candidates = db.session.execute(select(BlockRevision.blockcontent_id).group_by(BlockRevision.blockcontent_id)
+                                    .having((func.count() > keep) | (func.count() > 1)
+                                            & (func.min(BlockRevision.created_at) < oldest.replace(tzinfo=None))))
+    for blockcontent_id in candidates.scalars().all():
+        removed += compact_block(blockcontent_id, keep, max_age_days)
+        db.session.commit()
+    return orphaned, removed
+
+
+# Ревизии удаленных через модели контент блоков удаляются вместе с контент блоком
+@event.listens_for(db.session, 'before_flush')
+def remove_deleted_revisions(session, flush_context, instances):
+    ids = [obj.id for obj in session.deleted if isinstance(obj, BlockContent)]
+    if ids:
+        session.connection().execute(delete(BlockRevision).where(BlockRevision.blockcontent_id.in_(ids)))
+
+
+# Ревизии созданных и измененных через модели контент блоков. История атрибута text содержит предыдущий текст,
+# если он был загружен
+@event.listens_for(db.session, 'after_flush')
+def record_flushed_revisions(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, BlockContent):
+            record_revision(session.connection(), obj.id, obj.version, obj.text)
+    for obj in session.dirty:
+        if not isinstance(obj, BlockContent):
+            continue
+        history = inspect(obj).attrs.text.history
+        if not history.added:
+            continue
+        previous = (obj.version - 1, history.deleted[0]) if history.deleted else None
+        record_revision(session.connection(), obj.id, obj.version, obj.text, previous)
+
+
+# CLI команда для удаления старых ревизий контент блоков во всех шардах
+@click.command('compact-revisions')
+@click.option('--keep', type=int, default=REVISION_KEEP, help='Количество последних ревизий контент блока')
+@click.option('--max-age-days', type=int, default=REVISION_MAX_AGE_DAYS, help='Удалять ревизии старше этого '
+                                                                              'количества дней')
+def compact_revisions_command(keep, max_age_days):
+    orphaned = removed = 0
+    for shard in shard_names():
+        with use_shard(shard):
+            shard_orphaned, shard_removed = compact_revisions(keep, max_age_days)
+        orphaned += shard_orphaned
+        removed += shard_removed
+    click.echo('Removed %d revisions of deleted blocks and %d old revisions' % (orphaned, removed))
@@ -0,0 +1,177 @@
+from .variants import image_srcset
+from .compression import plain_text
+# Функции формирования JSON-текстов для React фронтальной части приложения. Функции принимают любые объекты с
+# нужными атрибутами: как объекты моделей SQLAlchemy, так и строки результатов запросов, поэтому используются
+# и синхронными обработчиками blueprints, и асинхронным API для чтения
+
+# Адрес сервера, который добавляется к ссылкам на изображения
+HOST = 'http://127.0.0.1:5000'
+# Счетчики дочерних элементов, которые передаются вместе с данными мира и лонгрида
+WORLD_COUNTERS = ('longread_count', 'chapter_count', 'blockcontent_count', 'worldobj_count')
+LONGREAD_COUNTERS = ('chapter_count', 'blockcontent_count')
+
+
+# Адрес изображения для фронтальной части приложения. Адрес сервера добавляется только к ссылкам на файлы этого
+# сервера, ссылки на внешнее хранилище (S3) уже содержат полный адрес
+def image_url(img_link):
+    return HOST + img_link if img_link.startswith('/') else img_link
+
+
+# Проверка параметра preview запроса. В режиме превью списки содержат сокращенный текст (поля description_preview
+# и text_preview) вместо полного, а полный текст не загружается из базы данных
+def preview_requested(args):
+    return args.get('preview', '0').lower() not in ('0', 'false', '')
+
+
+# Полный текст поля либо его превью в зависимости от режима
+def text_field(data, item, name, preview):
+    if preview:
+        data[name + '_preview'] = getattr(item, name + '_preview')
+    else:
+        # Сжатый текст распаковывается здесь, при формировании JSON-текста
+        data[name] = plain_text(getattr(item, name))
+    return data
+
+
+# Счетчики дочерних элементов мира и лонгрида, которые хранятся в их строках
+def counter_fields(data, item, names):
+    for name in names:
+        data[name] = getattr(item, name)
+    return data
+
+
+# JSON-текст с данными мира для индексных страниц
+def world_index_data(world, preview=False):
+    return text_field(counter_fields({'id': world.id,
+                                      'name': world.name,
+                                      'img_link': image_url(world.img_link),
+                                      'img_srcset': image_srcset(world.img_link, world.version, HOST),
+                                      'version': world.version}, world, WORLD_COUNTERS),
+                      world, 'description', preview)
+
+
+# JSON-текст с данными лонгрида для страницы со всеми лонгридами
+def longread_index_data(longread, preview=False):
+    return text_field(counter_fields({'id': longread.id,
+                                      'name': longread.name,
+                                      'img_link': image_url(longread.img_link),
+                                      'img_srcset': image_srcset(longread.img_link, longread.version, HOST),
+                                      'version': longread.version}, longread, LONGREAD_COUNTERS),
+                      longread, 'description', preview)
+
+
+# JSON-текст с данными лонгрида в списке лонгридов мира
+def longread_item_data(longread, preview=False):
+    return text_field(counter_fields({'id': longread.id,
+                                      'world_id': longread.world_id,
+                                      'name': longread.name,
+                                      'img_link': image_url(longread.img_link),
+                                      'img_srcset': image_srcset(longread.img_link, longread.version, HOST),
+                                      'version': longread.version}, longread, LONGREAD_COUNTERS),
+                      longread, 'description', preview)
+
+
+# JSON-текст с данными объекта мира в списке объектов мира
+def worldobj_item_data(worldobj, preview=False):
+    return text_field({'id': worldobj.id,
+                       'world_id': worldobj.world_id,
+                       'img_link': image_url(worldobj.img_link),
+                       'img_srcset': image_srcset(worldobj.img_link, worldobj.version, HOST),
+                       'version': worldobj.version}, worldobj, 'description', preview)
+
+
+# JSON-текст с данными главы в списке глав лонгрида. У глав нет полей с текстом, поэтому режим превью не влияет
+# на данные
+def chapter_item_data(chapter, preview=False):
+    return {'id': chapter.id,
+            'name': chapter.name,
+            'longread_id': chapter.longread_id,
+            'version': chapter.version}
+
+
+# JSON-текст с данными контент блока в списке контент блоков главы
+def blockcontent_item_data(blockcontent, preview=False):
+    return text_field({'id': blockcontent.id,
+                       'longread_id': blockcontent.longread_id,
+                       'chapter_id': blockcontent.chapter_id,
+                       'img_link': image_url(blockcontent.img_link),
+                       'img_srcset': image_srcset(blockcontent.img_link, blockcontent.version, HOST),
+                       'version': blockcontent.version}, blockcontent, 'text', preview)
+
+
+# JSON-текст с данными мира, связанных с ним лонгридов и объектов мира. В режиме превью для лонгридов и объектов
+# мира передается превью описания
+def world_detail_data(world, longreads, worldobjs, preview=False):
+    # Формирование JSON-текста с данными о лонгридах и объектах мира связанных с миром
+    longreads_data = [longread_item_data(longread, preview) for longread in longreads]
+    worldobjs_data = [worldobj_item_data(worldobj, preview) for worldobj in worldobjs]
+    # Формирование JSON-текста с данными мира, лонгридами и объектами мира
+    return counter_fields({
+        'id': world.id,
+        'version': world.version,
+        'name': world.name,
+        'description': plain_text(world.description),
+        'img_link': image_url(world.img_link),
+        'img_srcset': image_srcset(world.img_link, world.version, HOST),
+        'longreads': longreads_data,
+        'worldobjs': worldobjs_data
+    }, world, WORLD_COUNTERS)
+
+
+# JSON-текст с данными лонгрида и связанных с ним глав
+def longread_detail_data(longread, chapters):
+    # Формирование JSON-текста с данными о главах связанных с лонгридом
+    chapter_data = [chapter_item_data(chapter) for chapter in chapters]
+    # Формирование JSON-текста с данными лонгрида и главами
+    return counter_fields({
+        'id': longread.id,
+        'version': longread.version,
+        'name': longread.name,
+        'description': longread.description,
+        'img_link': image_url(longread.img_link),
+        'img_srcset': image_srcset(longread.img_link, longread.version, HOST),
+        'chapters': chapter_data
+    }, longread, LONGREAD_COUNTERS)
+
+
+# JSON-текст с данными главы и связанных с ней контент блоков. В режиме превью для контент блоков передается
+# превью текста
+def chapter_detail_data(chapter, blockcontents, preview=False):
+    # Формирование JSON-текста с данными о контент блоках связанных с главой
+    blockcontents_data = [blockcontent_item_data(blockcontent, preview) for blockcontent in blockcontents]
+    # Формирование JSON-текста с данными главы и контент блоками
+    return {
+        'id': chapter.id,
+        'version': chapter.version,
+        'name': chapter.name,
+        'longread_id': chapter.longread_id,
+        'blockcontents': blockcontents_data
+    }
+
+
+# JSON-текст с данными записи журнала изменений
+def change_data(change):
+    return {
+        'id': change.id,
+        'type': change.type,
+        'entity_id': change.entity_id,
+        'action': change.action,
+        'world_id': change.world_id,
+        'longread_id': change.longread_id,
+        'created': change.created.isoformat()
+    }
+
+
+# JSON-текст с данными фоновой задачи
+def job_data(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': job.error,
+        'created': job.created.isoformat(),
+        'updated': job.updated.isoformat()
+    }
@@ -0,0 +1,422 @@
+import os
+import threading
+import collections
+import contextlib
+import click
+from flask import current_app, g, request, jsonify
+from sqlalchemy import delete, event, func, insert, select, update
+
+from .extensions import db, MAIN_SHARD
+from .models import (World, LongRead, Chapter, BlockContent, WorldObj, Job, ImportJob, BlockRevision, ChangeLog,
+                     WorldShard, ShardSequence, blockcontents)
+from .changes import scope_query
+# Шарды миров. Каждый мир вместе с лонгридами, главами, контент блоками, объектами мира, их связями, ревизиями,
+# журналом изменений и фоновыми задачами находится в одной базе данных (шарде), поэтому запись в один мир не
+# блокирует запись в миры других шардов. Шарды перечисляются в настройке SHARDS (имя шарда - адрес базы данных),
+# основная база данных (SQLALCHEMY_DATABASE_URI) - шард main, в котором находятся миры, созданные до включения шардов.
+# Шард мира хранится в каталоге (таблица WorldShard основной базы данных). Шард запроса выбирается до вызова
+# обработчика по идентификатору из адреса: мир - по каталогу, остальные элементы - по миру, к которому они относятся,
+# поэтому обработчики работают с db.session как с одной базой данных. Идентификаторы элементов при включенных шардах
+# выдает приложение: шард с номером N выдает только идентификаторы с остатком N от деления на SHARD_ID_STRIDE,
+# поэтому идентификаторы не повторяются в разных шардах и миры можно переносить между шардами без изменения
+# идентификаторов. Списки миров и лонгридов собираются из всех шардов. Миры переносятся командой move-world,
+# распределяются по шардам командой rebalance-shards
+
+# Максимальное количество шардов. Остаток от деления идентификатора на это число - номер шарда, который его выдал
+SHARD_ID_STRIDE = 64
+# Модели, идентификаторы которых выдает приложение: элементы миров и задачи, на которые ссылаются адреса
+ALLOCATED_MODELS = (World, LongRead, Chapter, BlockContent, WorldObj, Job, ImportJob)
+# Параметры адреса, по которым выбирается шард, в порядке проверки
+ROUTE_VIEW_ARGS = (('world_id', World), ('longread_id', LongRead), ('chapter_id', Chapter),
+                   ('blockcontent_id', BlockContent), ('worldobj_id', WorldObj), ('job_id', Job))
+# Параметры строки запроса, по которым выбирается шард (журнал изменений, продолжение импорта)
+ROUTE_QUERY_ARGS = (('world_id', World), ('longread_id', LongRead), ('resume', ImportJob))
+# Обработчики, создающие новый мир. Мир создается в шарде с наименьшим количеством миров
+PLACEMENT_ENDPOINTS = ('worlds.api_world_create', 'worlds.world_create', 'worlds.api_world_import')
+# Количество элементов, для которых запоминается мир, к которому они относятся
+SHARD_CACHE_SIZE = 100000
+# Количество строк, которое переносится между шардами за один раз
+MOVE_BATCH_SIZE = 1000
+# Время в секундах, через которое клиенту предлагается повторить изменение мира, который переносится в другой шард
+MOVE_RETRY_AFTER = 30
+
+
+# Шарды приложения и кэш миров элементов
+class ShardRouting:
+    def __init__(self, shards):
+        self.shards = [MAIN_SHARD] + list(shards)
+        self.worlds = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    # Мир элемента из кэша
+    def cached_world(self, key):
+        with self.lock:
+            if key in self.worlds:
+                self.worlds.move_to_end(key)
+            return self.worlds.get(key)
+
+    def remember_world(self, key, world_id):
+        with self.lock:
+            self.worlds[key] = world_id
+            if len(self.worlds) > SHARD_CACHE_SIZE:
+                self.worlds.popitem(last=False)
+
+
+# Подключения к базам данных шардов в формате SQLALCHEMY_BINDS
+def shard_binds(shards):
+    if MAIN_SHARD in shards:
+        raise ValueError('Shard name %r is reserved for the main database' % MAIN_SHARD)
+    if len(shards) >= SHARD_ID_STRIDE:
+        raise ValueError('At most %d shards are supported' % (SHARD_ID_STRIDE - 1))
+    return {'shard:' + name: uri for name, uri in shards.items()}
+
+
+def routing():
+    return current_app.extensions['darts_sharding']
+
+
+def sharding_enabled():
+    return len(routing().shards) > 1
+
+
+# Имена всех шардов, основная база данных первая. Номер шарда - позиция в списке, поэтому новые шарды добавляются
+# в конец настройки SHARDS
+def shard_names():
+    return routing().shards
+
+
+# Подключение к базе данных шарда
+def shard_engine(name):
+    return db.engines[None] if name == MAIN_SHARD else db.engines['shard:' + name]
+
+
+# Шард, в котором выполняются запросы сессии
+def current_shard():
+    return g.get('shard') or current_app.config.get('SHARD') or MAIN_SHARD
+
+
+# Выполнение запросов сессии в указанном шарде внутри блока with
+@contextlib.contextmanager
+def use_shard(name):
+    previous = g.get('shard')
+    g.shard = name
+    try:
+        yield name
+    finally:
+        g.shard = previous
+
+
+# Шарды в порядке поиска элемента: первым проверяется шард, который выдал идентификатор
+def probe_order(row_id, names=None):
+    names = names or shard_names()
+    origin = names[row_id % SHARD_ID_STRIDE] if row_id % SHARD_ID_STRIDE < len(names) else MAIN_SHARD
+    return [origin] + [name for name in names if name != origin]
+
+
+# Шард мира по каталогу и признак переноса мира
+def world_shard(world_id):
+    row = db.session.execute(select(WorldShard.shard, WorldShard.moving).where(WorldShard.world_id == world_id)).first()
+    return (row.shard, row.moving) if row is not None else (MAIN_SHARD, False)
+
+
+# Шарды всех миров, которые есть в каталоге
+def world_placement():
+    return dict(db.session.execute(select(WorldShard.world_id, WorldShard.shard)).all())
+
+
+# Мир, к которому относится элемент. Элемент ищется во всех шардах, найденный мир запоминается, тк элементы не
+# переходят в другие миры. Функция возвращает None, если элемента нет
+def find_world(model, row_id):
+    if model is World:
+        return row_id
+    key = (model.__tablename__, row_id)
+    world_id = routing().cached_world(key)
+    if world_id is not None:
+        return world_id
+    for name in probe_order(row_id):
+        with use_shard(name):
+            row = db.session.execute(scope_query(model).where(model.__table__.c.id == row_id)).first()
+        if row is not None:
+            routing().remember_world(key, row[0])
+            return row[0]
+    return None
+
+
+# Шард задачи. Задачи не переносятся между шардами, поэтому шард определяется поиском идентификатора
+def find_row_shard(model, row_id):
+    for name in probe_order(row_id):
+        with use_shard(name):
+            if db.session.get(model, row_id) is not None:
+                return name
+    return None
+
+
+# Элемент, по которому выбирается шард запроса: модель и идентификатор из адреса или строки запроса
+def route_key():
+    view_args = request.view_args or {}
+    for name, model in ROUTE_VIEW_ARGS:
+        if name in view_args:
+            # Идентификатор задачи в адресах миров - идентификатор задачи импорта
+            if name == 'job_id' and request.endpoint.startswith('worlds.'):
+                model = ImportJob
+            return model, view_args[name]
+    for name, model in ROUTE_QUERY_ARGS:
+        value = request.args.get(name, type=int)
+        if value is not None:
+            return model, value
+    return None
+
+
+# Шард для нового мира: шард с наименьшим количеством миров
+def placement_shard():
+    counts = {}
+    for name in shard_names():
+        with use_shard(name):
+            counts[name] = db.session.execute(select(func.count()).select_from(World)).scalar()
+    return min(shard_names(), key=lambda name: counts[name])
+
+
+# Выбор шарда перед вызовом обработчика запроса. Изменения мира, который переносится в другой шард, отклоняются
+# ответом 503, чтобы они не потерялись при переносе
+def resolve_shard():
+    if not sharding_enabled() or request.endpoint is None:
+        return None
+    key = route_key()
+    if key is None:
+        if request.endpoint in PLACEMENT_ENDPOINTS and request.method == 'POST':
+            g.shard = placement_shard()
+        return None
+    model, row_id = key
+    if model in (Job, ImportJob):
+        g.shard = find_row_shard(model, row_id) or MAIN_SHARD
+        return None
+    return route_element(model, row_id)
+
+
+# Выбор шарда мира, к которому относится элемент. Используется перед вызовом обработчика и в обработчиках, которые
+# получают идентификатор элемента в JSON-тексте запроса. Функция возвращает ответ 503, если изменяется мир, который
+# переносится в другой шард
+def route_element(model, row_id):
+    if not sharding_enabled():
+        return None
+    world_id = find_world(model, row_id)
+    # Элемента нет ни в одном шарде, обработчик отошлет ответ 404
+    if world_id is None:
+        return None
+    shard, moving = world_shard(world_id)
+    if moving and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return jsonify({'message': 'World is being moved to another shard'}), 503, {'Retry-After': MOVE_RETRY_AFTER}
+    g.shard = shard
+    return None
+
+
+# Выдача идентификаторов для новых строк таблицы в текущем шарде. Последний выданный идентификатор хранится в
+# таблице ShardSequence шарда и изменяется в той же транзакции, что и вставка строк. Первый идентификатор шарда
+# больше всех существующих идентификаторов таблицы во всех шардах. Для новых миров шарда добавляются строки каталога.
+# При выключенных шардах функция возвращает None и идентификаторы выдает база данных
+def allocate_ids(table, count):
+    if not sharding_enabled():
+        return None
+    shard = current_shard()
+    slot = shard_names().index(shard)
+    last_id = db.session.execute(update(ShardSequence).where(ShardSequence.name == table.name)
+                                 .values(last_id=ShardSequence.last_id + count * SHARD_ID_STRIDE)
+                                 .returning(ShardSequence.last_id)).scalar()
+    if last_id is None:
+        base = 0
+        for name in shard_names():
+            with use_shard(name):
+                base = max(base, db.session.execute(select(func.max(table.c.id))).scalar() or 0)
+        # Наименьший идентификатор больше base с остатком, равным номеру шарда
+        first_id = base + 1 + (slot - base - 1) % SHARD_ID_STRIDE
+        last_id = first_id + (count - 1) * SHARD_ID_STRIDE
+        db.session.execute(insert(ShardSequence).values(name=table.name, last_id=last_id))
+    ids = [last_id - (count - 1 - index) * SHARD_ID_STRIDE for index in range(count)]
+    if table is World.__table__ and shard != MAIN_SHARD:
+        db.session.execute(insert(WorldShard), [{'world_id': world_id, 'shard': shard, 'moving': False}
+                                                for world_id in ids])
+    return ids
+
+
+# Идентификаторы для элементов, созданных через модели
+@event.listens_for(db.session, 'before_flush')
+def assign_ids(session, flush_context, instances):
+    new = collections.defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, ALLOCATED_MODELS) and obj.id is None:
+            new[type(obj)].append(obj)
+    for model, objects in new.items():
+        ids = allocate_ids(model.__table__, len(objects))
+        if ids is None:
+            return
+        for obj, row_id in zip(objects, ids):
+            obj.id = row_id
+
+
+# Выполнение запроса во всех шардах. Строки объединяются в порядке идентификаторов. world_attr - атрибут с
+# идентификатором мира строки: строки мира, который переносится, берутся только из шарда мира по каталогу
+def across_shards(query, world_attr=None):
+    if not sharding_enabled():
+        return query.all()
+    placement = world_placement() if world_attr is not None else {}
+    rows = []
+    for name in shard_names():
+        with use_shard(name):
+            rows.extend(row for row in query.all()
+                        if world_attr is None or placement.get(getattr(row, world_attr), MAIN_SHARD) == name)
+    return sorted(rows, key=lambda row: row.id)
+
+
+# Идентификаторы элементов, сгруппированные по шардам. Отсутствующие элементы относятся к основной базе данных
+def group_by_shard(model, ids):
+    if not sharding_enabled():
+        return {MAIN_SHARD: ids}
+    groups = collections.defaultdict(list)
+    shards = {}
+    for row_id in ids:
+        world_id = find_world(model, row_id)
+        if world_id is not None and world_id not in shards:
+            shards[world_id] = world_shard(world_id)[0]
+        groups[shards.get(world_id, MAIN_SHARD)].append(row_id)
+    return groups
+
+
+# Таблицы мира в порядке переноса (от родительских элементов к дочерним): таблица, условие выбора строк мира и
+# признак сохранения идентификаторов. Ревизии и журнал изменений получают новые идентификаторы в шарде назначения
+def world_tables(world_id):
+    longread_ids = select(LongRead.id).where(LongRead.world_id == world_id)
+    blockcontent_ids = select(BlockContent.id).where(BlockContent.longread_id.in_(longread_ids))
+    return [(World.__table__, World.id == world_id, True),
+            (LongRead.__table__, LongRead.world_id == world_id, True),
+            (Chapter.__table__, Chapter.longread_id.in_(longread_ids), True),
+            (WorldObj.__table__, WorldObj.world_id == world_id, True),
+            (BlockContent.__table__, BlockContent.longread_id.in_(longread_ids), True),
+            (blockcontents, blockcontents.c.blockcontent_id.in_(blockcontent_ids), True),
+            (BlockRevision.__table__, BlockRevision.blockcontent_id.in_(blockcontent_ids), False),
+            (ChangeLog.__table__, ChangeLog.world_id == world_id, False)]
+
+
+# Удаление строк мира из базы данных шарда (от дочерних элементов к родительским). Журнал изменений и счетчики не
+# изменяются: строки остаются в другом шарде
+def remove_world_rows(connection, world_id):
+    for table, condition, keep_ids in reversed(world_tables(world_id)):
+        connection.execute(delete(table).where(condition))
+
+
+# Изменение строки каталога мира
+def set_world_shard(world_id, shard, moving):
+    updated = db.session.execute(update(WorldShard).where(WorldShard.world_id == world_id)
+                                 .values(shard=shard, moving=moving)).rowcount
+    if not updated:
+        db.session.execute(insert(WorldShard).values(world_id=world_id, shard=shard, moving=moving))
+    db.session.commit()
+
+
+# Перенос мира в другой шард. Во время переноса мир можно читать из прежнего шарда, изменения отклоняются. Строки
+# копируются в шард назначения одной транзакцией, затем каталог переключается на новый шард и строки удаляются из
+# прежнего шарда. Если перенос был прерван, повторный перенос удаляет скопированные строки и начинает заново.
+# Функция возвращает количество перенесенных строк
+def move_world(world_id, target):
+    if target not in shard_names():
+        raise ValueError('Unknown shard %r' % target)
+    source = world_shard(world_id)[0]
+    if source == target:
+        return 0
+    with use_shard(source):
+        if db.session.get(World, world_id) is None:
+            raise LookupError('World %d not found in shard %s' % (world_id, source))
+    db.session.rollback()
+    set_world_shard(world_id, source, True)
+    moved = 0
+    try:
+        with shard_engine(source).connect() as source_connection, shard_engine(target).begin() as connection:
+            remove_world_rows(connection, world_id)
+            for table, condition, keep_ids in world_tables(world_id):
+                columns = [column for column in table.columns if keep_ids or column.name != 'id']
+                result = source_connection.execution_options(stream_results=True, yield_per=MOVE_BATCH_SIZE).execute(
+                    select(*columns).where(condition))
+                for rows in result.partitions():
+                    connection.execute(insert(table), [dict(row._mapping) for row in rows])
+                    moved += len(rows)
+    except BaseException:
+        set_world_shard(world_id, source, False)
+        raise
+    set_world_shard(world_id, target, False)
+    with shard_engine(source).begin() as connection:
+        remove_world_rows(connection, world_id)
+    return moved
+
+
+# Нагрузка шарда по мирам: количество контент блоков мира плюс один. Учитываются только миры, которые находятся в
+# шарде по каталогу
+def shard_worlds():
+    placement = world_placement()
+    worlds = {}
+    for name in shard_names():
+        with use_shard(name):
+            rows = db.session.execute(select(World.id, World.blockcontent_count)).all()
+        worlds[name] = {row.id: row.blockcontent_count + 1 for row in rows
+                        if placement.get(row.id, MAIN_SHARD) == name}
+    return worlds
+
+
+# План переносов для выравнивания нагрузки шардов: пока перенос мира из самого нагруженного шарда в наименее
+# нагруженный уменьшает разницу их нагрузки, переносится самый большой такой мир
+def rebalance_plan(worlds, max_moves):
+    worlds = {name: dict(shard) for name, shard in worlds.items()}
+    moves = []
+    while len(moves) < max_moves:
+        loads = {name: sum(shard.values()) for name, shard in worlds.items()}
+        heaviest = max(loads, key=loads.get)
+        lightest = min(loads, key=loads.get)
+        difference = loads[heaviest] - loads[lightest]
+        candidates = [world_id for world_id, weight in worlds[heaviest].items() if weight < difference]
+        if not candidates:
+            break
+        world_id = max(candidates, key=lambda world_id: worlds[heaviest][world_id])
+        worlds[lightest][world_id] = worlds[heaviest].pop(world_id)
+        moves.append((world_id, heaviest, lightest))
+    return moves
+
+
+# Подключение шардов к приложению: выбор шарда перед каждым запросом
+def init_sharding(app):
+    app.extensions['darts_sharding'] = ShardRouting(app.config.get('SHARDS') or {})
+    app.before_request(resolve_shard)
+
+
+# CLI команда для просмотра шардов: количество миров и контент блоков и размер файла базы данных
+@click.command('shard-status')
+def shard_status_command():
+    for name, worlds in shard_worlds().items():
+        path = shard_engine(name).url.database
+        size = os.path.getsize(path) if path and os.path.exists(path) else None
+        click.echo('%-12s %6d worlds %9d blocks %12s bytes' % (name, len(worlds), sum(worlds.values()) - len(worlds),
+                                                              size if size is not None else '-'))
+
+
+# CLI команда для переноса мира в другой шард
+@click.command('move-world')
+@click.argument('world_id', type=int)
+@click.argument('shard')
+def move_world_command(world_id, shard):
+    try:
+        moved = move_world(world_id, shard)
+    except (ValueError, LookupError) as error:
+        raise click.ClickException(str(error))
+    click.echo('World %d: %d rows moved to %s' % (world_id, moved, shard))
+
+
+# CLI команда для распределения миров по шардам
+@click.command('rebalance-shards')
+@click.option('--max-moves', type=int, default=10, help='Максимальное количество переносимых миров')
+@click.option('--dry-run', is_flag=True, help='Только показать план переносов')
+def rebalance_shards_command(max_moves, dry_run):
+    moves = rebalance_plan(shard_worlds(), max_moves)
+    if not moves:
+        click.echo('Shards are balanced')
+    for world_id, source, target in moves:
+        if dry_run:
+            click.echo('World %d: %s -> %s' % (world_id, source, target))
+            continue
+        click.echo('World %d: %d rows moved from %s to %s' % (world_id, move_world(world_id, target), source, target))
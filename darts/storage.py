@@ -0,0 +1,214 @@
+import os
+import shutil
+from flask import current_app, url_for
+from itsdangerous import URLSafeTimedSerializer
+# Хранилище файлов изображений. Обработчики не работают с папкой UPLOAD_FOLDER напрямую, а сохраняют, читают и
+# удаляют изображения по имени через хранилище, которое выбирается конфигурацией STORAGE_BACKEND:
+# filesystem - папка на диске сервера (по умолчанию), s3 - бакет S3-совместимого хранилища (AWS S3, MinIO, moto),
+# общий для всех серверов приложения. В поле img_link элемента хранится ссылка, по которой изображение отдается
+# браузеру, имя изображения в хранилище получается из ссылки. Оба хранилища поддерживают прямую загрузку: клиент
+# получает подписанную ссылку и загружает изображение по ней, не передавая файл через обработчики Flask
+
+# Время в секундах, в течение которого действительна подписанная ссылка для загрузки изображения
+UPLOAD_URL_EXPIRES = 600
+# Папка с миниатюрами изображений внутри хранилища
+THUMBS_PREFIX = 'thumbs/'
+
+
+# Имя миниатюры изображения в хранилище
+def thumbnail_name(name):
+    return THUMBS_PREFIX + name
+
+
+# Проверка имени изображения: имя не должно выходить за пределы хранилища
+def valid_name(name):
+    return bool(name) and not name.startswith('/') and '..' not in name.split('/') and '\\' not in name
+
+
+# Хранилище изображений в папке на диске сервера. Ссылка на изображение - путь к файлу от корня сайта
+class FileSystemStorage:
+    def __init__(self, folder, secret_key):
+        self.folder = folder
+        self.serializer = URLSafeTimedSerializer(secret_key, salt='image-upload')
+
+    # Путь к файлу изображения
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    # Ссылка на изображение для поля img_link
+    def link(self, name):
+        return '/' + self.path(name)
+
+    # Имя изображения по ссылке. Для ссылок на файлы вне хранилища функция возвращает None
+    def name(self, img_link):
+        prefix = '/' + self.folder.rstrip('/') + '/'
+        if not img_link or not img_link.startswith(prefix):
+            return None
+        name = img_link[len(prefix):]
+        return name if valid_name(name) else None
+
+    # Сохранение изображения из файлового объекта
+    def save(self, name, stream, content_type=None):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as target:
+            shutil.copyfileobj(stream, target)
+
+    # Открытие изображения для чтения, если изображения нет функция возвращает None
+    def open(self, name):
+        try:
+            return open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return None
+
+    # Удаление изображения. Отсутствующее изображение пропускается, функция возвращает True, если файл был удален
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Размер изображения в байтах, если изображения нет функция возвращает None
+    def size(self, name):
+        try:
+            return os.path.getsize(self.path(name))
+        except OSError:
+            return None
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    # Перечисление изображений и миниатюр хранилища потоком: имя, размер и время изменения каждого файла
+    def list(self):
+        for prefix in ('', THUMBS_PREFIX):
+            folder = self.path(prefix)
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        yield prefix + entry.name, stat.st_size, stat.st_mtime
+
+    # Подписанная ссылка для прямой загрузки изображения запросом PUT. Загрузку принимает обработчик
+    # images.api_direct_upload, который только записывает тело запроса в файл
+    def upload_url(self, name, content_type, expires=UPLOAD_URL_EXPIRES):
+        token = self.serializer.dumps({'name': name, 'content_type': content_type})
+        return {'url': url_for('images.api_direct_upload', token=token, _external=True),
+                'method': 'PUT',
+                'headers': {'Content-Type': content_type},
+                'expires': expires}
+
+    # Проверка подписанной ссылки, функция возвращает имя изображения и тип содержимого либо вызывает исключение
+    # itsdangerous.BadData
+    def verify_upload(self, token, expires=UPLOAD_URL_EXPIRES):
+        data = self.serializer.loads(token, max_age=expires)
+        return data['name'], data['content_type']
+
+
+# Хранилище изображений в бакете S3-совместимого хранилища. Ссылка на изображение - адрес объекта в бакете
+# (S3_PUBLIC_URL), который браузер загружает напрямую из хранилища или через CDN. Для работы нужна библиотека boto3
+class S3Storage:
+    def __init__(self, bucket, prefix='', endpoint_url=None, public_url=None, region=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('STORAGE_BACKEND = "s3" requires the boto3 package (pip install boto3)')
+        from botocore.exceptions import ClientError
+        self.client_error = ClientError
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        # По умолчанию объекты отдаются по адресу бакета в хранилище
+        if public_url is None:
+            public_url = ('%s/%s' % (endpoint_url.rstrip('/'), bucket) if endpoint_url
+                          else 'https://%s.s3.amazonaws.com' % bucket)
+        self.public_url = public_url.rstrip('/')
+
+    # Ключ объекта в бакете
+    def key(self, name):
+        return self.prefix + name
+
+    def link(self, name):
+        return '%s/%s' % (self.public_url, self.key(name))
+
+    def name(self, img_link):
+        prefix = '%s/%s' % (self.public_url, self.prefix)
+        if not img_link or not img_link.startswith(prefix):
+            return None
+        name = img_link[len(prefix):]
+        return name if valid_name(name) else None
+
+    # Проверка, что ошибка запроса означает отсутствие объекта
+    def not_found(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def save(self, name, stream, content_type=None):
+        extra = {'ContentType': content_type} if content_type else {}
+        self.client.upload_fileobj(stream, self.bucket, self.key(name), ExtraArgs=extra)
+
+    def open(self, name):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key(name))['Body']
+        except self.client_error as error:
+            if self.not_found(error):
+                return None
+            raise
+
+    # Удаление объекта. Запрос DeleteObject не сообщает, был ли объект, поэтому наличие проверяется отдельно
+    def delete(self, name):
+        if not self.exists(name):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+        return True
+
+    def size(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key(name))['ContentLength']
+        except self.client_error as error:
+            if self.not_found(error):
+                return None
+            raise
+
+    def exists(self, name):
+        return self.size(name) is not None
+
+    # Перечисление объектов постранично (по 1000 объектов на запрос)
+    def list(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(self.prefix):], item['Size'], item['LastModified'].timestamp()
+
+    # Подписанная ссылка S3 для прямой загрузки объекта запросом PUT. Тип содержимого входит в подпись, поэтому
+    # клиент должен передать тот же заголовок Content-Type
+    def upload_url(self, name, content_type, expires=UPLOAD_URL_EXPIRES):
+        url = self.client.generate_presigned_url('put_object', ExpiresIn=expires, Params={
+            'Bucket': self.bucket, 'Key': self.key(name), 'ContentType': content_type})
+        return {'url': url,
+                'method': 'PUT',
+                'headers': {'Content-Type': content_type},
+                'expires': expires}
+
+
+# Создание хранилища по конфигурации приложения. Хранилище создается один раз и хранится в расширениях приложения
+def init_storage(app):
+    backend = app.config.get('STORAGE_BACKEND', 'filesystem')
+    if backend == 'filesystem':
+        storage = FileSystemStorage(app.config['UPLOAD_FOLDER'], app.secret_key)
+    elif backend == 's3':
+        storage = S3Storage(app.config['S3_BUCKET'],
+                            prefix=app.config.get('S3_PREFIX', ''),
+                            endpoint_url=app.config.get('S3_ENDPOINT_URL'),
+                            public_url=app.config.get('S3_PUBLIC_URL'),
+                            region=app.config.get('S3_REGION'))
+    else:
+        raise RuntimeError('Unknown STORAGE_BACKEND %r' % backend)
+    app.extensions['darts_storage'] = storage
+    return storage
+
+
+# Хранилище текущего приложения
+def get_storage():
+    return current_app.extensions['darts_storage']
@@ -0,0 +1,148 @@
+import io
+import os
+import posixpath
+import tempfile
+from urllib.parse import urlsplit
+from flask import Blueprint, current_app, request, redirect, send_file, abort
+
+from .models import DEFAULT_IMAGES
+from .storage import get_storage, valid_name
+# Адаптивная отдача изображений. Для каждого изображения по запросу создаются уменьшенные копии нескольких ширин
+# в формате AVIF или WebP, если браузер указал поддержку формата в заголовке Accept, иначе в JPEG. Готовые копии
+# хранятся в папке на диске (VARIANT_CACHE_FOLDER) и создаются только при первом запросе. Шаблоны и JSON-тексты
+# содержат атрибут srcset со ссылками на копии всех ширин, по которому браузер выбирает копию под размер экрана
+
+# Ширины уменьшенных копий изображений. Другие ширины не создаются, чтобы размер папки с копиями был ограничен
+VARIANT_WIDTHS = (320, 640, 1280)
+# Форматы копий в порядке предпочтения: тип содержимого, формат Pillow, расширение файла и параметры сохранения
+VARIANT_FORMATS = (
+    ('image/avif', 'AVIF', 'avif', {'quality': 50}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+)
+# Формат копий для браузеров, которые не поддерживают AVIF и WebP
+FALLBACK_FORMAT = ('image/jpeg', 'JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True})
+# Время кэширования копий браузером в секундах. Ссылки в srcset содержат версию элемента, поэтому после замены
+# изображения браузер запрашивает копию по новой ссылке
+VARIANT_MAX_AGE = 7 * 24 * 3600
+
+bp = Blueprint('variants', __name__)
+
+
+# Имя изображения по ссылке img_link: последняя часть пути. Все изображения хранятся без вложенных папок, поэтому
+# имя однозначно определяет изображение и в папке на диске, и в хранилище S3
+def image_name(img_link):
+    return posixpath.basename(urlsplit(img_link).path)
+
+
+# Значение атрибута srcset для изображения: ссылки на копии всех ширин. Адрес сервера host добавляется для
+# JSON-текстов React фронтальной части приложения, шаблоны используют ссылки от корня сайта
+def image_srcset(img_link, version=None, host=''):
+    if not img_link:
+        return ''
+    name = image_name(img_link)
+    query = '?v=%d' % version if version is not None else ''
+    return ', '.join('%s/images/%d/%s%s %dw' % (host, width, name, query, width) for width in VARIANT_WIDTHS)
+
+
+# Фильтр шаблонов: {{ world|srcset }}
+@bp.app_template_filter('srcset')
+def srcset_filter(element):
+    return image_srcset(element.img_link, element.version)
+
+
+# Папка с копиями изображений. По умолчанию копии хранятся в папке instance приложения
+def cache_folder():
+    return current_app.config.get('VARIANT_CACHE_FOLDER') or os.path.join(current_app.instance_path, 'variants')
+
+
+# Путь к копии изображения в папке с копиями
+def variant_path(width, name, extension):
+    return os.path.join(cache_folder(), str(width), '%s.%s' % (name, extension))
+
+
+# Удаление всех копий изображения. Вызывается фоновыми задачами при удалении и замене изображения, тк обработчики
+# сохраняют новое изображение элемента под прежним именем
+def purge_variants(name):
+    removed = 0
+    for width in VARIANT_WIDTHS:
+        for extension in [variant[2] for variant in VARIANT_FORMATS] + [FALLBACK_FORMAT[2]]:
+            try:
+                os.remove(variant_path(width, name, extension))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+# Выбор формата копии по заголовку Accept. Формат выбирается, только если браузер указал его явно (*/* не
+# учитывается) и Pillow умеет сохранять изображения в этом формате
+def negotiate_format(features):
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    for variant in VARIANT_FORMATS:
+        if variant[0] in accepted and features.check(variant[1].lower()):
+            return variant
+    return FALLBACK_FORMAT
+
+
+# Ссылка на исходное изображение по имени: стандартное изображение либо изображение в хранилище
+def source_link(name):
+    for img_link in DEFAULT_IMAGES:
+        if image_name(img_link) == name:
+            return img_link
+    return get_storage().link(name)
+
+
+# Открытие исходного изображения. Стандартные изображения лежат в папке со статическими файлами приложения
+def open_source(name):
+    img_link = source_link(name)
+    if img_link in DEFAULT_IMAGES:
+        path = os.path.join(os.path.dirname(current_app.static_folder), img_link[1:])
+        return open(path, 'rb') if os.path.isfile(path) else None
+    return get_storage().open(name)
+
+
+# Создание копии изображения: уменьшение до указанной ширины (изображения меньшей ширины не увеличиваются) и
+# сохранение в выбранном формате. Копия записывается во временный файл и переименовывается, поэтому параллельные
+# запросы не получат недописанный файл
+def render_variant(Image, source, width, variant, path):
+    mimetype, pil_format, extension, options = variant
+    with Image.open(source) as image:
+        image.thumbnail((width, image.height))
+        # Прозрачность сохраняется для форматов, которые ее поддерживают
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha and pil_format != 'JPEG' else 'RGB')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, 'wb') as target:
+                image.save(target, pil_format, **options)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+# Функция для получения копии изображения указанной ширины в формате, который поддерживает браузер. Пример:
+# /images/640/world1.jpg. Без библиотеки Pillow запрос перенаправляется на исходное изображение
+@bp.route('/images/<int:width>/<name>', methods=['GET'])
+def image_variant(width, name):
+    if width not in VARIANT_WIDTHS or not valid_name(name):
+        abort(404)
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return redirect(source_link(name))
+    variant = negotiate_format(features)
+    path = variant_path(width, name, variant[2])
+    if not os.path.isfile(path):
+        source = open_source(name)
+        if source is None:
+            abort(404)
+        # Pillow нужен файл с произвольным доступом, а объект из S3 читается только последовательно
+        with source:
+            data = io.BytesIO(source.read())
+        render_variant(Image, data, width, variant, path)
+    response = send_file(path, mimetype=variant[0], conditional=True, max_age=VARIANT_MAX_AGE)
+    # Ответ зависит от заголовка Accept, кэши должны хранить отдельную копию для каждого формата
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,74 @@
+from flask import abort, jsonify
+from sqlalchemy import select, update
+
+from .extensions import db
+from .models import PREVIEW_COLUMNS, make_preview
+from .changes import log_change
+from .revisions import record_update
+# Оптимистичная блокировка при редактировании. Каждый элемент хранит номер версии, который увеличивается при каждом
+# изменении. Клиент передает версию, которую он редактировал, в заголовке If-Match, и изменение выполняется одним
+# запросом UPDATE ... WHERE version = ? без предварительного чтения элемента. Если элемент успел изменить другой
+# пользователь, запрос не изменяет ни одной строки и клиент получает ответ 412 с текущей версией элемента
+
+
+# Исключение при попытке изменить элемент, версия которого отличается от версии клиента
+class VersionConflict(Exception):
+    def __init__(self, version):
+        super().__init__('Version conflict, current version is %s' % version)
+        self.version = version
+
+
+# Получение версии из заголовка If-Match. Заголовок может содержать версию в кавычках ("3"), слабый ETag (W/"3")
+# или символ *, который означает любую версию
+def parse_if_match(header):
+    if not header or header.strip() == '*':
+        return None
+    value = header.split(',')[0].strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        abort(400, 'Invalid If-Match header')
+
+
+# Изменение полей элемента одним запросом в базу данных с увеличением версии. Если указана ожидаемая версия,
+# изменение выполняется только при совпадении версии. Функция возвращает словарь с новой версией элемента и
+# значениями всех измененных полей (включая превью), полученными из базы данных тем же запросом
+def versioned_update(model, row_id, values, expected_version=None):
+    table = model.__table__
+    values = dict(values)
+    # Превью вычисляется здесь, тк запрос выполняется без загрузки объекта модели
+    for source, target in PREVIEW_COLUMNS.items():
+        if source in values and target in table.c:
+            values[target] = make_preview(values[source])
+    query = update(table).where(table.c.id == row_id).values(version=table.c.version + 1, **values)
+    if expected_version is not None:
+        query = query.where(table.c.version == expected_version)
+    changed = db.session.execute(query.returning(*[table.c[name] for name in ['version', *values]])).first()
+    if changed is None:
+        db.session.rollback()
+        # Ни одна строка не изменена: элемента нет либо его версия отличается от ожидаемой
+        current_version = db.session.execute(select(table.c.version).where(table.c.id == row_id)).scalar()
+        if current_version is None:
+            abort(404)
+        raise VersionConflict(current_version)
+    # Запись изменения в журнал в той же транзакции
+    log_change(db.session.connection(), model, row_id, 'update')
+    record_update(db.session.connection(), model, row_id, changed._mapping)
+    db.session.commit()
+    return dict(changed._mapping)
+
+
+# Заголовок ETag с версией элемента
+def etag(version):
+    return {'ETag': '"%d"' % version}
+
+
+# Ответ на запрос с устаревшей версией элемента
+def version_conflict(error):
+    version = getattr(error, 'version', None)
+    response = jsonify({'message': 'Version conflict', 'version': version})
+    if version is not None:
+        response.headers.update(etag(version))
+    return response, 412
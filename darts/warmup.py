@@ -0,0 +1,144 @@
+import time
+import threading
+import click
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import func, select
+
+from .extensions import db
+from .models import World, LongRead, ReadRollup
+from .sharding import across_shards
+# Прогрев процесса после запуска. Первые читатели после каждого развертывания ждут компиляции шаблонов Jinja и чтения
+# страниц базы данных с диска, поэтому процесс перед приемом запросов компилирует все шаблоны и выполняет запросы
+# к страницам самых читаемых миров и лонгридов (и первых глав этих лонгридов), после чего страницы базы данных
+# находятся в кэше операционной системы. Прогрев начинается в отдельном потоке при первом запросе к процессу (обычно
+# это проверка готовности балансировщика), адрес /api/ready/ отвечает 503, пока прогрев не завершится. Команда
+# warm-up выполняет прогрев и выводит его результат, например сразу после развертывания
+
+# Ключ окружения WSGI, которым отмечены запросы прогрева. Такие запросы не учитываются в счетчиках прочтений и не
+# профилируются
+WARMUP_ENVIRON = 'darts.warmup'
+
+bp = Blueprint('warmup', __name__)
+
+
+# Состояние прогрева процесса
+class WarmupState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.done = threading.Event()
+        self.result = None
+
+
+def warmup_state():
+    return current_app.extensions['darts_warmup']
+
+
+# Самые читаемые за неделю элементы (см. reads.py), при нехватке дополненные самыми большими элементами по количеству
+# контент блоков
+def top_ids(model, limit):
+    if not limit:
+        return []
+    if model is World:
+        query = (select(ReadRollup.world_id).where(ReadRollup.type == 'longread').group_by(ReadRollup.world_id)
+                 .order_by(func.sum(ReadRollup.count).desc()))
+    else:
+        query = select(ReadRollup.row_id).where(ReadRollup.type == 'longread').order_by(ReadRollup.count.desc())
+    ids = db.session.execute(query.limit(limit)).scalars().all()
+    if len(ids) < limit:
+        largest = across_shards(model.query.order_by(model.blockcontent_count.desc()).limit(limit))
+        largest.sort(key=lambda row: row.blockcontent_count, reverse=True)
+        ids += [row.id for row in largest if row.id not in ids][:limit - len(ids)]
+    return ids
+
+
+# Прогрев: компиляция всех шаблонов и запросы к индексным страницам, страницам самых читаемых миров и лонгридов и
+# первым главам этих лонгридов через тестовый клиент приложения. Функция возвращает количество шаблонов, запросов,
+# неудачных запросов и время прогрева
+def warm_up(app):
+    started = time.monotonic()
+    templates = app.jinja_env.list_templates()
+    for name in templates:
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        worlds = top_ids(World, app.config['WARMUP_TOP_WORLDS'])
+        longreads = top_ids(LongRead, app.config['WARMUP_TOP_LONGREADS'])
+    client = app.test_client()
+    requests = failed = 0
+
+    def get(url):
+        nonlocal requests, failed
+        response = client.get(url, environ_overrides={WARMUP_ENVIRON: True})
+        # Потоковые ответы формируются при чтении
+        response.get_data()
+        response.close()
+        requests += 1
+        if response.status_code >= 400:
+            failed += 1
+        return response
+
+    for url in ('/api/', '/', '/api/explore/', '/explore/'):
+        get(url)
+    for world_id in worlds:
+        get('/api/worlds/%d' % world_id)
+        get('/worlds/%d/' % world_id)
+    for longread_id in longreads:
+        response = get('/api/longreads/%d' % longread_id)
+        get('/longreads/%d/' % longread_id)
+        get('/api/read/longreads/%d' % longread_id)
+        chapters = response.get_json().get('chapters') if response.status_code == 200 else None
+        if chapters:
+            get('/api/chapter/%d' % chapters[0]['id'])
+            get('/chapter/%d/' % chapters[0]['id'])
+    return {'templates': len(templates), 'requests': requests, 'failed': failed,
+            'seconds': round(time.monotonic() - started, 3)}
+
+
+# Запуск прогрева в отдельном потоке при первом запросе к процессу. В режиме тестирования и при выключенной
+# настройке WARMUP процесс готов сразу
+def start_warmup():
+    state = warmup_state()
+    if state.thread is not None:
+        return
+    app = current_app._get_current_object()
+    with state.lock:
+        if state.thread is not None:
+            return
+        if not app.config.get('WARMUP') or app.testing:
+            state.thread = False
+            state.done.set()
+            return
+
+        def run():
+            try:
+                state.result = warm_up(app)
+            except Exception:
+                app.logger.exception('Warm-up failed')
+            finally:
+                state.done.set()
+
+        state.thread = threading.Thread(target=run, name='darts-warmup', daemon=True)
+        state.thread.start()
+
+
+# Проверка готовности процесса для балансировщика нагрузки: 503, пока выполняется прогрев
+@bp.route('/api/ready/', methods=['GET'])
+def api_ready():
+    state = warmup_state()
+    if not state.done.is_set():
+        return jsonify({'status': 'warming'}), 503, {'Retry-After': 1}
+    return jsonify({'status': 'ready', 'warmup': state.result}), 200
+
+
+# Подключение прогрева к приложению
+def init_warmup(app):
+    app.extensions['darts_warmup'] = WarmupState()
+    app.before_request(start_warmup)
+
+
+# CLI команда для прогрева: компиляция шаблонов и чтение страниц самых читаемых миров и лонгридов
+@click.command('warm-up')
+def warm_up_command():
+    result = warm_up(current_app._get_current_object())
+    click.echo('Compiled %(templates)d templates, %(requests)d requests (%(failed)d failed) in %(seconds).1f s'
+               % result)
@@ -0,0 +1,251 @@
+from flask import Blueprint, render_template, request, url_for, redirect, jsonify
+
+from .extensions import db
+from .models import WorldObj
+from .versioning import versioned_update, parse_if_match, etag
+from .patch import validate_patch, patch_data
+from .jobs import enqueue
+from .storage import get_storage
+
+# Blueprint с функциями для работы с объектами мира
+bp = Blueprint('worldobjs', __name__)
+
+
+# React Функция для создания объекта мира. При создании объекта мира ему будет присвоена стандартная фотография
+@bp.route('/api/worlds/<int:world_id>/create_worldobj/', methods=('GET', 'OPTIONS', 'POST'))
+def api_worldobj_create(world_id):
+    # Фронтальная часть приложения перед отправлением запроса на создание элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    #Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Создание объекта мира используя данные полученные из JSON-текста
+    worldobj = WorldObj(world_id=world_id,
+                        description=json["description"])
+    # Объекту мира присваивается стандартная фотография
+    worldobj.img_link = "/staticFiles/images/QuestionMark.jpg"
+    # Добавление нового объекта мира в сессию изменений
+    db.session.add(worldobj)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'WorldObj created successfully'}), 201
+
+
+# Flask Функция для создания объекта мира, идентификатор которого был указан.
+# При создании объекта мира ему будет присвоена стандартная фотография, либо фотография загруженная в форму
+@bp.route('/worlds/<int:world_id>/create_worldobj/', methods=('GET', 'POST'))
+def worldobj_create(world_id):
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        description = request.form['description']
+        uploaded_img = request.files['uploaded-file']
+        # Создание объекта мира используя данные полученные из форм
+        worldobj = WorldObj(world_id=world_id,
+                            description=description)
+        # Добавление нового объекта мира в сессию изменений
+        db.session.add(worldobj)
+        # Использование функции flush для получения id нового объекта мира
+        db.session.flush()
+        # Обновление объекта мира для получения id
+        db.session.refresh(worldobj)
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename == '':
+            # Если пустой файл объекту мира присваивается стандартная фотография
+            worldobj.img_link = "/staticFiles/images/QuestionMark.jpg"
+        else:
+            # Создание уникального имени использую id объекта мира
+            worldobj_img_name = "worldobj" + str(worldobj.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(worldobj_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Сохранение названия файла
+            worldobj.img_link = get_storage().link(worldobj_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=worldobj.img_link)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('worlds.world', world_id=world_id))
+
+    return render_template('create_worldobj.html', world_id=world_id)
+
+
+# React Функция для редактирования объекта мира, идентификатор которого был указан
+@bp.route('/api/worldobj/<int:worldobj_id>/edit/', methods=['GET', 'POST', 'OPTIONS'])
+def api_worldobj_edit(worldobj_id):
+    # Фронтальная часть приложения перед отправлением запроса на редактирование элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Внесение изменений одним запросом в базу данных без предварительного чтения. Если в заголовке If-Match указана
+    # версия, изменение выполняется только при совпадении версии, иначе отсылается ответ 412
+    version = versioned_update(WorldObj, worldobj_id, {'description': json["description"]},
+                               parse_if_match(request.headers.get('If-Match')))['version']
+    # Отсылка сообщения с новой версией
+    return jsonify({'message': 'WorldObj updated successfully', 'version': version}), 200, etag(version)
+
+
+# React Функция для частичного изменения объекта мира. Принимает JSON-текст только с изменяемыми полями и изменяет
+# их одним запросом в базу данных без предварительного чтения объекта мира
+@bp.route('/api/worldobj/<int:worldobj_id>', methods=['PATCH'])
+def api_worldobj_patch(worldobj_id):
+    # Проверка полученных полей, при ошибке отсылается ответ 400 со списком ошибок
+    values = validate_patch(WorldObj, request.get_json(silent=True))
+    # Внесение изменений с учетом версии из заголовка If-Match
+    changed = versioned_update(WorldObj, worldobj_id, values, parse_if_match(request.headers.get('If-Match')))
+    # Отсылка только измененных полей и новой версии
+    return jsonify(patch_data(worldobj_id, changed)), 200, etag(changed['version'])
+
+
+# Flask Функция для редактирования объекта мира и его фотографии, используя указанный идентификатор мира. Предыдущее
+# изображение объекта мира будет удалено, если оно не являлось стандартным
+@bp.route('/worldobj/<int:worldobj_id>/edit/', methods=('GET', 'POST'))
+def worldobj_edit(worldobj_id):
+    # Получение объекта мира по запросу в базу данных
+    worldobj = WorldObj.query.get_or_404(worldobj_id)
+    world_id = worldobj.world_id
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        description = request.form['description']
+        uploaded_img = request.files['uploaded-file']
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename != '':
+            # Создание уникального имени использую id объекта мира
+            worldobj_img_name = "worldobj" + str(worldobj.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(worldobj_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+            if worldobj.img_link not in ("/staticFiles/images/QuestionMark.jpg",
+                                         get_storage().link(worldobj_img_name)):
+                enqueue('remove_images', img_links=[worldobj.img_link])
+            # Внесение изменений
+            worldobj.img_link = get_storage().link(worldobj_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=worldobj.img_link)
+        # Внесение изменений
+        worldobj.description = description
+        # Добавление измененного объекта мира в сессию изменений
+        db.session.add(worldobj)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('worlds.world', world_id=world_id))
+
+    return render_template('edit_worldobj.html', worldobj=worldobj)
+
+
+# React Функция для изменения фотографии объекта мира, идентификатор которого был указан.
+# Предыдущее изображение объекта мира будет удалено, если оно не являлось стандартным
+@bp.route('/api/worldobj/<int:worldobj_id>/update-image/', methods=['GET', 'OPTIONS', 'POST'])
+def api_update_worldobj_image(worldobj_id):
+    # Фронтальная часть приложения перед отправлением запроса на изменение изображения привязанного к элементу
+    # отправляет OPTIONS запрос, на который необходимо ответить ответом с необходимыми заголовками, в котором
+    # указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение объекта мира по запросу в базу данных
+    worldobj = WorldObj.query.get_or_404(worldobj_id)
+    # Получение файла изображения из формы
+    new = request.files["image"]
+    # Сохранение названия файла
+    filename = new.filename
+    # Проверка на пустой файл
+    if filename != '':
+        # Создание уникального имени использую id объекта мира
+        worldobj_img_name = "world" + str(worldobj.id) + ".jpg"
+        # Сохранение изображения в хранилище под уникальным именем
+        get_storage().save(worldobj_img_name, new.stream, new.mimetype)
+        # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+        if worldobj.img_link not in ("/staticFiles/images/QuestionMark.jpg",
+                                     get_storage().link(worldobj_img_name)):
+            enqueue('remove_images', img_links=[worldobj.img_link])
+        # Внесение изменений
+        worldobj.img_link = get_storage().link(worldobj_img_name)
+        # Создание миниатюры фоновой задачей
+        enqueue('thumbnail', img_link=worldobj.img_link)
+    # Добавление измененного объекта мира в сессию изменений
+    db.session.add(worldobj)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'World updated successfully'})
+
+
+# Flask Функция для удаления фотографии объекта мира, идентификатор которого был указан. Изображение объекта
+# мира будет удалено, если оно не являлось стандартным
+@bp.post('/worldobj/<int:worldobj_id>/delete_worldobj_image/')
+def delete_worldobj_image(worldobj_id):
+    # Получение объекта мира по запросу в базу данных
+    worldobj = WorldObj.query.get_or_404(worldobj_id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if worldobj.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[worldobj.img_link])
+        # Объекту мира присваивается стандартная фотография
+        worldobj.img_link = "/staticFiles/images/QuestionMark.jpg"
+        # Добавление измененного объекта мира в сессию изменений
+        db.session.add(worldobj)
+        # Фиксация изменений в БД
+        db.session.commit()
+    return redirect(url_for('worlds.world', world_id=worldobj.world_id))
+
+
+# React Функция для удаления объекта мира, указанного по ее идентификатору, а также изображения, которое с ним связано
+@bp.route('/api/worldobj/<int:worldobj_id>/delete/', methods=('GET', 'OPTIONS', 'DELETE'))
+def api_worldobj_delete(worldobj_id):
+    # Фронтальная часть приложения перед отправлением запроса на удаление элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'DELETE')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение объекта мира по запросу в базу данных
+    worldobj = WorldObj.query.get_or_404(worldobj_id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if worldobj.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[worldobj.img_link])
+    # Удаление объекта мира
+    db.session.delete(worldobj)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return {'message': 'WorldObj deleted successfully'}
+
+
+# Flask Функция для удаления объекта мира, указанного по ее идентификатору, а также изображения, которое с ним связано
+@bp.post('/worldobj/<int:worldobj_id>/delete/')
+def worldobj_delete(worldobj_id):
+    # Получение объекта мира по запросу в базу данных
+    worldobj = WorldObj.query.get_or_404(worldobj_id)
+    world_id = worldobj.world_id
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if worldobj.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[worldobj.img_link])
+    # Удаление объекта мира
+    db.session.delete(worldobj)
+    # Фиксация изменений в БД
+    db.session.commit()
+    return redirect(url_for('worlds.world', world_id=world_id))
@@ -0,0 +1,437 @@
+from flask import (Blueprint, Response, render_template, request, url_for, redirect, jsonify,
+                   stream_with_context)
+
+from sqlalchemy.orm import defer
+
+from .extensions import db
+from .models import World, LongRead, WorldObj, ImportJob
+from .versioning import versioned_update, parse_if_match, etag
+from .patch import validate_patch, patch_data
+from .jobs import enqueue, subtree_size, CASCADE_DELETE_INLINE_LIMIT
+from .storage import get_storage
+from .loader import get_loader
+from .serializers import preview_requested, world_index_data, world_detail_data
+from .export import export_world
+from .importer import NDJSONSource, open_source, import_world
+from .longreads import longread_delete
+from .sharding import across_shards
+from .worldobjs import worldobj_delete
+
+# Blueprint с функциями для работы с мирами, а также с индексными страницами приложения
+bp = Blueprint('worlds', __name__)
+
+
+# Функция для передачи на React фронтальную часть приложения всех миров находящихся в базе данных, функция
+# дублирует ответ, который отправляется функцией api_world_index однако может быть переопределена по запросу коллег из
+# фронтальной части приложения, для отображения других данных на индексной странице приложения
+@bp.route('/api/')
+def api_index():
+    # В режиме превью полное описание миров не загружается из базы данных
+    preview = preview_requested(request.args)
+    # Получение списка всех миров по запросу в базы данных всех шардов
+    worlds = across_shards(World.query.options(defer(World.description)) if preview else World.query, 'id')
+    # JSON-текст в котором указаны данные мира
+    worlds_data = [world_index_data(world, preview) for world in worlds]
+    # JSON-текст перенаправляется на фронтальную часть приложения
+    return jsonify(worlds_data), 200
+
+
+# Функция для передачи на Flask фронтальную часть приложения всех миров находящихся в базе данных, функция
+# дублирует ответ, который отправляется функцией world_index
+@bp.route('/')
+def index():
+    # Получение списка всех миров по запросу в базы данных всех шардов, в списке отображается превью описания,
+    # поэтому полное описание не загружается
+    worlds = across_shards(World.query.options(defer(World.description)), 'id')
+    # Отсылка собранных данных на фронтальную часть приложения для их отображения
+    return render_template('world_index.html', worlds=worlds)
+
+
+# Функция для передачи на React фронтальную часть приложения всех миров находящихся в базе данных
+@bp.route('/api/worlds/')
+def api_world_index():
+    # В режиме превью полное описание миров не загружается из базы данных
+    preview = preview_requested(request.args)
+    # Получение списка всех миров по запросу в базы данных всех шардов
+    worlds = across_shards(World.query.options(defer(World.description)) if preview else World.query, 'id')
+    # JSON-текст в котором указаны данные мира
+    worlds_data = [world_index_data(world, preview) for world in worlds]
+    # JSON-текст перенаправляется на фронтальную часть приложения
+    return jsonify(worlds_data), 200
+
+
+# Функция для передачи на Flask фронтальную часть приложения всех миров находящихся в базе данных
+@bp.route('/worlds/')
+def world_index():
+    # Получение списка всех миров по запросу в базы данных всех шардов, в списке отображается превью описания,
+    # поэтому полное описание не загружается
+    worlds = across_shards(World.query.options(defer(World.description)), 'id')
+    # Отсылка собранных данных на фронтальную часть приложения для их отображения
+    return render_template('world_index.html', worlds=worlds)
+
+
+# Функция для передачи на React фронтальную часть приложения информации о мире по его индексу,
+# а также информации о всех связанных с ним лонгридов и объектов мира
+@bp.route('/api/worlds/<int:world_id>', methods=['GET'])
+def api_world(world_id):
+    # В режиме превью полные описания лонгридов и объектов мира не загружаются из базы данных
+    preview = preview_requested(request.args)
+    deferred = ('description',) if preview else ()
+    # Получение мира через загрузчик запроса
+    loader = get_loader()
+    world = loader.load_or_404(World, world_id)
+    # Получение списков лонгридов и объектов мира, связанных с миром
+    longreads = loader.children_of(LongRead, 'world_id', world_id, deferred)
+    worldobjs = loader.children_of(WorldObj, 'world_id', world_id, deferred)
+    # Формирование JSON-текста с данными мира, лонгридами и объектами мира
+    world_data = world_detail_data(world, longreads, worldobjs, preview)
+    # JSON-текст перенаправляется на фронтальную часть приложения
+    return jsonify(world_data), 200
+
+
+# Функция для экспорта мира, указанного по его идентификатору, со всеми лонгридами, главами, контент блоками,
+# объектами мира и ссылками на изображения. Данные отправляются потоком в формате NDJSON по мере чтения из базы данных
+@bp.route('/api/worlds/<int:world_id>/export/', methods=['GET'])
+def api_world_export(world_id):
+    # Проверка существования мира до начала отправки потока
+    World.query.get_or_404(world_id)
+    # Генератор выполняется после выхода из функции, поэтому контекст запроса сохраняется для работы с базой данных
+    response = Response(stream_with_context(export_world(world_id)), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=world%d.ndjson' % world_id
+    return response
+
+
+# React Функция для импорта мира из NDJSON файла, созданного экспортом, или из архива с изображениями (поле archive
+# формы). Для продолжения импорта после сбоя файл отправляется повторно с параметром resume=<идентификатор задачи>
+@bp.route('/api/worlds/import/', methods=('OPTIONS', 'POST'))
+def api_world_import():
+    # Фронтальная часть приложения перед отправлением запроса на создание элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение задачи импорта, которую нужно продолжить, либо создание новой задачи
+    resume = request.args.get('resume', type=int)
+    job = ImportJob() if resume is None else ImportJob.query.get_or_404(resume)
+    # Архив передается в форме, NDJSON файл передается телом запроса и читается потоком
+    if 'archive' in request.files:
+        archive = request.files['archive']
+        source = open_source(archive.stream, archive.filename)
+    else:
+        source = NDJSONSource(request.stream)
+    try:
+        import_world(source, job)
+    except Exception:
+        # Ошибка сохранена в задаче импорта, импорт можно продолжить повторным запросом
+        return jsonify({'message': 'Import failed', 'job_id': job.id, 'error': job.error}), 400
+    # Отсылка сообщения
+    return jsonify({'message': 'World imported successfully',
+                    'job_id': job.id,
+                    'world_id': job.world_id,
+                    'rows': job.rows_done}), 201
+
+
+# Функция для передачи на React фронтальную часть приложения состояния задачи импорта
+@bp.route('/api/worlds/import/<int:job_id>/', methods=['GET'])
+def api_world_import_status(job_id):
+    # Получение задачи импорта по запросу в базу данных
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify({'job_id': job.id,
+                    'status': job.status,
+                    'world_id': job.world_id,
+                    'lines': job.lines_done,
+                    'rows': job.rows_done,
+                    'error': job.error}), 200
+
+
+# Функция для передачи на Flask фронтальную часть приложения информации о мире по его индексу,
+# а также информации о всех связанных с ним лонгридов и объектов мира
+@bp.route('/worlds/<int:world_id>/')
+def world(world_id):
+    # Получение мира через загрузчик запроса
+    loader = get_loader()
+    world = loader.load_or_404(World, world_id)
+    # Получение списков лонгридов и объектов мира, связанных с миром. В списках отображается превью описания,
+    # поэтому полное описание не загружается
+    longreads = loader.children_of(LongRead, 'world_id', world_id, ('description',))
+    worldobjs = loader.children_of(WorldObj, 'world_id', world_id, ('description',))
+    # Отсылка собранных данных на фронтальную часть приложения для их отображения
+    return render_template('world.html', world=world, longreads=longreads, worldobjs=worldobjs)
+
+
+# React Функция для создания мира, идентификатор которого был указан.
+# При создании мира ему будет присвоена стандартная фотография
+@bp.route('/api/worlds/create/', methods=('GET', 'OPTIONS', 'POST'))
+def api_world_create():
+    # Фронтальная часть приложения перед отправлением запроса на создание элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    #Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Создание мира используя данные полученные из JSON-текста
+    world = World(name=json["name"],
+                  description=json["description"])
+    # Миру присваивается стандартная фотография
+    world.img_link = "/staticFiles/images/QuestionMark.jpg"
+    # Добавление нового мира в сессию изменений
+    db.session.add(world)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'World created successfully'}), 201
+
+
+# Flask Функция для создания мира, идентификатор которого был указан.
+# При создании мира ему будет присвоена стандартная фотография, либо фотография загруженная в форму
+@bp.route('/worlds/create/', methods=('GET', 'POST'))
+def world_create():
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        name = request.form['name']
+        description = request.form['description']
+        uploaded_img = request.files['uploaded-file']
+        # Создание мира используя данные полученные из форм
+        world = World(name=name,
+                      description=description)
+        # Добавление нового мира в сессию изменений
+        db.session.add(world)
+        # Использование функции flush для получения id нового мира
+        db.session.flush()
+        # Обновление мира для получения id
+        db.session.refresh(world)
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename == '':
+            # Если пустой файл миру присваивается стандартная фотография
+            world.img_link = "/staticFiles/images/QuestionMark.jpg"
+        else:
+            # Создание уникального имени использую id мира
+            world_img_name = "world" + str(world.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(world_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Сохранение названия файла
+            world.img_link = get_storage().link(world_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=world.img_link)
+        # Фиксация изменений в БД
+        db.session.commit()
+        return redirect(url_for('worlds.world_index'))
+
+    return render_template('create_world.html')
+
+
+# React Функция для редактирования мира, идентификатор которого был указан
+@bp.route('/api/worlds/<int:world_id>/edit/', methods=['GET', 'POST', 'OPTIONS'])
+def api_world_edit(world_id):
+    # Фронтальная часть приложения перед отправлением запроса на редактирование элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Полученный JSON-текст парсится для извлечения из него данных
+    json = request.json
+    # Внесение изменений одним запросом в базу данных без предварительного чтения. Если в заголовке If-Match указана
+    # версия, изменение выполняется только при совпадении версии, иначе отсылается ответ 412
+    version = versioned_update(World, world_id, {'name': json["name"], 'description': json["description"]},
+                               parse_if_match(request.headers.get('If-Match')))['version']
+    # Отсылка сообщения с новой версией
+    return jsonify({'message': 'World updated successfully', 'version': version}), 200, etag(version)
+
+
+# React Функция для частичного изменения мира. Принимает JSON-текст только с изменяемыми полями и изменяет их одним
+# запросом в базу данных без предварительного чтения мира
+@bp.route('/api/worlds/<int:world_id>', methods=['PATCH'])
+def api_world_patch(world_id):
+    # Проверка полученных полей, при ошибке отсылается ответ 400 со списком ошибок
+    values = validate_patch(World, request.get_json(silent=True))
+    # Внесение изменений с учетом версии из заголовка If-Match
+    changed = versioned_update(World, world_id, values, parse_if_match(request.headers.get('If-Match')))
+    # Отсылка только измененных полей и новой версии
+    return jsonify(patch_data(world_id, changed)), 200, etag(changed['version'])
+
+
+# Flask Функция для редактирования мира и его фотографии, используя указанный идентификатор мира. Предыдущее
+# изображение мира будет удалено, если оно не являлось стандартным
+@bp.route('/worlds/<int:world_id>/edit/', methods=('GET', 'POST'))
+def world_edit(world_id):
+    # Получение мира по запросу в базу данных
+    world = World.query.get_or_404(world_id)
+    world_id = world.id
+
+    if request.method == 'POST':
+        # Получение файла изображения и данных из формы
+        name = request.form['name']
+        uploaded_img = request.files['uploaded-file']
+        description = request.form['description']
+        # Сохранение названия файла
+        filename = uploaded_img.filename
+        # Проверка на пустой файл
+        if filename != '':
+            # Создание уникального имени использую id мира
+            world_img_name = "world" + str(world.id) + ".jpg"
+            # Сохранение изображения в хранилище под уникальным именем
+            get_storage().save(world_img_name, uploaded_img.stream, uploaded_img.mimetype)
+            # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+            if world.img_link not in ("/staticFiles/images/QuestionMark.jpg",
+                                      get_storage().link(world_img_name)):
+                enqueue('remove_images', img_links=[world.img_link])
+            # Внесение изменений
+            world.img_link = get_storage().link(world_img_name)
+            # Создание миниатюры фоновой задачей
+            enqueue('thumbnail', img_link=world.img_link)
+        # Внесение изменений
+        world.name = name
+        world.description = description
+        # Добавление измененного мира в сессию изменений
+        db.session.add(world)
+        # Фиксация изменений в БД
+        db.session.commit()
+
+        return redirect(url_for('worlds.world', world_id=world_id))
+
+    return render_template('edit_world.html', world=world)
+
+
+# React Функция для изменения фотография мира, идентификатор которого был указан.
+# Предыдущее изображение мира будет удалено, если оно не являлось стандартным
+@bp.route('/api/worlds/<int:world_id>/update-image/', methods=['GET', 'OPTIONS', 'POST'])
+def api_update_world_image(world_id):
+    # Фронтальная часть приложения перед отправлением запроса на изменение изображения привязанного к элементу
+    # отправляет OPTIONS запрос, на который необходимо ответить ответом с необходимыми заголовками, в котором
+    # указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение мира по запросу в базу данных
+    world = World.query.get_or_404(world_id)
+    # Получение файла изображения из формы
+    new = request.files["image"]
+    # Сохранение названия файла
+    filename = new.filename
+    # Проверка на пустой файл
+    if filename != '':
+        # Создание уникального имени использую id мира
+        world_img_name = "world" + str(world.id) + ".jpg"
+        # Сохранение изображения в хранилище под уникальным именем
+        get_storage().save(world_img_name, new.stream, new.mimetype)
+        # Предыдущая фотография удаляется фоновой задачей, если она не стандартная и не была перезаписана новой
+        if world.img_link not in ("/staticFiles/images/QuestionMark.jpg",
+                                  get_storage().link(world_img_name)):
+            enqueue('remove_images', img_links=[world.img_link])
+        # Внесение изменений
+        world.img_link = get_storage().link(world_img_name)
+        # Создание миниатюры фоновой задачей
+        enqueue('thumbnail', img_link=world.img_link)
+    # Добавление измененного мира в сессию изменений
+    db.session.add(world)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return jsonify({'message': 'World updated successfully'})
+
+
+# Flask Функция для удаления фотографии мира, идентификатор которого был указан. Изображение
+# мира будет удалено, если оно не являлось стандартным
+@bp.post('/worlds/<int:world_id>/delete_world_image/')
+def delete_world_image(world_id):
+    # Получение мира по запросу в базу данных
+    world = World.query.get_or_404(world_id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if world.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[world.img_link])
+        # Миру присваивается стандартная фотография
+        world.img_link = "/staticFiles/images/QuestionMark.jpg"
+        # Добавление измененного мира в сессию изменений
+        db.session.add(world)
+        # Фиксация изменений в БД
+        db.session.commit()
+    return redirect(url_for('worlds.world', world_id=world_id))
+
+
+# React Функция для удаления мира, указанного по ее идентификатору, а также изображения, всех лонгридов и
+# объектов мира, которые с ним связаны
+@bp.route('/api/worlds/<int:world_id>/delete/', methods=('GET', 'OPTIONS', 'DELETE'))
+def api_world_delete(world_id):
+    # Фронтальная часть приложения перед отправлением запроса на удаление элемента отправляет OPTIONS запрос,
+    # на который необходимо ответить ответом с необходимыми заголовками, в котором указаны разрешенные методы
+    if request.method == 'OPTIONS':
+        response = jsonify()
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'DELETE')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return jsonify({'message': 'Approved'}), 201
+    # Получение мира по запросу в базу данных
+    world = World.query.get_or_404(world_id)
+    # Мир с большим количеством дочерних элементов удаляется фоновой задачей, чтобы запрос не ждал окончания удаления
+    if subtree_size('world', world_id) > CASCADE_DELETE_INLINE_LIMIT:
+        job = enqueue('cascade_delete', element='world', row_id=world_id)
+        db.session.commit()
+        return jsonify({'message': 'World deletion queued', 'job_id': job.id}), 202
+    # Получение списка лонгридов по запросу в базу данных, связанных с миром
+    longreads = LongRead.query.filter(LongRead.world_id == world_id).all()
+    # Получение списка объектов мира по запросу в базу данных, связанных с миром
+    worldobjs = WorldObj.query.filter(WorldObj.world_id == world_id).all()
+    # Удаление лонгридов, связанных с миром
+    for longread in longreads:
+        longread_delete(longread.id)
+    # Удаление объектов мира, связанных с миром
+    for worldobj in worldobjs:
+        worldobj_delete(worldobj.id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if world.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[world.img_link])
+    # Удаление мира
+    db.session.delete(world)
+    # Фиксация изменений в БД
+    db.session.commit()
+    # Отсылка сообщения
+    return {'message': 'World deleted successfully'}
+
+
+# Flask Функция для удаления мира, указанного по ее идентификатору, а также изображения, всех лонгридов и
+# объектов мира, которые с ним связаны
+@bp.post('/worlds/<int:world_id>/delete/')
+def world_delete(world_id):
+    # Получение мира по запросу в базу данных
+    world = World.query.get_or_404(world_id)
+    # Мир с большим количеством дочерних элементов удаляется фоновой задачей
+    if subtree_size('world', world_id) > CASCADE_DELETE_INLINE_LIMIT:
+        enqueue('cascade_delete', element='world', row_id=world_id)
+        db.session.commit()
+        return redirect(url_for('worlds.world_index'))
+    # Получение списка лонгридов по запросу в базу данных, связанных с миром
+    longreads = LongRead.query.filter(LongRead.world_id == world_id).all()
+    # Получение списка объектов мира по запросу в базу данных, связанных с миром
+    worldobjs = WorldObj.query.filter(WorldObj.world_id == world_id).all()
+    # Удаление лонгридов, связанных с миром
+    for longread in longreads:
+        longread_delete(longread.id)
+    # Удаление объектов мира, связанных с миром
+    for worldobj in worldobjs:
+        worldobj_delete(worldobj.id)
+    # Проверка ссылки на изображение, для того чтобы не удалить стандартную фотографию
+    if world.img_link != "/staticFiles/images/QuestionMark.jpg":
+        # Удаление фотографии фоновой задачей после фиксации изменений
+        enqueue('remove_images', img_links=[world.img_link])
+    # Удаление мира
+    db.session.delete(world)
+    # Фиксация изменений в БД
+    db.session.commit()
+    return redirect(url_for('worlds.world_index'))
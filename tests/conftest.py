@@ -0,0 +1,72 @@
+import pytest
+
+from darts import create_app
+from darts.extensions import db
+from darts.commands import upgrade_schema
+from darts.models import World, LongRead, Chapter, BlockContent, DEFAULT_IMAGES
+from darts.sharding import shard_names, use_shard
+# Общие фикстуры тестов. Каждый тест получает приложение с отдельной базой данных в памяти, схема создается так же,
+# как командой init-db. Для тестов шардов основная база данных и базы данных шардов a и b тоже находятся в памяти
+
+
+# Конфигурация тестового приложения. Прогрев и счетчики прочтений выключены, тк они запускают фоновые потоки
+def app_config(tmp_path, **config):
+    return dict({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'TESTING': True, 'WARMUP': False,
+                 'READ_COUNTERS': False, 'UPLOAD_FOLDER': str(tmp_path / 'images'),
+                 'PUBLISH_FOLDER': str(tmp_path / 'published')}, **config)
+
+
+# Создание схемы во всех базах данных приложения
+def init_schema(app):
+    with app.app_context():
+        for name in shard_names():
+            with use_shard(name):
+                upgrade_schema()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(app_config(tmp_path))
+    init_schema(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+# Приложение с двумя шардами
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = create_app(app_config(tmp_path, SHARDS={'a': 'sqlite:///:memory:', 'b': 'sqlite:///:memory:'}))
+    init_schema(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def sharded_client(sharded_app):
+    return sharded_app.test_client()
+
+
+# Мир с одним лонгридом, одной главой и одним контент блоком в указанном шарде. Функция возвращает идентификаторы
+# мира, лонгрида, главы и контент блока. Элементам, как и в обработчиках, присваиваются стандартные изображения
+def make_world(shard='main', img_link=DEFAULT_IMAGES[0], text='Text'):
+    with use_shard(shard):
+        world = World(name='World', description='Description', img_link=img_link)
+        db.session.add(world)
+        db.session.flush()
+        longread = LongRead(world_id=world.id, name='LongRead', description='Description', img_link=DEFAULT_IMAGES[0])
+        db.session.add(longread)
+        db.session.flush()
+        chapter = Chapter(name='Chapter', longread_id=longread.id)
+        db.session.add(chapter)
+        db.session.flush()
+        block = BlockContent(longread_id=longread.id, chapter_id=chapter.id, text=text, img_link=DEFAULT_IMAGES[1])
+        db.session.add(block)
+        db.session.commit()
+        return world.id, longread.id, chapter.id, block.id
@@ -0,0 +1,87 @@
+import json
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from darts import create_app
+from darts.aio import create_asgi_app
+from darts.extensions import db
+from darts.models import LongRead, Chapter, WorldObj, DEFAULT_IMAGES
+from .conftest import app_config, init_schema, make_world
+
+
+# Выполнение GET запроса к ASGI приложению без сервера. Функция возвращает код ответа и JSON-текст
+def asgi_get(app, path, query=''):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def request():
+        await app({'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'headers': []},
+                  receive, send)
+        await app.shards.dispose()
+
+    asyncio.run(request())
+    body = b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+    return messages[0]['status'], json.loads(body)
+
+
+# SQLite возвращает строки запросов без ORDER BY в обратном порядке, поэтому порядок списков, который зависит от
+# плана запроса, отличается от порядка идентификаторов
+def reverse_unordered_selects(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA reverse_unordered_selects = ON')
+
+
+# Асинхронное приложение отдает списки дочерних элементов в том же порядке, что и Flask приложение
+def test_lists_match_flask_order(tmp_path):
+    config = app_config(tmp_path, SQLALCHEMY_DATABASE_URI='sqlite:///%s' % (tmp_path / 'main.db'))
+    app = create_app(config)
+    init_schema(app)
+    with app.app_context():
+        world_id, longread_id = make_world()[:2]
+        db.session.add_all([LongRead(world_id=world_id, name='Second', description='Description',
+                                     img_link=DEFAULT_IMAGES[0]),
+                            Chapter(name='Second', longread_id=longread_id),
+                            WorldObj(world_id=world_id, description='First', img_link=DEFAULT_IMAGES[0]),
+                            WorldObj(world_id=world_id, description='Second', img_link=DEFAULT_IMAGES[0])])
+        db.session.commit()
+    event.listen(Engine, 'connect', reverse_unordered_selects)
+    try:
+        asgi = create_asgi_app(config)
+        client = app.test_client()
+        for path, lists in (('/api/worlds/%d' % world_id, ('longreads', 'worldobjs')),
+                            ('/api/longreads/%d' % longread_id, ('chapters',))):
+            expected = client.get(path).get_json()
+            status, data = asgi_get(asgi, path)
+            for name in lists:
+                ids = [item['id'] for item in data[name]]
+                assert ids == [item['id'] for item in expected[name]] == sorted(ids)
+                assert len(ids) == 2
+    finally:
+        event.remove(Engine, 'connect', reverse_unordered_selects)
+
+
+# Асинхронное приложение читает элементы из шарда мира, списки собираются из всех шардов. Базы данных находятся в
+# файлах, тк асинхронное приложение подключается к ним отдельно от Flask приложения
+def test_reads_from_shards(tmp_path):
+    config = app_config(tmp_path, SQLALCHEMY_DATABASE_URI='sqlite:///%s' % (tmp_path / 'main.db'),
+                        SHARDS={'a': 'sqlite:///%s' % (tmp_path / 'a.db'), 'b': 'sqlite:///%s' % (tmp_path / 'b.db')})
+    app = create_app(config)
+    init_schema(app)
+    with app.app_context():
+        first = make_world('main')
+        second = make_world('b', text='Sharded text')
+    asgi = create_asgi_app(config)
+    assert [world['id'] for world in asgi_get(asgi, '/api/worlds/')[1]] == [first[0], second[0]]
+    assert asgi_get(asgi, '/api/worlds/%d' % second[0])[0] == 200
+    assert asgi_get(asgi, '/api/longreads/%d' % second[1])[1]['id'] == second[1]
+    status, chapter = asgi_get(asgi, '/api/chapter/%d' % second[2])
+    assert (status, chapter['blockcontents'][0]['text']) == (200, 'Sharded text')
+    status, batch = asgi_get(asgi, '/api/batch/', 'longread=%d,%d' % (first[1], second[1]))
+    assert [longread['id'] for longread in batch['items']['longread']] == [first[1], second[1]]
+    assert asgi_get(asgi, '/api/chapter/12345')[0] == 404
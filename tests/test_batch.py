@@ -0,0 +1,27 @@
+from .conftest import make_world
+
+
+# Элементы разных типов возвращаются в порядке запрошенных идентификаторов, отсутствующие идентификаторы
+# перечисляются отдельно
+def test_batch_read(client):
+    first = make_world(text='First text')
+    second = make_world(text='Second text')
+    response = client.get('/api/batch/?longread=%d,%d,12345&blockcontent=%d' % (second[1], first[1], first[3]))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [longread['id'] for longread in data['items']['longread']] == [second[1], first[1]]
+    assert data['items']['blockcontent'][0]['text'] == 'First text'
+    assert data['missing'] == {'longread': [12345]}
+    assert client.get('/api/batch/?planet=1').status_code == 400
+
+
+# Режим превью включается параметром строки запроса для GET и полем JSON-текста для POST
+def test_batch_preview(client):
+    block_id = make_world(text='Long text ' * 100)[3]
+    item = client.get('/api/batch/?blockcontent=%d&preview=1' % block_id).get_json()['items']['blockcontent'][0]
+    assert 'text' not in item and item['text_preview']
+    item = client.post('/api/batch/', json={'blockcontent': [block_id], 'preview': True}).get_json()
+    assert 'text' not in item['items']['blockcontent'][0]
+    item = client.post('/api/batch/', json={'blockcontent': [block_id]}).get_json()
+    assert item['items']['blockcontent'][0]['text'] == 'Long text ' * 100
+    assert client.post('/api/batch/', json={'blockcontent': [block_id], 'preview': 'yes'}).status_code == 400
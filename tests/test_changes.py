@@ -0,0 +1,60 @@
+import time
+
+from darts import changes
+from darts.models import BlockContent
+from darts.versioning import versioned_update
+from .conftest import make_world
+
+
+# Поток SSE отдает только асинхронное приложение, Flask приложение не держит поток сервера открытым соединением
+def test_no_stream_in_flask(client):
+    make_world()
+    assert client.get('/api/changes/stream?world_id=1').status_code == 404
+
+
+# Долгий опрос возвращает изменения после указанного номера
+def test_long_poll_returns_changes(client):
+    world_id, longread_id, chapter_id, block_id = make_world()
+    since = client.get('/api/changes/?world_id=%d' % world_id).get_json()['last_id']
+    versioned_update(BlockContent, block_id, {'text': 'Changed'})
+    response = client.get('/api/changes/?world_id=%d&since=%d' % (world_id, since)).get_json()
+    assert [(change['type'], change['entity_id']) for change in response['changes']] == [('blockcontent', block_id)]
+    assert response['last_id'] > since
+
+
+# Время ожидания долгого опроса ограничено CHANGES_MAX_WAIT независимо от параметра wait
+def test_long_poll_wait_is_bounded(client, monkeypatch):
+    world_id = make_world()[0]
+    monkeypatch.setattr(changes, 'CHANGES_MAX_WAIT', 0.2)
+    monkeypatch.setattr(changes, 'CHANGES_POLL_INTERVAL', 0.05)
+    started = time.monotonic()
+    response = client.get('/api/changes/?world_id=%d&wait=300' % world_id)
+    assert response.status_code == 200
+    assert response.get_json()['changes'] == []
+    assert time.monotonic() - started < 5
+
+
+# Полная синхронизация постранично: страницы продолжаются с номера cursor, пока has_more равно true
+def test_sync_pages(client):
+    world_id, longread_id, chapter_id, block_id = make_world()
+    first = client.get('/api/sync?world_id=%d&since=0&limit=3' % world_id).get_json()
+    assert first['has_more']
+    second = client.get('/api/sync?world_id=%d&since=%d&limit=3' % (world_id, first['cursor'])).get_json()
+    assert not second['has_more'] and second['cursor'] > first['cursor']
+    synced = {(change_type, item['id']) for page in (first, second)
+              for change_type, items in page['changed'].items() for item in items}
+    assert synced == {('world', world_id), ('longread', longread_id), ('chapter', chapter_id),
+                      ('blockcontent', block_id)}
+    assert client.get('/api/sync?world_id=%d&limit=0' % world_id).status_code == 400
+
+
+# Удаленный элемент передается отметкой об удалении, измененный элемент - текущими данными
+def test_sync_tombstones(client):
+    world_id, longread_id, chapter_id, block_id = make_world()
+    cursor = client.get('/api/sync?world_id=%d' % world_id).get_json()['cursor']
+    client.patch('/api/longreads/%d' % longread_id, json={'name': 'Renamed'})
+    assert client.delete('/api/blockcontent/%d/delete/' % block_id).status_code == 200
+    delta = client.get('/api/sync?world_id=%d&since=%d' % (world_id, cursor)).get_json()
+    assert [(item['id'], item['name']) for item in delta['changed']['longread']] == [(longread_id, 'Renamed')]
+    assert [(item['type'], item['id']) for item in delta['deleted']] == [('blockcontent', block_id)]
+    assert delta['changed']['blockcontent'] == []
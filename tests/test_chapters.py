@@ -0,0 +1,25 @@
+from flask import template_rendered
+
+from darts import chapters
+from .conftest import make_world
+
+
+# Потоковая страница главы совпадает со страницей, отрисованной целиком, и отрисовывается через stream_template,
+# поэтому срабатывают сигналы отрисовки шаблона
+def test_streamed_chapter_page(app, client, monkeypatch):
+    chapter_id = make_world(text='Streamed text')[2]
+    monkeypatch.setattr(chapters, 'CHAPTER_STREAM_BUFFER', 1)
+    rendered = []
+    with template_rendered.connected_to(lambda sender, template, context: rendered.append(template.name), app):
+        response = client.get('/chapter/%d/' % chapter_id)
+        assert response.is_streamed
+        streamed = response.get_data(as_text=True)
+    assert rendered == ['chapter.html']
+    assert 'Streamed text' in streamed
+    app.config['STREAM_CHAPTER_VIEW'] = False
+    assert client.get('/chapter/%d/' % chapter_id).get_data(as_text=True) == streamed
+
+
+# Части потокового шаблона объединяются по заданному количеству
+def test_buffered_chunks():
+    assert list(chapters.buffered(iter(['a', '', 'b', '', '', 'c', 'd']), 3)) == ['ab', 'c', 'd']
@@ -0,0 +1,69 @@
+import os
+import json
+import shutil
+
+from sqlalchemy import update
+
+from darts import create_app
+from darts.extensions import db
+from darts.models import World, BlockContent
+from darts.sharding import use_shard
+from .conftest import app_config, make_world
+
+
+def run(app, *args):
+    result = app.test_cli_runner().invoke(args=list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+# Команда init-db обновляет схему базы данных с примерами данных из репозитория и заполняет превью
+def test_init_db_upgrades_sample_database(tmp_path):
+    path = tmp_path / 'sample.db'
+    shutil.copy(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sqlite_darts.db'), path)
+    app = create_app(app_config(tmp_path, SQLALCHEMY_DATABASE_URI='sqlite:///%s' % path))
+    with app.app_context():
+        output = run(app, 'init-db')
+        db.session.remove()
+    assert 'Added BlockContent.text_preview' in output and 'Database initialized' in output
+    client = app.test_client()
+    assert client.get('/api/?preview=1').get_json()[0]['description_preview']
+    assert client.get('/chapter/1/').status_code == 200
+
+
+# Команды обслуживания данных обрабатывают все шарды, а не только основную базу данных
+def test_repair_counters_in_shards(sharded_app):
+    world_id = make_world('a')[0]
+    with use_shard('a'):
+        db.session.execute(update(World).where(World.id == world_id).values(blockcontent_count=7))
+        db.session.commit()
+    assert 'a: World %d blockcontent_count: 7 -> 1' % world_id in run(sharded_app, 'repair-counters')
+    with use_shard('a'):
+        db.session.expire_all()
+        assert db.session.get(World, world_id).blockcontent_count == 1
+
+
+def test_export_world_from_shard(sharded_app):
+    world_id = make_world('b')[0]
+    lines = [json.loads(line) for line in run(sharded_app, 'export-world', str(world_id)).splitlines()]
+    assert [line['data']['id'] for line in lines if line['type'] == 'world'] == [world_id]
+    result = sharded_app.test_cli_runner().invoke(args=['export-world', '12345'])
+    assert 'World 12345 not found' in result.output
+
+
+def test_compress_text_in_shards(sharded_app):
+    block_id = make_world('b', text='Sharded text ' * 20)[3]
+    assert 'b: BlockContent.text: 1 rows' in run(sharded_app, 'compress-text', '--codec', 'zlib')
+    with use_shard('b'):
+        db.session.expire_all()
+        assert db.session.get(BlockContent, block_id).text == 'Sharded text ' * 20
+
+
+def test_compact_revisions_in_shards(sharded_app):
+    block_id = make_world('a')[3]
+    for version in range(2, 6):
+        with use_shard('a'):
+            db.session.get(BlockContent, block_id).text = 'Text %d' % version
+            db.session.commit()
+    output = run(sharded_app, 'compact-revisions', '--keep', '2')
+    assert 'Removed 0 revisions of deleted blocks and 3 old revisions' in output
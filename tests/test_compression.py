@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+
+from darts import create_app
+from darts.extensions import db
+from darts.models import BlockContent
+from darts.compression import LazyText, COMPRESSED_MAGIC
+from .conftest import app_config, init_schema, make_world
+
+LONG_TEXT = 'A long block text that is worth compressing. ' * 20
+
+
+@pytest.fixture
+def compressed_app(tmp_path):
+    app = create_app(app_config(tmp_path, TEXT_COMPRESSION='zlib'))
+    init_schema(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+# Значение поля в базе данных без преобразования типом поля
+def stored(block_id):
+    return db.session.execute(text('SELECT text FROM BlockContent WHERE id = :id'), {'id': block_id}).scalar()
+
+
+def test_round_trip(compressed_app):
+    client = compressed_app.test_client()
+    chapter_id, block_id = make_world(text=LONG_TEXT)[2:]
+    assert stored(block_id).startswith(COMPRESSED_MAGIC) and len(stored(block_id)) < len(LONG_TEXT)
+    response = client.get('/api/chapter/%d' % chapter_id)
+    assert response.get_json()['blockcontents'][0]['text'] == LONG_TEXT
+    # Короткие тексты не сжимаются
+    assert stored(make_world(text='Short')[3]) == 'Short'
+
+
+# Неизмененный текст записывается обратно без распаковки и повторного сжатия
+def test_lazy_text_write_back(compressed_app):
+    block_id = make_world(text=LONG_TEXT)[3]
+    blob = stored(block_id)
+    db.session.expire_all()
+    block = db.session.get(BlockContent, block_id)
+    assert isinstance(block.text, LazyText) and not block.text.decompressed
+    block.coordx = 10
+    db.session.commit()
+    assert stored(block_id) == blob
+
+
+# Частичное изменение сжатого поля одним запросом сохраняет новый текст в сжатом виде и обновляет превью
+def test_patch_compressed_column(compressed_app):
+    client = compressed_app.test_client()
+    chapter_id, block_id = make_world(text=LONG_TEXT)[2:]
+    response = client.patch('/api/blockcontent/%d' % block_id, json={'text': 'Changed. ' + LONG_TEXT})
+    assert response.status_code == 200
+    assert stored(block_id).startswith(COMPRESSED_MAGIC)
+    data = client.get('/api/chapter/%d' % chapter_id).get_json()['blockcontents'][0]
+    assert data['text'] == 'Changed. ' + LONG_TEXT
+    data = client.get('/api/chapter/%d?preview=1' % chapter_id).get_json()['blockcontents'][0]
+    assert data['text_preview'].startswith('Changed. ')
@@ -0,0 +1,43 @@
+import io
+
+from darts.extensions import db
+from darts.models import World
+from darts.gc import find_orphans, find_missing, storage_by_world
+from darts.storage import get_storage
+from darts.sharding import use_shard
+from .conftest import make_world
+
+
+# Сохранение изображения в хранилище, функция возвращает ссылку на него
+def save_image(name, data=b'image'):
+    storage = get_storage()
+    storage.save(name, io.BytesIO(data))
+    return storage.link(name)
+
+
+def test_orphans_are_files_without_links(app):
+    used = save_image('used.png')
+    save_image('orphan.png')
+    make_world(img_link=used)
+    assert [name for name, size in find_orphans(get_storage(), 0, 0)] == ['orphan.png']
+
+
+# Изображение мира в шарде не должно считаться лишним, даже если в основной базе данных ссылок на него нет
+def test_orphans_check_every_shard(sharded_app):
+    used = save_image('used.png')
+    save_image('orphan.png')
+    make_world('a', img_link=used)
+    assert [name for name, size in find_orphans(get_storage(), 0, 0)] == ['orphan.png']
+
+
+def test_missing_images_are_found_in_shards(sharded_app):
+    world_id = make_world('b', img_link=get_storage().link('lost.png'))[0]
+    assert [(shard, model, row_id) for shard, model, row_id, img_link in find_missing(get_storage(), 0)] == [
+        ('b', World, world_id)]
+
+
+def test_storage_by_world_counts_shard_worlds(sharded_app):
+    world_id = make_world('a', img_link=save_image('world.png', b'12345'))[0]
+    with use_shard('a'):
+        assert db.session.get(World, world_id) is not None
+    assert storage_by_world(get_storage()) == {world_id: (1, 5)}
@@ -0,0 +1,41 @@
+from darts.extensions import db
+from darts.models import World, BlockContent
+from darts.sharding import use_shard
+from darts.storage import get_storage
+from .conftest import make_world
+
+
+# Прямая загрузка изображения: подписанная ссылка, загрузка файла и подтверждение. Функция возвращает ответ на
+# подтверждение
+def upload_image(client, type_name, row_id):
+    response = client.post('/api/images/upload-url/', json={'type': type_name, 'id': row_id,
+                                                             'content_type': 'image/png'})
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()
+    url = data['upload']['url'].replace('http://localhost', '')
+    assert client.put(url, data=b'png', content_type='image/png').status_code == 200
+    return client.post('/api/images/confirm/', json={'type': type_name, 'id': row_id, 'name': data['name']})
+
+
+def test_upload_assigns_image(app, client):
+    world_id = make_world()[0]
+    response = upload_image(client, 'world', world_id)
+    assert response.status_code == 200
+    name = get_storage().name(db.session.get(World, world_id).img_link)
+    assert name.startswith('world%d-' % world_id) and get_storage().exists(name)
+
+
+# Идентификатор элемента передается в теле запроса, поэтому шард выбирается обработчиком
+def test_upload_to_element_in_shard(sharded_app, sharded_client):
+    block_id = make_world('b')[3]
+    response = upload_image(sharded_client, 'blockcontent', block_id)
+    assert response.status_code == 200
+    with use_shard('b'):
+        assert get_storage().name(db.session.get(BlockContent, block_id).img_link).startswith(
+            'blockcontent%d-' % block_id)
+
+
+def test_upload_to_unknown_element(app, client):
+    response = client.post('/api/images/upload-url/', json={'type': 'world', 'id': 12345,
+                                                             'content_type': 'image/png'})
+    assert response.status_code == 404
@@ -0,0 +1,112 @@
+import io
+import tarfile
+
+import pytest
+from sqlalchemy import func, select
+
+from darts import importer
+from darts.extensions import db
+from darts.models import (World, LongRead, Chapter, BlockContent, WorldObj, ImportJob, blockcontents,
+                          DEFAULT_IMAGES)
+from darts.export import export_world, export_world_archive, archive_name
+from darts.importer import NDJSONSource, ZipSource, TarSource, import_world
+from darts.storage import get_storage
+from .conftest import make_world
+
+
+# Мир с двумя главами, двумя контент блоками, объектом мира, связанным с контент блоком, и изображением мира
+# в хранилище
+def make_linked_world():
+    storage = get_storage()
+    storage.save('picture.png', io.BytesIO(b'png'), 'image/png')
+    world_id, longread_id, chapter_id, block_id = make_world(img_link=storage.link('picture.png'), text='First')
+    chapter = Chapter(name='Second chapter', longread_id=longread_id)
+    db.session.add(chapter)
+    db.session.flush()
+    block = BlockContent(longread_id=longread_id, chapter_id=chapter.id, text='Second', img_link=DEFAULT_IMAGES[1])
+    worldobj = WorldObj(world_id=world_id, description='Object', img_link=DEFAULT_IMAGES[0])
+    worldobj.blockcontents.append(block)
+    db.session.add_all([block, worldobj])
+    db.session.commit()
+    return world_id
+
+
+# Поддерево мира без идентификаторов: главы с текстами контент блоков и описаниями связанных объектов мира
+def subtree(world_id):
+    longread_ids = select(LongRead.id).where(LongRead.world_id == world_id)
+    rows = db.session.execute(select(Chapter.name, BlockContent.text, WorldObj.description)
+                              .join(BlockContent, BlockContent.chapter_id == Chapter.id)
+                              .outerjoin(blockcontents, blockcontents.c.blockcontent_id == BlockContent.id)
+                              .outerjoin(WorldObj, WorldObj.id == blockcontents.c.worldobj_id)
+                              .where(Chapter.longread_id.in_(longread_ids))
+                              .order_by(Chapter.name)).all()
+    return [tuple(str(value) if value is not None else None for value in row) for row in rows]
+
+
+# Экспорт и импорт мира: поддерево мира и связи контент блоков с объектами мира совпадают, ссылки между элементами
+# указывают на новые идентификаторы
+def test_round_trip(app):
+    world_id = make_linked_world()
+    job = import_world(NDJSONSource(list(export_world(world_id))), ImportJob())
+    assert job.status == 'done' and job.world_id != world_id
+    assert subtree(job.world_id) == subtree(world_id) == [('Chapter', 'First', None),
+                                                          ('Second chapter', 'Second', 'Object')]
+    # Ссылки на элементы переведены на новые идентификаторы
+    new_ids = set(db.session.execute(select(LongRead.id).where(LongRead.world_id == job.world_id)).scalars())
+    assert new_ids and not new_ids & set(db.session.execute(select(LongRead.id)
+                                                            .where(LongRead.world_id == world_id)).scalars())
+    # Изображение мира копируется в хранилище под именем, уникальным для задачи импорта
+    assert get_storage().name(db.session.get(World, job.world_id).img_link) == 'import%d-picture.png' % job.id
+
+
+# После сбоя импорт продолжается с первой незафиксированной строки, зафиксированные элементы не повторяются
+def test_resume_after_failure(app, monkeypatch):
+    world_id = make_linked_world()
+    lines = list(export_world(world_id))
+    monkeypatch.setattr(importer, 'IMPORT_BATCH_SIZE', 2)
+    insert = importer.WorldImporter.insert
+    calls = []
+
+    def failing_insert(self, record_type, records):
+        calls.append(record_type)
+        if record_type == 'chapter':
+            raise RuntimeError('Disk is full')
+        insert(self, record_type, records)
+
+    monkeypatch.setattr(importer.WorldImporter, 'insert', failing_insert)
+    job = ImportJob()
+    with pytest.raises(RuntimeError):
+        import_world(NDJSONSource(lines), job)
+    assert job.status == 'failed' and job.lines_done == 3
+    monkeypatch.setattr(importer.WorldImporter, 'insert', insert)
+    job = import_world(NDJSONSource(lines), db.session.get(ImportJob, job.id))
+    assert job.status == 'done'
+    assert db.session.execute(select(func.count()).select_from(World)).scalar() == 2
+    assert db.session.execute(select(func.count()).select_from(LongRead)
+                              .where(LongRead.world_id == job.world_id)).scalar() == 1
+    assert subtree(job.world_id) == subtree(world_id)
+
+
+# Импорт из zip архива, созданного экспортом, и из tar архива с изображениями по путям из ссылок img_link
+def test_zip_and_tar_sources(app, tmp_path):
+    world_id = make_linked_world()
+    path = tmp_path / 'world.zip'
+    export_world_archive(world_id, str(path))
+    with open(path, 'rb') as fileobj:
+        job = import_world(ZipSource(fileobj), ImportJob())
+    assert subtree(job.world_id) == subtree(world_id)
+    name = get_storage().name(db.session.get(World, job.world_id).img_link)
+    with get_storage().open(name) as image:
+        assert image.read() == b'png'
+    # Tar архив с тем же NDJSON файлом и изображением
+    data = ''.join(export_world(world_id)).encode('utf-8')
+    img_link = db.session.get(World, world_id).img_link
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for member, content in (('world.ndjson', data), (archive_name(img_link), b'png')):
+            info = tarfile.TarInfo(member)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+    job = import_world(TarSource(buffer), ImportJob())
+    assert subtree(job.world_id) == subtree(world_id)
@@ -0,0 +1,79 @@
+import datetime
+
+from darts.extensions import db
+from darts.models import Job, World
+from darts.jobs import enqueue, claim_job, run_job, JOB_HANDLERS, JOB_LOCK_TIMEOUT
+from darts.sharding import use_shard
+from .conftest import make_world
+
+
+def add_job(kind, **payload):
+    job = enqueue(kind, **payload)
+    db.session.commit()
+    return job.id
+
+
+# Задача выдается одному процессу: выполняемая задача не выдается повторно
+def test_claim_and_run(app):
+    world_id = make_world()[0]
+    job_id = add_job('cascade_delete', element='world', row_id=world_id)
+    job = claim_job('worker-1')
+    assert (job.id, job.status, job.attempts, job.locked_by) == (job_id, 'running', 1, 'worker-1')
+    assert claim_job('worker-2') is None
+    assert run_job(job)
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.result) == ('done', 'deleted 4 rows')
+    assert db.session.get(World, world_id) is None
+
+
+def test_claim_order(app):
+    first = add_job('remove_images', img_links=[])
+    second = add_job('remove_images', img_links=[])
+    assert [claim_job('worker').id, claim_job('worker').id] == [first, second]
+
+
+# Ошибка задачи: задача ставится в очередь с задержкой, после исчерпания попыток помечается как завершившаяся ошибкой
+def test_retry_and_failure(app, monkeypatch):
+    def fail():
+        raise RuntimeError('broken')
+
+    monkeypatch.setitem(JOB_HANDLERS, 'fail', fail)
+    job_id = add_job('fail')
+    db.session.get(Job, job_id).max_attempts = 2
+    db.session.commit()
+    assert not run_job(claim_job('worker'))
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.error, job.locked_by) == ('queued', 'RuntimeError: broken', None)
+    assert job.run_at > datetime.datetime.utcnow()
+    # Повтор выполняется только после задержки
+    assert claim_job('worker') is None
+    job.run_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    db.session.commit()
+    job = claim_job('worker')
+    assert job.attempts == 2
+    assert not run_job(job)
+    assert db.session.get(Job, job_id).status == 'failed'
+
+
+# Задача остановленного процесса снова выдается после JOB_LOCK_TIMEOUT
+def test_stale_lock_is_released(app):
+    job_id = add_job('remove_images', img_links=[])
+    claim_job('worker-1')
+    job = db.session.get(Job, job_id)
+    job.locked_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT + 1)
+    db.session.commit()
+    job = claim_job('worker-2')
+    assert (job.id, job.locked_by, job.attempts) == (job_id, 'worker-2', 2)
+
+
+# Задачи находятся в шарде мира и выдаются только в этом шарде
+def test_jobs_in_shards(sharded_app):
+    world_id = make_world('a')[0]
+    with use_shard('a'):
+        job_id = add_job('cascade_delete', element='world', row_id=world_id)
+    assert claim_job('worker') is None
+    with use_shard('a'):
+        job = claim_job('worker')
+        assert job.id == job_id
+        assert run_job(job)
+        assert db.session.get(World, world_id) is None
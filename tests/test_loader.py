@@ -0,0 +1,42 @@
+from sqlalchemy import event
+
+from darts.extensions import db
+from darts.models import LongRead, Chapter
+from darts.loader import Loader
+from .conftest import make_world
+
+
+# Количество запросов к базе данных внутри блока with
+class QueryCounter:
+    def __enter__(self):
+        self.count = 0
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+
+    def record(self, *args):
+        self.count += 1
+
+
+def test_load_many_uses_one_query(app):
+    ids = [make_world()[1] for _ in range(3)]
+    db.session.expunge_all()
+    loader = Loader(db.session)
+    with QueryCounter() as queries:
+        longreads = loader.load_many(LongRead, ids + [12345])
+        assert loader.load(LongRead, ids[0]) is longreads[0]
+        assert loader.load(LongRead, 12345) is None
+    assert [longread.id for longread in longreads[:3]] == ids and longreads[3] is None
+    assert queries.count == 1
+
+
+def test_children_are_cached(app):
+    longread_id, chapter_id = make_world()[1:3]
+    loader = Loader(db.session)
+    with QueryCounter() as queries:
+        chapters = loader.children_of(Chapter, 'longread_id', longread_id)
+        assert loader.children_of(Chapter, 'longread_id', longread_id) is chapters
+    assert [chapter.id for chapter in chapters] == [chapter_id]
+    assert queries.count == 1
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import delete
+
+from darts import create_app
+from darts.extensions import db
+from darts.models import BlockContent
+from .conftest import app_config, init_schema, make_world
+
+
+# Приложение с базой данных в файле: резервное копирование и возврат страниц работают с файлом базы данных
+@pytest.fixture
+def file_app(tmp_path):
+    app = create_app(app_config(tmp_path, SQLALCHEMY_DATABASE_URI='sqlite:///%s' % (tmp_path / 'main.db')))
+    init_schema(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def run(app, *args):
+    result = app.test_cli_runner().invoke(args=list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+# Резервная копия содержит данные базы данных и проходит проверку целостности
+def test_backup(file_app, tmp_path):
+    world_id = make_world()[0]
+    output = run(file_app, 'backup-db', '--output', str(tmp_path / 'backups'))
+    path = output.split(': ')[1].split(',')[0]
+    assert os.path.dirname(path) == str(tmp_path / 'backups')
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT id FROM World').fetchall() == [(world_id,)]
+    assert 'main: ok' in run(file_app, 'check-db')
+
+
+# Свободные страницы после удаления строк возвращаются файлу базы данных
+def test_vacuum(file_app):
+    longread_id, chapter_id = make_world()[1:3]
+    db.session.add_all(BlockContent(longread_id=longread_id, chapter_id=chapter_id, text='Text %d ' % index * 200)
+                       for index in range(200))
+    db.session.commit()
+    db.session.execute(delete(BlockContent).where(BlockContent.chapter_id == chapter_id))
+    db.session.commit()
+    output = run(file_app, 'vacuum-db').splitlines()
+    freed = int(output[1].split(': ')[1].split()[0])
+    assert freed > 0
+    assert ', 0 free (0.0%)' in output[2]
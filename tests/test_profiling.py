@@ -0,0 +1,39 @@
+import os
+import json
+
+from .conftest import make_world
+
+
+# Запрос с заголовком X-Profile и секретом профилируется, имя профиля передается в заголовке ответа. Профиль
+# записывается после закрытия ответа и содержит снимки стека и SQL запросы
+def test_profile_by_header(app, client, tmp_path):
+    app.config.update(PROFILE_TOKEN='secret', PROFILE_FOLDER=str(tmp_path / 'profiles'))
+    world_id = make_world()[0]
+    response = client.get('/api/worlds/', headers={'X-Profile': 'wrong'})
+    response.close()
+    assert 'X-Profile-Id' not in response.headers
+    response = client.get('/api/worlds/%d' % world_id, headers={'X-Profile': 'secret'})
+    response.close()
+    profile_id = response.headers['X-Profile-Id']
+    with open(tmp_path / 'profiles' / (profile_id + '.speedscope.json'), encoding='utf-8') as stream:
+        document = json.load(stream)
+    assert [profile['type'] for profile in document['profiles']] == ['sampled', 'evented']
+    assert any(frame.get('file') == 'sql' and frame['name'].startswith('SELECT')
+               for frame in document['shared']['frames'])
+
+
+# Случайная выборка профилирует только запросы к указанным эндпоинтам, в формате pstats записываются профиль
+# cProfile и SQL запросы
+def test_sampled_pstats_profile(app, client, tmp_path):
+    folder = tmp_path / 'profiles'
+    app.config.update(PROFILE_SAMPLE_RATE=1, PROFILE_ENDPOINTS=['worlds.api_world'], PROFILE_FOLDER=str(folder),
+                      PROFILE_FORMAT='pstats')
+    world_id = make_world()[0]
+    client.get('/api/worlds/').close()
+    assert not os.path.exists(folder)
+    response = client.get('/api/worlds/%d' % world_id)
+    response.close()
+    assert 'X-Profile-Id' not in response.headers
+    names = os.listdir(folder)
+    assert sorted(name.endswith('.prof') for name in names) == [False, True]
+    assert any(name.endswith('.sql.speedscope.json') for name in names)
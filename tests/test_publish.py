@@ -0,0 +1,53 @@
+import os
+import gzip
+import json
+
+from darts import publish
+from darts.jobs import claim_job, run_job
+from darts.publish import snapshot_path
+from .conftest import make_world
+
+
+# Текст первого контент блока первой главы документа лонгрида
+def first_text(response):
+    return response.get_json()['chapters'][0]['blockcontents'][0]['text']
+
+
+def run_jobs():
+    job = claim_job('test')
+    while job is not None:
+        assert run_job(job)
+        job = claim_job('test')
+
+
+# Читатели получают снимок, сделанный при публикации, до следующей публикации. После снятия с публикации читатели
+# получают текущие данные
+def test_publish_read_unpublish(client):
+    longread_id, chapter_id, block_id = make_world(text='Published text')[1:]
+    assert first_text(client.get('/api/read/longreads/%d' % longread_id)) == 'Published text'
+    response = client.post('/api/longreads/%d/publish/' % longread_id)
+    assert response.get_json()['published_version'] == 1
+    url = response.get_json()['url']
+    client.post('/api/blockcontent/%d/edit/' % block_id, json={'text': 'Draft text'})
+    response = client.get('/api/read/longreads/%d' % longread_id)
+    assert first_text(response) == 'Published text'
+    assert response.headers['Content-Location'] == url
+    # Снимок кэшируется навсегда и отдается сжатым клиентам, которые поддерживают gzip
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data()))['id'] == longread_id
+    assert client.delete('/api/longreads/%d/publish/' % longread_id).status_code == 200
+    assert first_text(client.get('/api/read/longreads/%d' % longread_id)) == 'Draft text'
+    run_jobs()
+    assert client.get(url).status_code == 404
+
+
+# После новой публикации хранятся только PUBLISH_KEEP_SNAPSHOTS предыдущих снимков
+def test_old_snapshots_removed(app, client, monkeypatch):
+    monkeypatch.setattr(publish, 'PUBLISH_KEEP_SNAPSHOTS', 1)
+    longread_id = make_world()[1]
+    for number in (1, 2, 3):
+        assert client.post('/api/longreads/%d/publish/' % longread_id).get_json()['published_version'] == number
+    run_jobs()
+    assert [os.path.isfile(snapshot_path(longread_id, number)) for number in (1, 2, 3)] == [False, True, True]
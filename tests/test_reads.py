@@ -0,0 +1,41 @@
+import gc
+import weakref
+
+from darts import create_app
+from darts.extensions import db
+from darts.models import LongRead
+from darts.reads import count_reads, read_buffers
+from .conftest import app_config, make_world
+
+
+# Просмотры учитываются только обработчиками чтения лонгрида, значения записываются в базу данных при сбросе буфера
+def test_longread_views_are_counted(app, client):
+    app.config.update(READ_COUNTERS=True, READ_FLUSH_INTERVAL=3600)
+    longread_id = make_world()[1]
+    assert client.get('/api/longreads/%d' % longread_id).status_code == 200
+    client.get('/api/read/longreads/%d' % longread_id).close()
+    client.post('/api/longreads/%d/publish/' % longread_id)
+    assert client.delete('/api/longreads/%d/publish/' % longread_id).status_code == 200
+    buffer = app.extensions['darts_reads']
+    assert dict(buffer.pending) == {('main', 'longread', longread_id): 2}
+    assert buffer.flush() == 2
+    db.session.expire_all()
+    assert db.session.get(LongRead, longread_id).view_count == 2
+
+
+# Буфер счетчиков и его поток записи не удерживают приложение в памяти после того, как оно перестало использоваться
+def test_buffer_does_not_keep_app_alive(tmp_path):
+    app = create_app(app_config(tmp_path, READ_COUNTERS=True, READ_FLUSH_INTERVAL=3600))
+    with app.test_request_context('/'):
+        count_reads('longread', [1])
+    buffer = app.extensions['darts_reads']
+    assert buffer in read_buffers
+    thread, wake = buffer.thread, buffer.wake
+    app_ref, buffer_ref = weakref.ref(app), weakref.ref(buffer)
+    del app, buffer
+    gc.collect()
+    assert app_ref() is None and buffer_ref() is None
+    # Поток записи завершается при следующем пробуждении
+    wake.set()
+    thread.join(1)
+    assert not thread.is_alive()
@@ -0,0 +1,82 @@
+from sqlalchemy import delete, select
+
+from darts.extensions import db
+from darts.models import LongRead, BlockContent, BlockRevision
+from darts.revisions import text_diff, apply_diff, list_revisions, revision_text, REVISION_SNAPSHOT_INTERVAL
+from .conftest import make_world
+
+
+def test_diff_round_trip():
+    old = 'The quick brown fox jumps over the lazy dog.'
+    new = 'The quick red fox jumped over the dog!'
+    assert apply_diff(old, text_diff(old, new)) == new
+    assert text_diff(old, old) == []
+
+
+# Каждая версия текста восстанавливается из ближайшего снимка и разниц, снимок записывается раз в
+# REVISION_SNAPSHOT_INTERVAL ревизий
+def test_revision_chain(app, client):
+    block_id = make_world(text='word ' * 50)[3]
+    texts = {1: 'word ' * 50}
+    for version in range(2, 2 * REVISION_SNAPSHOT_INTERVAL + 2):
+        text = 'word ' * (50 - version) + 'version %d' % version
+        response = client.patch('/api/blockcontent/%d' % block_id, json={'text': text},
+                                headers={'If-Match': '"%d"' % (version - 1)})
+        assert response.status_code == 200
+        texts[version] = text
+    revisions = list_revisions(block_id)
+    assert [row.version for row in revisions] == sorted(texts, reverse=True)
+    assert [row.version for row in revisions if row.snapshot] == [1 + 2 * REVISION_SNAPSHOT_INTERVAL,
+                                                                 1 + REVISION_SNAPSHOT_INTERVAL, 1]
+    for version, text in texts.items():
+        assert revision_text(block_id, version) == text
+    assert client.get('/api/blockcontent/%d/revisions/%d' % (block_id, 2)).get_json()['text'] == texts[2]
+
+
+def test_restore_revision(app, client):
+    block_id = make_world(text='Original text')[3]
+    client.patch('/api/blockcontent/%d' % block_id, json={'text': 'Changed text'})
+    response = client.post('/api/blockcontent/%d/revisions/1/restore/' % block_id, headers={'If-Match': '"2"'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"3"'
+    assert revision_text(block_id, 3) == 'Original text'
+    db.session.expire_all()
+    assert client.get('/api/blockcontent/%d/revisions/4' % block_id).status_code == 404
+
+
+# Контент блок, созданный до появления истории, получает снимок исходного текста командой init-db, поэтому его
+# первое изменение одним запросом можно отменить
+def test_first_edit_without_history_can_be_restored(app, client):
+    block_id = make_world(text='Original')[3]
+    db.session.execute(delete(BlockRevision))
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert 'Saved 1 block text snapshots' in result.output
+    response = client.post('/api/blockcontent/%d/edit/' % block_id, json={'text': 'Edited'})
+    assert response.status_code == 200
+    assert client.get('/api/blockcontent/%d/revisions/1' % block_id).get_json()['text'] == 'Original'
+    response = client.post('/api/blockcontent/%d/revisions/1/restore/' % block_id)
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(BlockContent, block_id).text == 'Original'
+
+
+# Ревизии контент блока, удаленного фоновой задачей без участия моделей, не отдаются и не восстанавливаются
+def test_revisions_of_deleted_block(app, client):
+    block_id = make_world()[3]
+    db.session.execute(delete(BlockContent).where(BlockContent.id == block_id))
+    db.session.commit()
+    assert client.get('/api/blockcontent/%d/revisions/1' % block_id).status_code == 404
+    assert client.post('/api/blockcontent/%d/revisions/1/restore/' % block_id).status_code == 404
+
+
+# Импорт записывает снимок текста каждого импортированного контент блока
+def test_imported_block_has_snapshot(app, client):
+    world_id = make_world(text='Imported text')[0]
+    exported = client.get('/api/worlds/%d/export/' % world_id).get_data()
+    imported = client.post('/api/worlds/import/', data=exported).get_json()['world_id']
+    block = db.session.execute(select(BlockContent.id, BlockContent.version)
+                               .where(BlockContent.longread_id.in_(select(LongRead.id)
+                                                                   .where(LongRead.world_id == imported)))).one()
+    client.patch('/api/blockcontent/%d' % block.id, json={'text': 'Edited'})
+    assert revision_text(block.id, block.version) == 'Imported text'
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import select
+
+from darts.extensions import db
+from darts.models import World, LongRead, BlockContent, WorldShard
+from darts.sharding import allocate_ids, move_world, use_shard, world_shard, SHARD_ID_STRIDE
+from .conftest import make_world
+
+
+# Идентификаторы шарда имеют остаток, равный номеру шарда, и не повторяются в разных шардах
+def test_ids_are_allocated_with_stride(sharded_app):
+    allocated = {}
+    for slot, shard in enumerate(['main', 'a', 'b']):
+        with use_shard(shard):
+            allocated[shard] = allocate_ids(LongRead.__table__, 3) + allocate_ids(LongRead.__table__, 2)
+            db.session.commit()
+        assert all(row_id % SHARD_ID_STRIDE == slot for row_id in allocated[shard])
+        assert [b - a for a, b in zip(allocated[shard], allocated[shard][1:])] == [SHARD_ID_STRIDE] * 4
+    ids = sum(allocated.values(), [])
+    assert len(set(ids)) == len(ids)
+
+
+# Первый идентификатор шарда больше идентификаторов, которые уже есть в других шардах
+def test_allocation_starts_after_existing_ids(sharded_app):
+    with use_shard('main'):
+        db.session.add(World(id=1000, name='Old', description='Old'))
+        db.session.commit()
+    with use_shard('b'):
+        assert allocate_ids(World.__table__, 1)[0] == 1026
+        db.session.commit()
+    assert world_shard(1026) == ('b', False)
+
+
+def test_allocation_without_shards(app):
+    assert allocate_ids(World.__table__, 1) is None
+
+
+def test_requests_are_routed_to_world_shard(sharded_app, sharded_client):
+    world_id, longread_id, chapter_id, block_id = make_world('b')
+    assert world_shard(world_id) == ('b', False)
+    assert sharded_client.get('/api/worlds/%d' % world_id).status_code == 200
+    assert sharded_client.get('/api/longreads/%d' % longread_id).get_json()['id'] == longread_id
+    response = sharded_client.patch('/api/blockcontent/%d' % block_id, json={'text': 'Sharded'})
+    assert response.status_code == 200
+    with use_shard('b'):
+        assert db.session.get(BlockContent, block_id).text == 'Sharded'
+    with use_shard('main'):
+        assert db.session.get(BlockContent, block_id) is None
+
+
+# Перенос мира: строки с прежними идентификаторами переходят в шард назначения, каталог переключается, в прежнем
+# шарде строк не остается
+def test_move_world(sharded_app, sharded_client):
+    world_id, longread_id, chapter_id, block_id = make_world('a', text='Moved text')
+    assert move_world(world_id, 'b') > 0
+    assert world_shard(world_id) == ('b', False)
+    db.session.expire_all()
+    with use_shard('a'):
+        assert db.session.get(World, world_id) is None
+        assert db.session.get(BlockContent, block_id) is None
+    with use_shard('b'):
+        assert db.session.get(BlockContent, block_id).text == 'Moved text'
+    assert sharded_client.get('/api/longreads/%d' % longread_id).status_code == 200
+    assert move_world(world_id, 'b') == 0
+
+
+def test_moving_world_rejects_changes(sharded_app, sharded_client):
+    world_id, longread_id, chapter_id, block_id = make_world('a')
+    db.session.execute(WorldShard.__table__.update().values(moving=True))
+    db.session.commit()
+    assert sharded_client.patch('/api/blockcontent/%d' % block_id, json={'text': 'Lost'}).status_code == 503
+    assert sharded_client.get('/api/worlds/%d' % world_id).status_code == 200
+
+
+def test_move_to_unknown_shard(sharded_app):
+    world_id = make_world('a')[0]
+    with pytest.raises(ValueError):
+        move_world(world_id, 'c')
+    assert db.session.execute(select(WorldShard.shard).where(WorldShard.world_id == world_id)).scalar() == 'a'
@@ -0,0 +1,72 @@
+import io
+import urllib.request
+
+import pytest
+
+from darts import create_app
+from darts.extensions import db
+from darts.models import World
+from darts.storage import S3Storage, get_storage
+from .conftest import app_config, init_schema, make_world
+
+# Хранилище S3 проверяется на локальном сервере moto, который заменяет S3-совместимое хранилище
+moto_server = pytest.importorskip('moto.server')
+
+
+@pytest.fixture
+def s3_endpoint(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint_url = 'http://%s:%d' % (host, port)
+    import boto3
+    boto3.client('s3', endpoint_url=endpoint_url).create_bucket(Bucket='darts')
+    yield endpoint_url
+    server.stop()
+
+
+@pytest.fixture
+def s3_app(tmp_path, s3_endpoint):
+    app = create_app(app_config(tmp_path, STORAGE_BACKEND='s3', S3_BUCKET='darts', S3_PREFIX='images',
+                                S3_ENDPOINT_URL=s3_endpoint))
+    init_schema(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def test_s3_storage_operations(s3_app, s3_endpoint):
+    storage = get_storage()
+    assert isinstance(storage, S3Storage)
+    storage.save('world1-a.png', io.BytesIO(b'png'), 'image/png')
+    img_link = storage.link('world1-a.png')
+    assert img_link == '%s/darts/images/world1-a.png' % s3_endpoint
+    assert storage.name(img_link) == 'world1-a.png'
+    assert storage.size('world1-a.png') == 3 and storage.open('world1-a.png').read() == b'png'
+    assert [name for name, size, modified in storage.list()] == ['world1-a.png']
+    assert storage.delete('world1-a.png') and not storage.delete('world1-a.png')
+    assert storage.open('world1-a.png') is None and not storage.exists('world1-a.png')
+
+
+# Прямая загрузка: клиент загружает изображение в бакет по подписанной ссылке PUT, после подтверждения изображение
+# присваивается элементу
+def test_s3_presigned_upload(s3_app):
+    client = s3_app.test_client()
+    world_id = make_world()[0]
+    response = client.post('/api/images/upload-url/', json={'type': 'world', 'id': world_id,
+                                                             'content_type': 'image/png'})
+    data = response.get_json()
+    upload = data['upload']
+    assert upload['method'] == 'PUT'
+    confirm = {'type': 'world', 'id': world_id, 'name': data['name']}
+    assert client.post('/api/images/confirm/', json=confirm).status_code == 409
+    request = urllib.request.Request(upload['url'], data=b'png', method='PUT', headers=upload['headers'])
+    with urllib.request.urlopen(request) as result:
+        assert result.status == 200
+    assert client.post('/api/images/confirm/', json=confirm).status_code == 200
+    img_link = db.session.get(World, world_id).img_link
+    assert get_storage().name(img_link) == data['name']
+    assert get_storage().open(data['name']).read() == b'png'
@@ -0,0 +1,39 @@
+import io
+
+from PIL import Image
+
+from darts.storage import get_storage
+from .conftest import make_world
+
+
+# Изображение PNG указанной ширины в хранилище. Функция возвращает ссылку на изображение
+def save_png(name, width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    buffer.seek(0)
+    get_storage().save(name, buffer, 'image/png')
+    return get_storage().link(name)
+
+
+# Ссылки srcset на копии всех ширин с версией элемента в JSON-тексте и в шаблоне
+def test_srcset(client):
+    world_id = make_world(img_link=save_png('world.png', 800, 400))[0]
+    data = client.get('/api/worlds/%d' % world_id).get_json()
+    assert [entry.split('/images/')[1] for entry in data['img_srcset'].split(', ')] == [
+        '320/world.png?v=1 320w', '640/world.png?v=1 640w', '1280/world.png?v=1 1280w']
+    assert 'srcset="/images/320/world.png?v=1 320w' in client.get('/worlds/%d/' % world_id).get_data(as_text=True)
+
+
+# Формат копии выбирается по заголовку Accept, изображение уменьшается до запрошенной ширины
+def test_variant_negotiation(app, client, tmp_path):
+    app.config['VARIANT_CACHE_FOLDER'] = str(tmp_path / 'variants')
+    save_png('world.png', 800, 400)
+    response = client.get('/images/320/world.png', headers={'Accept': 'image/webp,*/*'})
+    assert response.mimetype == 'image/webp' and 'Accept' in response.vary
+    assert Image.open(io.BytesIO(response.get_data())).size == (320, 160)
+    response = client.get('/images/640/world.png', headers={'Accept': '*/*'})
+    assert response.mimetype == 'image/jpeg'
+    # Изображения меньшей ширины не увеличиваются
+    assert Image.open(io.BytesIO(client.get('/images/1280/world.png').get_data())).size == (800, 400)
+    assert client.get('/images/500/world.png').status_code == 404
+    assert client.get('/images/320/missing.png').status_code == 404
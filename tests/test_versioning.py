@@ -0,0 +1,109 @@
+from sqlalchemy import event
+
+from darts.extensions import db
+from darts.models import BlockContent
+from .conftest import make_world
+
+
+def edit_text(client, block_id, text, if_match=None):
+    headers = {'If-Match': if_match} if if_match is not None else {}
+    return client.post('/api/blockcontent/%d/edit/' % block_id, json={'text': text}, headers=headers)
+
+
+def test_edit_with_current_version(app, client):
+    block_id = make_world()[3]
+    response = edit_text(client, block_id, 'New text', '"1"')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['version'] == 2
+    block = db.session.get(BlockContent, block_id)
+    assert (block.text, block.text_preview) == ('New text', 'New text')
+
+
+# Изменение устаревшей версии отклоняется ответом 412 с текущей версией, текст не изменяется
+def test_edit_with_stale_version(app, client):
+    block_id = make_world()[3]
+    assert edit_text(client, block_id, 'First', '"1"').status_code == 200
+    response = edit_text(client, block_id, 'Second', 'W/"1"')
+    assert response.status_code == 412
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['version'] == 2
+    db.session.expire_all()
+    assert db.session.get(BlockContent, block_id).text == 'First'
+
+
+def test_edit_without_version(app, client):
+    block_id = make_world()[3]
+    assert edit_text(client, block_id, 'First').status_code == 200
+    assert edit_text(client, block_id, 'Second', '*').headers['ETag'] == '"3"'
+
+
+def test_edit_missing_element(app, client):
+    assert edit_text(client, 12345, 'Text', '"1"').status_code == 404
+
+
+def test_invalid_if_match(app, client):
+    block_id = make_world()[3]
+    assert edit_text(client, block_id, 'Text', 'abc').status_code == 400
+
+
+# Изменение выполняется одним запросом UPDATE без предварительного чтения строки контент блока
+def test_edit_does_not_read_row_first(app, client):
+    block_id = make_world()[3]
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert edit_text(client, block_id, 'New text', '"1"').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert [statement for statement in statements if '"BlockContent"' in statement][0].startswith('UPDATE')
+
+
+def patch_text(client, block_id, text, if_match=None):
+    headers = {'If-Match': if_match} if if_match is not None else {}
+    return client.patch('/api/blockcontent/%d' % block_id, json={'text': text}, headers=headers)
+
+
+def test_patch_with_current_version(app, client):
+    block_id = make_world()[3]
+    response = patch_text(client, block_id, 'New text', '"1"')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['text_preview'] == 'New text'
+    assert db.session.get(BlockContent, block_id).text == 'New text'
+
+
+# Изменение устаревшей версии отклоняется ответом 412 с текущей версией, текст не изменяется
+def test_patch_with_stale_version(app, client):
+    block_id = make_world()[3]
+    assert patch_text(client, block_id, 'First', '"1"').status_code == 200
+    response = patch_text(client, block_id, 'Second', 'W/"1"')
+    assert response.status_code == 412
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['version'] == 2
+    db.session.expire_all()
+    assert db.session.get(BlockContent, block_id).text == 'First'
+
+
+def test_patch_missing_element(app, client):
+    assert patch_text(client, 12345, 'Text', '"1"').status_code == 404
+
+
+# Изменение выполняется одним запросом UPDATE без предварительного чтения строки контент блока
+def test_patch_does_not_read_row_first(app, client):
+    block_id = make_world()[3]
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert patch_text(client, block_id, 'New text', '"1"').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert [statement for statement in statements if '"BlockContent"' in statement][0].startswith('UPDATE')
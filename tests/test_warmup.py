@@ -0,0 +1,32 @@
+import threading
+
+from darts import create_app, warmup
+from .conftest import app_config, init_schema, make_world
+
+
+# Процесс отвечает 503 на проверку готовности, пока выполняется прогрев, и 200 с результатом прогрева после него
+def test_ready_after_warmup(tmp_path, monkeypatch):
+    app = create_app(app_config(tmp_path, TESTING=False, WARMUP=True))
+    init_schema(app)
+    release = threading.Event()
+
+    def warm_up(app):
+        release.wait(5)
+        return {'templates': 1, 'requests': 0, 'failed': 0, 'seconds': 0}
+
+    monkeypatch.setattr(warmup, 'warm_up', warm_up)
+    client = app.test_client()
+    response = client.get('/api/ready/')
+    assert (response.status_code, response.headers['Retry-After']) == (503, '1')
+    release.set()
+    app.extensions['darts_warmup'].thread.join(5)
+    response = client.get('/api/ready/')
+    assert response.status_code == 200 and response.get_json()['warmup']['templates'] == 1
+
+
+# Прогрев компилирует шаблоны и запрашивает страницы самых больших миров и лонгридов без ошибок
+def test_warm_up_command(app):
+    make_world()
+    output = app.test_cli_runner().invoke(args=['warm-up']).output
+    # Индексные страницы, страницы мира, лонгрида и его первой главы
+    assert 'Compiled %d templates, 11 requests (0 failed)' % len(app.jinja_env.list_templates()) in output